@@ -4,14 +4,13 @@ Forged Alliance Forever API project
 Distributed under GPLv3, see license.txt
 """
 import sys
-import statsd
-import time
 from flask_jwt import JWT
-from flask import Flask, session, jsonify, request
+from flask import Flask, session, jsonify
 from flask_oauthlib.contrib.oauth2 import bind_cache_grant
 from flask_oauthlib.provider import OAuth2Provider
 from flask_login import LoginManager
 
+from api.cache import TTLCache
 from api.invalid_usage import InvalidUsage
 from api.jwt_user import JwtUser
 from api.user import User
@@ -35,11 +34,16 @@ login_manager.init_app(app)
 
 _make_response = app.make_response
 
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+    'Access-Control-Allow-Methods': 'GET,PUT,POST,DELETE',
+}
+
 @app.after_request
 def after_request(response):
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization'
-    response.headers['Access-Control-Allow-Methods'] = 'GET,PUT,POST,DELETE'
+    for name, value in CORS_HEADERS.items():
+        response.headers[name] = value
     return response
 
 @app.errorhandler(InvalidUsage)
@@ -50,8 +54,27 @@ def handle_invalid_usage(error):
     return response
 
 
+JWT_IDENTITY_CACHE_SIZE = 10000
+DEFAULT_JWT_IDENTITY_CACHE_TTL = 60
+
+# Users authenticated by JWT, by id
+jwt_identity_cache = TTLCache(max_size=JWT_IDENTITY_CACHE_SIZE, ttl=DEFAULT_JWT_IDENTITY_CACHE_TTL)
+
+
+def get_jwt_identity(user_id):
+    """
+    Find user by id, caching found users for ``JWT_IDENTITY_CACHE_TTL`` seconds.
+    """
+    user = jwt_identity_cache.get(user_id)
+    if user is None:
+        user = User.get_by_id(user_id)
+        if user is not None:
+            jwt_identity_cache.set(user_id, user)
+    return user
+
+
 def jwt_identity(payload):
-    return User.get_by_id(payload['identity'])
+    return get_jwt_identity(payload['identity'])
 
 flask_jwt = JWT(None, authentication_handler=None, identity_handler=jwt_identity)
 
@@ -88,7 +111,11 @@ app.make_response = make_response_json
 
 # ======== Init Database =======
 
-import faf.db
+from api.db_pool import init_pool
+from api.event_buffer import init_event_buffer
+from api.metrics import init_metrics
+from api.response_cache import init_response_cache
+from api.slow_queries import init_slow_queries
 
 
 # ======== Init App =======
@@ -98,29 +125,21 @@ def api_init():
     Initializes flask. Call _after_ setting flask config.
     """
 
-    faf.db.init_db(app.config)
+    init_metrics(app)
+    init_pool(app)
+    init_event_buffer(app, events.write_events)
+    init_response_cache(app)
+    init_slow_queries(app)
     app.github = github.make_session(app.config['GITHUB_USER'],
                                      app.config['GITHUB_TOKEN'])
     app.slack = slack.make_session(app.config['SLACK_HOOK_URL'])
 
     app.secret_key = app.config['FLASK_LOGIN_SECRET_KEY']
     flask_jwt.init_app(app)
+    jwt_identity_cache.ttl = app.config.get('JWT_IDENTITY_CACHE_TTL', DEFAULT_JWT_IDENTITY_CACHE_TTL)
+    jwt_user.user_cache.ttl = app.config.get('JWT_USER_CACHE_TTL', jwt_user.DEFAULT_USER_CACHE_TTL)
 
 
-    if app.config.get('STATSD_SERVER'):
-        host, port = app.config['STATSD_SERVER'].split(':')
-        stats = statsd.StatsClient(host, port)
-
-        @app.before_request
-        def before_req():
-            request._start_time = time.time()
-
-        @app.after_request
-        def after_req(response):
-            stats.timing('api.request', (time.time()-request._start_time)*1000)
-            return response
-            
-
 # ======== Init OAuth =======
 
 
@@ -156,3 +175,4 @@ import api.query_commons
 import api.games
 import api.ranked1v1
 import api.clans
+import api.admin
@@ -1,9 +1,15 @@
+from collections import OrderedDict
+
 from faf.api.achievement_schema import AchievementSchema
 from faf.api.player_achievement_schema import PlayerAchievementSchema
+from flask import request
 from flask_jwt import jwt_required, current_identity
 from api import *
 import faf.db as db
-from api.query_commons import fetch_data
+from api.cache import DefinitionCache
+from api.db_pool import get_read_connection
+from api.query_commons import fetch_data, dump_rows, get_select_expressions
+from api.response_cache import cached, invalidate
 
 MAX_PAGE_SIZE = 1000
 
@@ -44,6 +50,8 @@ ACHIEVEMENT_SELECT_EXPRESSIONS = {
     'description': 'COALESCE(desc_langReg.value, desc_lang.value, desc_def.value)',
 }
 
+DEFAULT_DEFINITIONS_CACHE_TTL = 300
+
 PLAYER_ACHIEVEMENT_SELECT_EXPRESSIONS = {
     'id': 'id',
     'achievement_id': 'achievement_id',
@@ -54,7 +62,45 @@ PLAYER_ACHIEVEMENT_SELECT_EXPRESSIONS = {
 }
 
 
+def load_achievement_definitions(language, region):
+    connection = get_read_connection()
+    with connection:
+        cursor = connection.cursor(db.pymysql.cursors.DictCursor)
+        cursor.execute(*get_definitions_query(language, region))
+        return cursor.fetchall()
+
+
+def get_definitions_query(language, region):
+    """
+    Returns the query loading all achievement definitions and its arguments.
+    """
+    return ('SELECT {} FROM {}'.format(get_select_expressions(None, ACHIEVEMENT_SELECT_EXPRESSIONS), ACHIEVEMENTS_TABLE),
+            {'language': language, 'region': region})
+
+
+definitions = DefinitionCache(load_achievement_definitions, ttl=DEFAULT_DEFINITIONS_CACHE_TTL)
+
+
+def get_definitions():
+    """
+    Returns the achievement definition cache, which resolves the localized name and description of every
+    achievement once per language and region.
+    """
+    definitions.ttl = app.config.get('DEFINITIONS_CACHE_TTL', DEFAULT_DEFINITIONS_CACHE_TTL)
+    return definitions
+
+
+def invalidate_definitions():
+    """
+    Drops the cached achievement definitions and responses of ``/achievements``, e.g. after the definitions have been
+    changed in the database.
+    """
+    definitions.invalidate()
+    invalidate('achievements_list')
+
+
 @app.route('/achievements')
+@cached(ttl=DEFAULT_DEFINITIONS_CACHE_TTL)
 def achievements_list():
     """
     Lists all achievement definitions.
@@ -97,13 +143,14 @@ def achievements_list():
 
     :query string language: The preferred language to use for strings returned by this method. default is en.
     :query string region: The preferred region to use for strings returned by this method. default is US.
+    :query string filter[id]: A comma separated list of achievement ids, returns these achievements instead of a page.
     :status 200: No error
     """
     language = request.args.get('language', 'en')
     region = request.args.get('region', 'US')
 
-    return fetch_data(AchievementSchema(), ACHIEVEMENTS_TABLE, ACHIEVEMENT_SELECT_EXPRESSIONS, MAX_PAGE_SIZE, request,
-                      args={'language': language, 'region': region})
+    return dump_rows(AchievementSchema(), get_definitions().get_all(language, region), ACHIEVEMENT_SELECT_EXPRESSIONS,
+                     MAX_PAGE_SIZE, request, id_filter=True)
 
 
 @app.route('/achievements/<achievement_id>')
@@ -152,10 +199,12 @@ def achievements_get(achievement_id):
     language = request.args.get('language', 'en')
     region = request.args.get('region', 'US')
 
-    return fetch_data(AchievementSchema(), ACHIEVEMENTS_TABLE, ACHIEVEMENT_SELECT_EXPRESSIONS, MAX_PAGE_SIZE, request,
-                      where='ach.id = %(id)s',
-                      args={'id': achievement_id, 'language': language, 'region': region},
-                      many=False)
+    achievement = get_definitions().get(achievement_id, language, region)
+    if not achievement:
+        return {'errors': [{'title': 'No achievement with this id was found'}]}, 404
+
+    return dump_rows(AchievementSchema(), achievement, ACHIEVEMENT_SELECT_EXPRESSIONS, MAX_PAGE_SIZE, request,
+                     many=False)
 
 
 @app.route('/achievements/<achievement_id>/increment', methods=['POST'])
@@ -446,7 +495,7 @@ def update_steps(achievement_id, player_id, steps, steps_function):
               "newly_unlocked": boolean,
             }
     """
-    achievement = achievements_get(achievement_id)['data']['attributes']
+    achievement = get_achievement(achievement_id)
     if achievement['type'] != 'INCREMENTAL':
         raise InvalidUsage('Only incremental achievements can be incremented ({})'.format(achievement_id),
                            status_code=400)
@@ -462,16 +511,8 @@ def update_steps(achievement_id, player_id, steps, steps_function):
 
         player_achievement = cursor.fetchone()
 
-        new_state = 'REVEALED'
-        newly_unlocked = False
-
-        current_steps = player_achievement['current_steps'] if player_achievement else 0
-        new_current_steps = steps_function(current_steps, steps)
-
-        if new_current_steps >= achievement['total_steps']:
-            new_state = 'UNLOCKED'
-            new_current_steps = achievement['total_steps']
-            newly_unlocked = player_achievement['state'] != 'UNLOCKED' if player_achievement else True
+        new_current_steps, new_state, newly_unlocked = calculate_steps(achievement, player_achievement, steps,
+                                                                       steps_function)
 
         cursor.execute("""INSERT INTO player_achievements (player_id, achievement_id, current_steps, state)
                         VALUES
@@ -489,6 +530,29 @@ def update_steps(achievement_id, player_id, steps, steps_function):
     return dict(current_steps=new_current_steps, current_state=new_state, newly_unlocked=newly_unlocked)
 
 
+def calculate_steps(achievement, player_achievement, steps, steps_function):
+    """Calculates the new progress of an incremental achievement.
+
+    :param achievement: the achievement definition, must contain ``total_steps``
+    :param player_achievement: the player's current ``current_steps`` and ``state``, or ``None``
+    :param steps: the ``steps`` parameter to pass to ``steps_function``
+    :param steps_function: see :func:`update_steps`
+    :return: a tuple of the new current steps, the new state and whether the achievement has been newly unlocked
+    """
+    new_state = 'REVEALED'
+    newly_unlocked = False
+
+    current_steps = player_achievement['current_steps'] if player_achievement else 0
+    new_current_steps = steps_function(current_steps, steps)
+
+    if new_current_steps >= achievement['total_steps']:
+        new_state = 'UNLOCKED'
+        new_current_steps = achievement['total_steps']
+        newly_unlocked = player_achievement['state'] != 'UNLOCKED' if player_achievement else True
+
+    return new_current_steps, new_state, newly_unlocked
+
+
 def unlock_achievement(achievement_id, player_id):
     """Unlocks a standard achievement. This function is NOT an endpoint.
 
@@ -504,15 +568,14 @@ def unlock_achievement(achievement_id, player_id):
     """
     newly_unlocked = False
 
+    achievement = get_achievement(achievement_id)
+    if achievement['type'] != 'STANDARD':
+        raise InvalidUsage('Only standard achievements can be unlocked directly ({})'.format(achievement_id),
+                           status_code=400)
+
     with db.connection:
         cursor = db.connection.cursor(db.pymysql.cursors.DictCursor)
 
-        cursor.execute('SELECT type FROM achievement_definitions WHERE id = %s', achievement_id)
-        achievement = cursor.fetchone()
-        if achievement['type'] != 'STANDARD':
-            raise InvalidUsage('Only standard achievements can be unlocked directly ({})'.format(achievement_id),
-                               status_code=400)
-
         cursor.execute("""SELECT
                             state
                         FROM player_achievements
@@ -578,33 +641,117 @@ def reveal_achievement(achievement_id, player_id):
 
 
 def update_multiple(player_id, updates):
+    """Applies multiple achievement updates for a player within a single transaction. This function is NOT an endpoint.
+
+    The player's progress of all involved achievements is loaded with one query, the updates are applied in order in
+    memory using the cached definitions and the resulting rows are written back using one multi-row insert. The result of
+    each update is the same as if the corresponding single update function had been called.
+
+    :param player_id: ID of the player to update the achievements for
+    :param updates: a list of dictionaries with the keys ``achievement_id``, ``update_type`` and, for ``INCREMENT``
+    and ``SET_STEPS_AT_LEAST``, ``steps``
+
+    :return:
+        If successful, this method returns a dictionary with the following structure::
+
+            {
+              "updated_achievements": [
+                {
+                  "achievement_id": string,
+                  "current_state": string,
+                  "current_steps": integer,
+                  "newly_unlocked": boolean,
+                }
+              ]
+            }
+    """
     result = dict(updated_achievements=[])
+    if not updates:
+        return result
 
-    for update in updates:
-        achievement_id = update['achievement_id']
-        update_type = update['update_type']
-
-        update_result = dict(achievement_id=achievement_id)
-
-        if update_type == 'REVEAL':
-            reveal_result = reveal_achievement(achievement_id, player_id)
-            update_result['current_state'] = reveal_result['current_state']
-            update_result['current_state'] = 'REVEALED'
-        elif update_type == 'UNLOCK':
-            unlock_result = unlock_achievement(achievement_id, player_id)
-            update_result['newly_unlocked'] = unlock_result['newly_unlocked']
-            update_result['current_state'] = 'UNLOCKED'
-        elif update_type == 'INCREMENT':
-            increment_result = increment_achievement(achievement_id, player_id, update['steps'])
-            update_result['current_steps'] = increment_result['current_steps']
-            update_result['current_state'] = increment_result['current_state']
-            update_result['newly_unlocked'] = increment_result['newly_unlocked']
-        elif update_type == 'SET_STEPS_AT_LEAST':
-            set_steps_at_least_result = set_steps_at_least(achievement_id, player_id, update['steps'])
-            update_result['current_steps'] = set_steps_at_least_result['current_steps']
-            update_result['current_state'] = set_steps_at_least_result['current_state']
-            update_result['newly_unlocked'] = set_steps_at_least_result['newly_unlocked']
-
-        result['updated_achievements'].append(update_result)
+    achievement_ids = list(OrderedDict.fromkeys(update['achievement_id'] for update in updates))
+    placeholders = ','.join(['%s'] * len(achievement_ids))
+
+    with db.connection:
+        cursor = db.connection.cursor(db.pymysql.cursors.DictCursor)
+        cursor.execute("""SELECT
+                            achievement_id,
+                            current_steps,
+                            state
+                        FROM player_achievements
+                        WHERE player_id = %s AND achievement_id IN ({})""".format(placeholders),
+                       [player_id] + achievement_ids)
+        player_achievements = {row['achievement_id']: row for row in cursor.fetchall()}
+
+        updated_ids = OrderedDict()
+
+        for update in updates:
+            achievement_id = update['achievement_id']
+            update_type = update['update_type']
+            player_achievement = player_achievements.get(achievement_id)
+
+            update_result = dict(achievement_id=achievement_id)
+
+            if update_type == 'REVEAL':
+                new_state = player_achievement['state'] if player_achievement else 'REVEALED'
+                player_achievements[achievement_id] = dict(
+                    current_steps=player_achievement['current_steps'] if player_achievement else None,
+                    state=new_state)
+                update_result['current_state'] = 'REVEALED'
+            elif update_type == 'UNLOCK':
+                achievement = get_achievement(achievement_id)
+                if achievement['type'] != 'STANDARD':
+                    raise InvalidUsage('Only standard achievements can be unlocked directly ({})'
+                                       .format(achievement_id), status_code=400)
+
+                player_achievements[achievement_id] = dict(
+                    current_steps=player_achievement['current_steps'] if player_achievement else None,
+                    state='UNLOCKED')
+                update_result['newly_unlocked'] = not player_achievement or player_achievement['state'] != 'UNLOCKED'
+                update_result['current_state'] = 'UNLOCKED'
+            elif update_type in ('INCREMENT', 'SET_STEPS_AT_LEAST'):
+                achievement = get_achievement(achievement_id)
+                if achievement['type'] != 'INCREMENTAL':
+                    raise InvalidUsage('Only incremental achievements can be incremented ({})'.format(achievement_id),
+                                       status_code=400)
+
+                if update_type == 'INCREMENT':
+                    steps_function = lambda current_steps, new_steps: current_steps + new_steps
+                else:
+                    steps_function = lambda current_steps, new_steps: max(current_steps, new_steps)
+
+                current_steps, current_state, newly_unlocked = calculate_steps(achievement, player_achievement,
+                                                                               update['steps'], steps_function)
+                player_achievements[achievement_id] = dict(current_steps=current_steps, state=current_state)
+                update_result['current_steps'] = current_steps
+                update_result['current_state'] = current_state
+                update_result['newly_unlocked'] = newly_unlocked
+            else:
+                result['updated_achievements'].append(update_result)
+                continue
+
+            updated_ids[achievement_id] = True
+            result['updated_achievements'].append(update_result)
+
+        if updated_ids:
+            values = []
+            for achievement_id in updated_ids:
+                player_achievement = player_achievements[achievement_id]
+                values.extend([player_id, achievement_id, player_achievement['current_steps'],
+                               player_achievement['state']])
+
+            cursor.execute("""INSERT INTO player_achievements (player_id, achievement_id, current_steps, state)
+                            VALUES {}
+                            ON DUPLICATE KEY UPDATE
+                                current_steps = VALUES(current_steps),
+                                state = VALUES(state)""".format(','.join(['(%s, %s, %s, %s)'] * len(updated_ids))),
+                           values)
 
     return result
+
+
+def get_achievement(achievement_id):
+    achievement = get_definitions().get(achievement_id)
+    if not achievement:
+        raise InvalidUsage('No achievement with this id was found ({})'.format(achievement_id), status_code=400)
+    return achievement
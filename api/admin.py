@@ -0,0 +1,54 @@
+from api import *
+from api import slow_queries
+
+
+@app.route('/admin/slow_queries')
+@oauth.require_oauth('read_slow_queries')
+def slow_query_log():
+    """
+    Lists the slow queries recorded by the worker serving the request, most recent first. See
+    :mod:`api.slow_queries`.
+
+    **Example Request**:
+
+    .. sourcecode:: http
+
+       GET /admin/slow_queries
+
+    **Example Response**:
+
+    .. sourcecode:: http
+
+        HTTP/1.1 200 OK
+        Vary: Accept
+        Content-Type: text/javascript
+
+        {
+          "data": [
+            {
+              "type": "slow_query",
+              "id": "12",
+              "attributes": {
+                "timestamp": 1476712345.5,
+                "duration": 1520.3,
+                "endpoint": "games",
+                "parameters": {"filter[players]": ["Rhiza"]},
+                "sql": "SELECT gps.gameId FROM game_player_stats gps ...",
+                "args": ["str"],
+                "explain": [{"id": 1, "select_type": "SIMPLE", "table": "gps", ...}]
+              }
+            }
+          ]
+        }
+
+    :status 200: No error
+    :status 404: The slow query log is disabled
+    """
+    recorder = slow_queries.recorder
+    if recorder is None:
+        raise InvalidUsage('The slow query log is disabled', status_code=404)
+
+    return {'data': [{'type': 'slow_query',
+                      'id': str(sample['id']),
+                      'attributes': {key: value for key, value in sample.items() if key != 'id'}}
+                     for sample in recorder.samples()]}
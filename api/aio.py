@@ -0,0 +1,434 @@
+"""
+asyncio-native serving of the hot read endpoints.
+
+With ``run.py --native``, /games, /ranked1v1, /achievements, /events, /maps and /mods are answered by coroutines that
+run the queries of :mod:`api.query_commons` and the endpoint modules on an ``aiomysql`` pool, so a worker isn't
+limited to one request per thread while waiting for MySQL. All other routes, and the few requests the native
+handlers don't cover (streamed pages, cursor pagination of /games), are passed to the Flask app running on a thread
+pool, as before.
+
+aiohttp_wsgi reads the whole body of a request into memory, or a temporary file once it exceeds 512 KB, before the
+flask app gets to see it. Upload routes (see :data:`UPLOAD_PATHS`) are mounted with a :class:`StreamingWSGIHandler`
+instead, so that :func:`api.uploads.receive_file` stores uploads while they are being received.
+"""
+import asyncio
+import time
+
+import aiomysql
+from aiohttp import web
+from aiohttp_wsgi import WSGIHandler
+from aiohttp_wsgi.wsgi import _run_application
+from flask import json as flask_json
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_etags
+
+from api import CORS_HEADERS, InvalidUsage, achievements, events, games, maps, metrics, mods, ranked1v1, \
+    response_cache, slow_queries
+from api.query_commons import dump_rows, get_limit, get_limit_args, get_page_attributes, get_page_cursor, is_streamed, \
+    prepare_fetch, LIMIT_ARGS_EXPRESSION
+
+DEFAULT_POOL_MIN_SIZE = 1
+DEFAULT_POOL_MAX_SIZE = 50
+UPLOAD_PATHS = ['maps/upload', 'mods/upload', 'avatar']
+
+
+class AioRequest(object):
+    """
+    Exposes an aiohttp request with the attributes of a flask request that the query builders use.
+
+    :param endpoint: the name of the flask endpoint the request corresponds to
+    """
+
+    def __init__(self, request, endpoint):
+        self.args = self.values = MultiDict(list(request.query.items()))
+        self.base_url = str(request.url.with_query(None))
+        self.host = request.host
+        self.method = request.method
+        self.endpoint = endpoint
+        self.view_args = {name: value for name, value in request.match_info.items() if name != 'path_info'}
+        self.if_none_match = parse_etags(request.headers.get('If-None-Match'))
+
+
+class StreamInput(object):
+    """
+    The ``wsgi.input`` of a :class:`StreamingWSGIHandler`, reading the body of an aiohttp request on the event loop
+    while the flask app, blocked on a thread of the executor, consumes it.
+
+    :param content: the ``StreamReader`` of the request
+    :param loop: the event loop the request is handled on
+    :param max_size: the maximum number of bytes to read
+    """
+
+    def __init__(self, content, loop, max_size):
+        self._content = content
+        self._loop = loop
+        self._max_size = max_size
+        self._buffer = bytearray()
+        self._size = 0
+        self._eof = False
+
+    def _fill(self):
+        block = asyncio.run_coroutine_threadsafe(self._content.readany(), self._loop).result()
+        if not block:
+            self._eof = True
+            return
+
+        self._size += len(block)
+        if self._size > self._max_size:
+            raise RequestEntityTooLarge()
+        self._buffer += block
+
+    def _take(self, size):
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def read(self, size=-1):
+        while not self._eof and (size is None or size < 0 or len(self._buffer) < size):
+            self._fill()
+        return self._take(len(self._buffer) if size is None or size < 0 else size)
+
+    def readline(self, size=-1):
+        while not self._eof and b'\n' not in self._buffer and (size is None or size < 0 or len(self._buffer) < size):
+            self._fill()
+        end = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        return self._take(end)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+class StreamingWSGIHandler(WSGIHandler):
+    """
+    A ``WSGIHandler`` that runs the flask app as soon as a request arrives and passes it the body as it is being
+    received (see :class:`StreamInput`), instead of reading all of it first. The app occupies a thread of the executor
+    for as long as the client takes to send the body.
+    """
+
+    async def handle_request(self, request):
+        if request.content_length is not None and request.content_length > self._max_request_body_size:
+            raise web.HTTPRequestEntityTooLarge(max_size=self._max_request_body_size,
+                                                actual_size=request.content_length)
+
+        loop = asyncio.get_event_loop()
+        body = StreamInput(request.content, loop, self._max_request_body_size)
+        environ = self._get_environ(request, body, request.content_length)
+        if request.content_length is None:
+            # Chunked body, werkzeug reads it until the end
+            environ['CONTENT_LENGTH'] = ''
+            environ['wsgi.input_terminated'] = True
+        return await loop.run_in_executor(self._executor, _run_application, self._application, environ)
+
+    __call__ = handle_request
+
+
+class Database(object):
+    """
+    Runs queries on an ``aiomysql`` connection pool.
+    """
+
+    def __init__(self):
+        self.pool = None
+
+    async def connect(self, **kwargs):
+        """
+        Creates the pool, taking the arguments of ``aiomysql.create_pool``.
+        """
+        self.pool = await aiomysql.create_pool(**kwargs)
+
+    async def close(self):
+        self.pool.close()
+        await self.pool.wait_closed()
+
+    async def fetch(self, sql, args=None, many=True, cursor_class=aiomysql.DictCursor):
+        """
+        Executes a query and returns all rows if `many` is ``True``, the first row (or ``None``) otherwise.
+        """
+        async with self.pool.acquire() as connection:
+            async with connection.cursor(cursor_class) as cursor:
+                await cursor.execute(sql, args)
+                if many:
+                    return await cursor.fetchall()
+                return await cursor.fetchone()
+
+
+class InstrumentedDatabase(object):
+    """
+    Times the statements a native handler runs on a :class:`Database` under the name of the handler's endpoint (see
+    :mod:`api.metrics`) and records the slow ones (see :mod:`api.slow_queries`).
+
+    :param request: the :class:`AioRequest` the statements are run for
+    """
+
+    def __init__(self, database, request):
+        self.database = database
+        self.request = request
+
+    async def fetch(self, sql, args=None, many=True, cursor_class=aiomysql.DictCursor):
+        start = time.monotonic()
+        try:
+            with metrics.sql_timer(sql, self.request.endpoint):
+                return await self.database.fetch(sql, args, many, cursor_class)
+        finally:
+            recorder = slow_queries.recorder
+            if recorder is not None:
+                recorder.record(sql, args, (time.monotonic() - start) * 1000, self.request.endpoint,
+                                self.request.args.to_dict(flat=False))
+
+
+async def fetch_data(database, schema, table, root_select_expression_dict, max_page_size, request, many=True,
+                     **kwargs):
+    """
+    Like :func:`api.query_commons.fetch_data`, but runs the query on `database`. Streaming is not supported.
+    """
+    query = prepare_fetch(schema, table, root_select_expression_dict, max_page_size, request, many=many, **kwargs)
+    return query.to_document(await database.fetch(query.sql, query.args, many))
+
+
+async def get_definitions(module, request, database):
+    """
+    Returns the achievement or event definitions of the language and region of a request, loading them if they
+    aren't cached yet.
+    """
+    language = request.args.get('language', 'en')
+    region = request.args.get('region', 'US')
+
+    definitions = module.get_definitions()
+    rows = definitions.peek(language, region)
+    if rows is None:
+        rows = await database.fetch(*module.get_definitions_query(language, region))
+        definitions.put(language, region, rows)
+    return rows
+
+
+async def games_handler(request, database):
+    filters = games.get_filters(request)
+    page, page_size = get_page_attributes(games.MAX_PLAYER_PAGE_SIZE, request)
+    if get_page_cursor(request) or is_streamed(page_size):
+        return None
+
+    errors = games.check_syntax_errors(filters['map_exclude'], filters['map_name'], filters['max_datetime'],
+                                       filters['min_datetime'])
+    if errors:
+        return errors
+
+    limit_expression = get_limit(page, page_size)
+    game_ids = games.get_game_id_filter(request, filters, None)
+    if game_ids is None and games.is_filtered(filters):
+        query, args = games.build_query(limit_expression=limit_expression, **filters)
+        game_ids = [row[0] for row in await database.fetch(query, args, cursor_class=aiomysql.Cursor)]
+        if not game_ids:
+            return {'data': []}
+
+    if game_ids is not None:
+        table_expression, game_select_expression, player_select_expression, where = \
+            games.get_games_query(game_ids, filters['rating_type'])
+        result = await fetch_data(database, games.GameStats(), table_expression, game_select_expression,
+                                  games.MAX_PLAYER_PAGE_SIZE, request, where=where, args=game_ids, sort='-id',
+                                  enricher=games.enricher, limit=False, players=player_select_expression)
+    else:
+        result = await fetch_data(database, games.GameStats(),
+                                  games.GAMES_NO_FILTER_EXPRESSION.format('gs.id', LIMIT_ARGS_EXPRESSION),
+                                  games.GAME_SELECT_EXPRESSIONS, games.MAX_PLAYER_PAGE_SIZE, request,
+                                  args=get_limit_args(page, page_size), sort='-id', enricher=games.enricher,
+                                  limit=False, players=games.PLAYER_SELECT_EXPRESSIONS)
+
+    return games.sort_game_results(result)
+
+
+async def ranked1v1_handler(request, database, ladder_lock):
+    page, page_size = get_page_attributes(ranked1v1.MAX_PAGE_SIZE, request)
+    if is_streamed(page_size):
+        return None
+
+    index = ranked1v1.get_ladder_index()
+    ladder = index.peek()
+    if ladder is None:
+        async with ladder_lock:
+            ladder = index.peek()
+            if ladder is None:
+                ladder = index.update(await database.fetch(ranked1v1.LADDER_QUERY))
+
+    return ranked1v1.ladder_page(request, ladder)
+
+
+async def achievements_handler(request, database):
+    return dump_rows(achievements.AchievementSchema(), await get_definitions(achievements, request, database),
+                     achievements.ACHIEVEMENT_SELECT_EXPRESSIONS, achievements.MAX_PAGE_SIZE, request, id_filter=True)
+
+
+async def events_handler(request, database):
+    return dump_rows(events.EventSchema(), await get_definitions(events, request, database),
+                     events.EVENTS_SELECT_EXPRESSIONS, events.MAX_PAGE_SIZE, request)
+
+
+async def maps_handler(request, database):
+    where, args, many = maps.get_filter(request)
+    return await fetch_data(database, maps.MapSchema(), maps.TABLE, maps.SELECT_EXPRESSIONS, maps.MAX_PAGE_SIZE,
+                            request, where=where, args=args, many=many, enricher=maps.enricher, keyset=True,
+                            id_filter=True)
+
+
+async def mods_handler(request, database):
+    return await fetch_data(database, mods.ModSchema(), mods.TABLE, mods.SELECT_EXPRESSIONS, mods.MAX_PAGE_SIZE,
+                            request, enricher=mods.enricher, keyset=True, id_filter=True)
+
+
+def json_response(result, status=200):
+    return web.Response(body=flask_json.dumps(result, separators=(',', ':')).encode('utf-8'), status=status,
+                        content_type='application/vnd.api+json', headers=CORS_HEADERS)
+
+
+def cached_response(entry, ttl, request):
+    """
+    Answers a request from an entry of :mod:`api.response_cache`, with 304 if the client has it already.
+    """
+    headers = {'ETag': '"{}"'.format(entry.etag), 'Cache-Control': 'public, max-age={}'.format(ttl)}
+    headers.update(CORS_HEADERS)
+    if request.if_none_match.contains_weak(entry.etag):
+        return web.Response(status=304, headers=headers)
+    headers['Content-Type'] = entry.content_type
+    return web.Response(body=entry.body, headers=headers)
+
+
+def native_route(flask_app, endpoint, handler):
+    """
+    Wraps a native handler into an aiohttp handler that converts errors and results to responses, caches them like
+    the flask view of `endpoint` does and falls back to the flask app if the handler returns ``None``.
+
+    :param handler: a coroutine function taking an :class:`AioRequest` and a :class:`Database`, returning a JSON-API
+        document, a tuple of a document and a status code, or ``None``
+    """
+    ttl = getattr(flask_app.view_functions[endpoint], 'cache_ttl', None)
+
+    async def handle(request):
+        start = time.monotonic()
+        response = await respond(request)
+        # Requests passed to the flask app are recorded by its request hooks
+        if response is not None:
+            metrics.record_response(endpoint, request.method, response.status, start)
+            return response
+        return await request.app['wsgi'](request)
+
+    async def respond(request):
+        aio_request = AioRequest(request, endpoint)
+
+        storage = response_cache.storage
+        key = None
+        if storage is not None and ttl is not None:
+            route_ttl = response_cache.route_ttls.get(endpoint, ttl)
+            key = response_cache.get_key(aio_request)
+            entry = storage.get(key)
+            if entry is not None:
+                return cached_response(entry, route_ttl, aio_request)
+
+        try:
+            database = request.app['database']
+            if metrics.client is not None or slow_queries.recorder is not None:
+                database = InstrumentedDatabase(database, aio_request)
+            result = await handler(aio_request, database)
+        except InvalidUsage as error:
+            return json_response(error.to_dict(), error.status_code)
+
+        if result is None:
+            return None
+
+        status = 200
+        if isinstance(result, tuple):
+            result, status = result
+
+        if key is not None and status == 200:
+            body = flask_json.dumps(result, separators=(',', ':')).encode('utf-8')
+            entry = response_cache.CachedResponse(body, 'application/vnd.api+json', response_cache.make_etag(body))
+            storage.set(key, entry, route_ttl)
+            return cached_response(entry, route_ttl, aio_request)
+
+        return json_response(result, status)
+
+    return handle
+
+
+def create_app(flask_app, executor, database=None):
+    """
+    Creates the aiohttp application serving the native endpoints and mounting `flask_app` for everything else.
+
+    Supported configuration keys are ``AIO_DATABASE_POOL_MIN_SIZE`` and ``AIO_DATABASE_POOL_MAX_SIZE``.
+
+    :param executor: the executor the flask app is run on
+    :param database: an object with the :meth:`Database.fetch` method to use instead of a pool created from the
+        flask config
+    """
+    app = web.Application()
+    app['wsgi'] = WSGIHandler(flask_app, executor=executor)
+    app['database'] = database or Database()
+
+    app_context = flask_app.app_context()
+
+    async def on_startup(app):
+        # Everything runs on the event loop thread, so one app context serves all native handlers
+        app_context.push()
+        if database is None:
+            await app['database'].connect(
+                minsize=flask_app.config.get('AIO_DATABASE_POOL_MIN_SIZE', DEFAULT_POOL_MIN_SIZE),
+                maxsize=flask_app.config.get('AIO_DATABASE_POOL_MAX_SIZE', DEFAULT_POOL_MAX_SIZE),
+                autocommit=True, **flask_app.config['DATABASE'])
+
+    async def on_cleanup(app):
+        if database is None:
+            await app['database'].close()
+        app_context.pop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+
+    ladder_lock = asyncio.Lock()
+    routes = [
+        ('games', 'games', games_handler),
+        ('ranked1v1', 'ranked1v1', lambda request, database: ranked1v1_handler(request, database, ladder_lock)),
+        ('achievements', 'achievements_list', achievements_handler),
+        ('events', 'events_list', events_handler),
+        ('maps', 'maps', maps_handler),
+        ('mods', 'mods', mods_handler),
+    ]
+    for path, endpoint, handler in routes:
+        # The WSGI handler, used as fall back, expects the path in path_info
+        app.router.add_get('/{path_info:%s}' % path, native_route(flask_app, endpoint, handler))
+
+    add_wsgi_routes(app, flask_app, executor)
+    return app
+
+
+def create_wsgi_app(flask_app, executor):
+    """
+    Creates an aiohttp application passing all requests to `flask_app`, like ``aiohttp_wsgi.serve`` does, but
+    streaming the body of uploads.
+    """
+    app = web.Application()
+    app['wsgi'] = WSGIHandler(flask_app, executor=executor)
+    add_wsgi_routes(app, flask_app, executor)
+    return app
+
+
+def add_wsgi_routes(app, flask_app, executor):
+    """
+    Routes the requests to :data:`UPLOAD_PATHS` to a :class:`StreamingWSGIHandler` and all others to ``app['wsgi']``.
+    """
+    streaming = StreamingWSGIHandler(flask_app, executor=executor)
+    for path in UPLOAD_PATHS:
+        app.router.add_route('*', '/{path_info:%s}' % path, streaming)
+    app.router.add_route('*', '/{path_info:.*}', app['wsgi'])
+
+
+def serve(app, host='0.0.0.0', port=8080, sock=None):
+    """
+    Runs an aiohttp application until ``SIGTERM`` or ``SIGINT`` is received.
+
+    :param sock: an already listening socket to accept connections from instead of binding to `host` and `port`
+    """
+    if sock is not None:
+        web.run_app(app, sock=sock, print=None)
+    else:
+        web.run_app(app, host=host, port=port)
@@ -49,9 +49,9 @@ def jwt_auth():
     if not service_account:
         raise JWTError('Bad Request', 'Invalid service account')
 
-    jwt.decode(assertion, service_account.public_key, algorithms=['RS256'], options=dict(verify_aud=False))
+    jwt.decode(assertion, service_account.verifying_key, algorithms=['RS256'], options=dict(verify_aud=False))
 
-    identity = User.get_by_id(payload['sub'])
+    identity = get_jwt_identity(payload['sub'])
 
     access_token = flask_jwt.jwt_encode_callback(identity)
     return flask_jwt.auth_response_callback(access_token, identity)
@@ -1,8 +1,7 @@
 import json
-import os
 from peewee import IntegrityError
-from werkzeug.utils import secure_filename
 from api import *
+from api.uploads import receive_file, DEFAULT_MAX_SIZE
 
 from flask import request
 
@@ -36,12 +35,11 @@ def avatars():
     """
     if request.method == 'POST':
 
-        file = request.files['file']
-        filename = secure_filename(file.filename)
-        file.save(os.path.join(app.config['AVATAR_FOLDER'], filename))
+        _, form = receive_file(request, app.config['AVATAR_FOLDER'],
+                               app.config.get('AVATAR_UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE))
 
         try:
-            avatar = Avatar.create(url=app.config['AVATAR_URL'], tooltip=request.form['tooltip'])
+            avatar = Avatar.create(url=app.config['AVATAR_URL'], tooltip=form['tooltip'])
         except IntegrityError:
             return json.dumps(dict(error="Avatar already exists")), 400
 
@@ -0,0 +1,146 @@
+"""
+Process local caches.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    A thread-safe, size bounded LRU cache whose entries expire after a time to live.
+
+    :param max_size: maximum number of entries, the least recently used entry is evicted first. ``None`` for no limit
+    :param ttl: default number of seconds an entry is valid for. ``None`` for no expiry
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores `value` under `key`.
+
+        :param ttl: overrides the default time to live of the cache for this entry
+        """
+        if ttl is None:
+            ttl = self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._entries[key] = value, expires_at
+            self._entries.move_to_end(key)
+            if self.max_size is not None:
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_if(self, predicate):
+        """
+        Removes all entries for which ``predicate(key, value)`` returns ``True``.
+        """
+        with self._lock:
+            for key in [key for key, (value, _) in self._entries.items() if predicate(key, value)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the number of entries, hits and misses and the hit ratio of the cache.
+        """
+        total = self.hits + self.misses
+        return dict(size=len(self._entries), hits=self.hits, misses=self.misses,
+                    hit_ratio=self.hits / total if total else 0.0)
+
+
+class DefinitionCache(object):
+    """
+    Caches definitions (e.g. achievements or events) with their localized texts already resolved, per language and
+    region.
+
+    :param load: a callable taking ``language`` and ``region`` and returning the list of definition rows. Each row
+        must contain an ``id``
+    :param ttl: seconds after which the definitions are reloaded
+    """
+
+    def __init__(self, load, ttl=None):
+        self._load = load
+        self._cache = TTLCache(ttl=ttl)
+
+    @property
+    def ttl(self):
+        return self._cache.ttl
+
+    @ttl.setter
+    def ttl(self, ttl):
+        self._cache.ttl = ttl
+
+    def _get(self, language, region):
+        definitions = self._cache.get((language, region))
+        if definitions is None:
+            definitions = self._put(language, region, self._load(language, region))
+        return definitions
+
+    def _put(self, language, region, rows):
+        definitions = rows, {row['id']: row for row in rows}
+        self._cache.set((language, region), definitions)
+        return definitions
+
+    def peek(self, language='en', region='US'):
+        """
+        Returns all definitions like :meth:`get_all` if they are cached, ``None`` otherwise.
+        """
+        definitions = self._cache.get((language, region))
+        return definitions[0] if definitions is not None else None
+
+    def put(self, language, region, rows):
+        """
+        Caches definitions that were loaded elsewhere, e.g. by an asynchronous database driver.
+        """
+        self._put(language, region, rows)
+
+    def get_all(self, language='en', region='US'):
+        """
+        Returns all definitions, in the order they were loaded in. The rows must not be modified.
+        """
+        return self._get(language, region)[0]
+
+    def get(self, definition_id, language='en', region='US'):
+        """
+        Returns a single definition or ``None`` if there is none with this id. The row must not be modified.
+        """
+        return self._get(language, region)[1].get(definition_id)
+
+    def invalidate(self):
+        """
+        Drops all cached definitions, they are reloaded on next access.
+        """
+        self._cache.clear()
@@ -0,0 +1,116 @@
+"""
+Maintains ``clan_summary``, which holds the number of members of every clan.
+
+Counting the members of each listed clan otherwise takes a correlated subquery over ``clan_members`` for every row of
+/clans. With ``CLAN_SUMMARY_ENABLED``, /clans joins this table instead. The counts are kept up to date by triggers on
+``clan_members`` (see :func:`create_table`), :func:`check` finds and repairs counts that drifted anyway, e.g. because
+rows were changed while the triggers were missing (see ``clan_summary.py check --repair``).
+"""
+import logging
+
+import faf.db as db
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE = """CREATE TABLE IF NOT EXISTS clan_summary (
+    clan_id INT UNSIGNED NOT NULL,
+    member_count INT UNSIGNED NOT NULL,
+    PRIMARY KEY (clan_id)
+)"""
+
+# GREATEST() keeps a count that drifted to 0 from failing the DELETE, check() repairs it
+TRIGGERS = {
+    'clan_summary_insert': """CREATE TRIGGER clan_summary_insert AFTER INSERT ON clan_members FOR EACH ROW
+        INSERT INTO clan_summary (clan_id, member_count) VALUES (NEW.clan_id, 1)
+            ON DUPLICATE KEY UPDATE member_count = member_count + 1""",
+    'clan_summary_delete': """CREATE TRIGGER clan_summary_delete AFTER DELETE ON clan_members FOR EACH ROW
+        UPDATE clan_summary SET member_count = GREATEST(member_count, 1) - 1 WHERE clan_id = OLD.clan_id""",
+    'clan_summary_update': """CREATE TRIGGER clan_summary_update AFTER UPDATE ON clan_members FOR EACH ROW
+        BEGIN
+            IF NOT (NEW.clan_id <=> OLD.clan_id) THEN
+                UPDATE clan_summary SET member_count = GREATEST(member_count, 1) - 1 WHERE clan_id = OLD.clan_id;
+                INSERT INTO clan_summary (clan_id, member_count) VALUES (NEW.clan_id, 1)
+                    ON DUPLICATE KEY UPDATE member_count = member_count + 1;
+            END IF;
+        END""",
+}
+
+SUMMARIZE = """INSERT INTO clan_summary (clan_id, member_count)
+            SELECT clan_list.clan_id, COUNT(clan_members.clan_id)
+            FROM clan_list
+            LEFT OUTER JOIN clan_members ON clan_members.clan_id = clan_list.clan_id
+            {}
+            GROUP BY clan_list.clan_id
+            ON DUPLICATE KEY UPDATE member_count = VALUES(member_count)"""
+
+# Also covers summaries of clans that have been removed from clan_list, which SUMMARIZE doesn't touch
+RECOUNT = """UPDATE clan_summary
+            SET member_count = (SELECT COUNT(*) FROM clan_members WHERE clan_members.clan_id = clan_summary.clan_id)
+            WHERE clan_summary.clan_id IN ({})"""
+
+COUNT_MEMBERS = 'SELECT clan_id, COUNT(*) FROM clan_members GROUP BY clan_id'
+SUMMARY_COUNTS = 'SELECT clan_id, member_count FROM clan_summary'
+
+
+def create_table():
+    """
+    Creates ``clan_summary`` and (re)creates the triggers maintaining it.
+    """
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute(CREATE_TABLE)
+        for name, trigger in TRIGGERS.items():
+            cursor.execute('DROP TRIGGER IF EXISTS {}'.format(name))
+            cursor.execute(trigger)
+
+
+def summarize():
+    """
+    Counts the members of all clans.
+
+    :return: the number of affected rows as reported by MySQL
+    """
+    with db.connection:
+        cursor = db.connection.cursor()
+        return cursor.execute(SUMMARIZE.format(''))
+
+
+def repair_counts(clan_ids):
+    """
+    Counts the members of the given clans again.
+    """
+    placeholders = ','.join(['%s'] * len(clan_ids))
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute(SUMMARIZE.format('WHERE clan_list.clan_id IN ({})'.format(placeholders)), clan_ids)
+        cursor.execute(RECOUNT.format(placeholders), clan_ids)
+
+
+def check(repair=False):
+    """
+    Compares the summarized member counts with ``clan_members``.
+
+    :param repair: ``True`` to count the members of the clans whose summary is wrong again
+    :return: a dict mapping the ids of these clans to a tuple of the summarized and the actual member count
+    """
+    # Both counts are read in one transaction, so that they're taken from the same snapshot
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute(COUNT_MEMBERS)
+        actual = dict(cursor.fetchall())
+        cursor.execute(SUMMARY_COUNTS)
+        summarized = dict(cursor.fetchall())
+
+    mismatches = {clan_id: (summarized.get(clan_id, 0), actual.get(clan_id, 0))
+                  for clan_id in set(actual) | set(summarized)
+                  if summarized.get(clan_id, 0) != actual.get(clan_id, 0)}
+
+    for clan_id, (summarized_count, actual_count) in sorted(mismatches.items()):
+        logger.warning('Clan {} has {} members but a summarized member count of {}'.format(clan_id, actual_count,
+                                                                                             summarized_count))
+
+    if repair and mismatches:
+        repair_counts(sorted(mismatches))
+        logger.info('Repaired the member count of {} clans'.format(len(mismatches)))
+
+    return mismatches
@@ -1,17 +1,24 @@
-import faf.db as db
+from collections import OrderedDict
+
 from faf.api import ClanSchema
 from flask import request
+from pymysql.cursors import DictCursor
 
-from api import app
-from api.query_commons import fetch_data
+from api import app, InvalidUsage
+from api.db_pool import get_read_connection
+from api.query_commons import fetch_data, get_page_attributes, is_streamed, stream_response, prepare_fetch, \
+    get_select_expressions
+from api.response_cache import cached
 
 MAX_PAGE_SIZE = 10000
 CLAN_LIST = 'clan_list LEFT JOIN login AS leader ON clan_list.clan_leader_id = leader.id ' \
             + 'LEFT JOIN login AS founder ON clan_list.clan_founder_id = founder.id '
+SUMMARY_JOIN = 'LEFT OUTER JOIN clan_summary ON clan_summary.clan_id = clan_list.clan_id '
 
 COUNT_MEMBERS = '(SELECT COUNT(0) FROM clan_members WHERE (clan_list.clan_id = clan_members.clan_id))'
+SUMMARY_COUNT_MEMBERS = 'COALESCE(clan_summary.member_count, 0)'
 SELECT_EXPRESSIONS = {
-    'clan_id': 'clan_id',
+    'clan_id': 'clan_list.clan_id',
     'status': 'status',
     'clan_name': 'clan_name',
     'clan_tag': 'clan_tag',
@@ -24,24 +31,127 @@ SELECT_EXPRESSIONS = {
     'clan_members': COUNT_MEMBERS
 }
 
+MEMBER_SELECT_EXPRESSIONS = OrderedDict([
+    ('player_id', 'clan_members.player_id'),
+    ('player_name', 'member.login'),
+    ('join_clan_date', 'clan_members.join_clan_date'),
+])
+# One row per member, or a single row without member if the clan has none
+CLAN_DETAILS_QUERY = 'SELECT {}, {} FROM {}'.format(
+    get_select_expressions([field for field in SELECT_EXPRESSIONS if field != 'clan_members'], SELECT_EXPRESSIONS),
+    get_select_expressions(list(MEMBER_SELECT_EXPRESSIONS), MEMBER_SELECT_EXPRESSIONS), CLAN_LIST) \
+    + 'LEFT JOIN clan_members ON clan_members.clan_id = clan_list.clan_id ' \
+    + 'LEFT JOIN login AS member ON clan_members.player_id = member.id ' \
+    + 'WHERE clan_list.clan_id = %s ORDER BY clan_members.player_id'
+MEMBERS_QUERY = 'SELECT `clan_id`, `player_id`, `login`.`login` `player_name`, `join_clan_date` ' \
+                + 'FROM `clan_members` LEFT JOIN `login` ON `clan_members`.`player_id` = `login`.`id` ' \
+                + 'WHERE `clan_id` IN ({})'
+
+
+def get_clan_list():
+    """
+    Returns the FROM expression and the select expressions of /clans, which count the members using
+    ``clan_summary`` if ``CLAN_SUMMARY_ENABLED`` is set (see :mod:`api.clan_summary`).
+    """
+    if not app.config.get('CLAN_SUMMARY_ENABLED'):
+        return CLAN_LIST, SELECT_EXPRESSIONS
+
+    return CLAN_LIST + SUMMARY_JOIN, dict(SELECT_EXPRESSIONS, clan_members=SUMMARY_COUNT_MEMBERS)
+
+
+def load_members(clan_ids):
+    """
+    Loads the members of the given clans using a single query.
+
+    :return: an ordered dict mapping each clan id to the list of its members
+    """
+    members = OrderedDict((clan_id, []) for clan_id in clan_ids)
+    if not members:
+        return members
+
+    connection = get_read_connection()
+    with connection:
+        cursor = connection.cursor(DictCursor)
+        cursor.execute(MEMBERS_QUERY.format(','.join(['%s'] * len(members))), list(members))
+        for row in cursor.fetchall():
+            members[row.pop('clan_id')].append(row)
+
+    return members
+
 
 @app.route('/clans')
+@cached()
 def clans():
-    return fetch_data(ClanSchema(), CLAN_LIST, SELECT_EXPRESSIONS, MAX_PAGE_SIZE, request)
+    """
+    Lists all clans.
+
+    :param include: ``members`` to add the members of every listed clan as ``clan_member`` resources to
+        ``included``, referenced by the ``members`` relationship of each clan. Requires the ``clan_id`` field
+    """
+    table, select_expressions = get_clan_list()
+
+    include = request.values.get('include')
+    if include:
+        if include != 'members':
+            raise InvalidUsage('Invalid include')
+        return fetch_clans_with_members(table, select_expressions)
+
+    page, page_size = get_page_attributes(MAX_PAGE_SIZE, request)
+    if is_streamed(page_size):
+        return stream_response(fetch_data(ClanSchema(), table, select_expressions, MAX_PAGE_SIZE, request,
+                                          stream=True))
+
+    return fetch_data(ClanSchema(), table, select_expressions, MAX_PAGE_SIZE, request)
+
+
+def fetch_clans_with_members(table, select_expressions):
+    """
+    Fetches a page of clans like /clans and adds the members of all of them, loaded by :func:`load_members`.
+    """
+    query = prepare_fetch(ClanSchema(), table, select_expressions, MAX_PAGE_SIZE, request)
+
+    connection = get_read_connection()
+    with connection:
+        cursor = connection.cursor(DictCursor)
+        cursor.execute(query.sql, query.args)
+        rows = cursor.fetchall()
+
+    if rows and 'clan_id' not in rows[0]:
+        raise InvalidUsage('include=members requires the clan_id field')
+
+    clan_ids = [row['clan_id'] for row in rows]
+    members = load_members(clan_ids)
+
+    result = query.to_document(rows)
+    included = []
+    for resource, clan_id in zip(result['data'], clan_ids):
+        member_resources = [{'type': 'clan_member',
+                             'id': '{}-{}'.format(clan_id, member['player_id']),
+                             'attributes': dict(member, clan_id=clan_id)}
+                            for member in members[clan_id]]
+
+        resource['relationships'] = {'members': {'data': [{'type': 'clan_member', 'id': member_resource['id']}
+                                                          for member_resource in member_resources]}}
+        included.extend(member_resources)
+
+    result['included'] = included
+    return result
 
 
 @app.route('/clan/<int:id>')
 def clan_get(id):
-    with db.connection.cursor(db.pymysql.cursors.DictCursor) as cursor:
-        cursor.execute(
-            'SELECT clan_id, status, clan_name, clan_tag, clan_leader_id, clan_founder_id, clan_desc, create_date, '
-            + 'leader.login leader_name, founder.login founder_name, ' + COUNT_MEMBERS + ' clan_members '
-            + 'FROM ' + CLAN_LIST + 'WHERE clan_id = %s LIMIT 1', id)
-        if cursor.rowcount == 1:
-            clan_details = cursor.fetchall()
-            cursor.execute('SELECT `player_id`, `login`.`login` `player_name`, `join_clan_date` '
-                           + 'FROM `clan_members` LEFT JOIN `login` ON `clan_members`.`player_id` = `login`.`id` '
-                           + 'WHERE `clan_id` = %s ', id)
-            return {'clan_details': clan_details,
-                    'members': cursor.fetchall()}
-    return {}
+    connection = get_read_connection()
+    with connection:
+        cursor = connection.cursor(DictCursor)
+        cursor.execute(CLAN_DETAILS_QUERY, id)
+        rows = cursor.fetchall()
+
+    if not rows:
+        return {}
+
+    clan_details = {field: value for field, value in rows[0].items() if field not in MEMBER_SELECT_EXPRESSIONS}
+    members = [{field: row[field] for field in MEMBER_SELECT_EXPRESSIONS} for row in rows
+               if row['player_id'] is not None]
+    clan_details['clan_members'] = len(members)
+    return {'clan_details': [clan_details],
+            'members': members}
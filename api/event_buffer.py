@@ -0,0 +1,226 @@
+"""
+Write-behind buffer for event counters.
+
+When ``EVENT_WRITE_BEHIND`` is enabled, recorded events are summed up per ``(player_id, event_id)`` in memory and
+written to the database by a background thread, either every ``EVENT_FLUSH_INTERVAL_MS`` milliseconds or as soon as
+``EVENT_FLUSH_MAX_ENTRIES`` counters are pending. Each worker process has its own buffer, so counts returned to a
+client only include the increments still pending in the worker that served the request.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from api.invalid_usage import InvalidUsage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL_MS = 1000
+DEFAULT_FLUSH_MAX_ENTRIES = 500
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TIMEOUT = 5
+
+buffer = None
+
+
+class EventBuffer(object):
+    """
+    Aggregates event increments and writes them out in batches.
+
+    :param write: a callable taking a dict of ``(player_id, event_id)`` to the count to add, which persists it
+    :param flush_interval: seconds between two flushes
+    :param flush_entries: number of pending counters that triggers a flush before the interval elapsed
+    :param max_entries: maximum number of pending counters. Recording further events blocks until a flush made room
+    :param timeout: seconds to wait for room before giving up
+    """
+
+    def __init__(self, write, flush_interval=DEFAULT_FLUSH_INTERVAL_MS / 1000, flush_entries=DEFAULT_FLUSH_MAX_ENTRIES,
+                 max_entries=DEFAULT_MAX_ENTRIES, timeout=DEFAULT_TIMEOUT):
+        self._write = write
+        self.flush_interval = flush_interval
+        self.flush_entries = flush_entries
+        self.max_entries = max_entries
+        self.timeout = timeout
+
+        self._pending = {}
+        self._in_flight = {}
+        self._stopped = False
+        self._thread = None
+        self._condition = threading.Condition()
+        # Incremented when a batch starts and finishes being written. Readers compare it before and after reading the
+        # database, so that they never count a batch both in the database and in memory
+        self._generation = 0
+        self._flushing = False
+        # Only lets one flush run at a time
+        self._flush_lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._stopped
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='event-buffer-flusher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the flusher thread and writes out everything that is still pending.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._stopped and len(self._pending) < self.flush_entries:
+                    self._condition.wait(self.flush_interval)
+                if self._stopped:
+                    return
+            self.flush()
+
+    def _new_keys(self, player_id, counts):
+        return sum(1 for event_id in counts if (player_id, event_id) not in self._pending)
+
+    def add(self, player_id, counts):
+        """
+        Adds increments for a player.
+
+        :param counts: a dict of event id to the count to add
+        :raises InvalidUsage: if the buffer stayed full for longer than ``timeout`` seconds
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            new_keys = self._new_keys(player_id, counts)
+            while new_keys and self._pending and len(self._pending) + new_keys > self.max_entries:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise InvalidUsage('Too many pending events, try again later', status_code=503)
+                self._condition.notify_all()
+                self._condition.wait(remaining)
+                new_keys = self._new_keys(player_id, counts)
+
+            for event_id, count in counts.items():
+                key = player_id, event_id
+                self._pending[key] = self._pending.get(key, 0) + count
+
+            if len(self._pending) >= self.flush_entries:
+                self._condition.notify_all()
+
+    def pending(self, player_id, event_id):
+        """
+        Returns the count of an event that has been recorded but is not yet committed to the database.
+        """
+        key = player_id, event_id
+        with self._condition:
+            return self._pending.get(key, 0) + self._in_flight.get(key, 0)
+
+    def counts(self, player_id, event_ids, read):
+        """
+        Returns the current counts of events, including pending increments.
+
+        :param read: a callable taking the list of event ids and returning a dict of event id to the count stored in
+            the database. No lock is held while it runs. If a flush started in the meantime, it is called again
+        :raises InvalidUsage: if a flush stayed in progress for longer than ``timeout`` seconds
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                # Whether an in-flight batch is already committed can't be told, so wait for the flush to finish
+                while self._flushing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise InvalidUsage('Too many pending events, try again later', status_code=503)
+                    self._condition.wait(remaining)
+
+                generation = self._generation
+                pending = {event_id: self._pending.get((player_id, event_id), 0) for event_id in event_ids}
+
+            stored = read(event_ids)
+
+            with self._condition:
+                if self._generation == generation:
+                    return {event_id: stored.get(event_id, 0) + pending[event_id] for event_id in event_ids}
+
+    def flush(self):
+        """
+        Writes all pending increments. If writing fails, the increments are kept and retried with the next flush.
+
+        :return: the number of counters written
+        """
+        with self._flush_lock:
+            with self._condition:
+                entries, self._pending = self._pending, {}
+                if not entries:
+                    return 0
+
+                self._in_flight = entries
+                self._flushing = True
+                self._generation += 1
+                self._condition.notify_all()
+
+            try:
+                self._write(entries)
+                written = len(entries)
+            except Exception:
+                logger.exception('Could not write {} buffered event counters'.format(len(entries)))
+                written = 0
+                with self._condition:
+                    for key, count in entries.items():
+                        self._pending[key] = self._pending.get(key, 0) + count
+
+            with self._condition:
+                self._in_flight = {}
+                self._flushing = False
+                self._generation += 1
+                self._condition.notify_all()
+            return written
+
+
+def init_event_buffer(app, write):
+    """
+    Starts the write-behind buffer if ``EVENT_WRITE_BEHIND`` is enabled in the flask config, replacing any buffer
+    started before. Each flush calls `write` within an app context of `app`.
+
+    Further supported configuration keys are ``EVENT_FLUSH_INTERVAL_MS``, ``EVENT_FLUSH_MAX_ENTRIES``,
+    ``EVENT_BUFFER_MAX_ENTRIES`` and ``EVENT_BUFFER_TIMEOUT``.
+    """
+    global buffer
+    if buffer is not None:
+        buffer.stop()
+        buffer = None
+
+    if not app.config.get('EVENT_WRITE_BEHIND'):
+        return None
+
+    def write_in_app_context(entries):
+        # Tearing down the context returns the connection to the pool, discarding it if the write failed
+        with app.app_context():
+            write(entries)
+
+    buffer = EventBuffer(write_in_app_context,
+                         flush_interval=app.config.get('EVENT_FLUSH_INTERVAL_MS', DEFAULT_FLUSH_INTERVAL_MS) / 1000,
+                         flush_entries=app.config.get('EVENT_FLUSH_MAX_ENTRIES', DEFAULT_FLUSH_MAX_ENTRIES),
+                         max_entries=app.config.get('EVENT_BUFFER_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+                         timeout=app.config.get('EVENT_BUFFER_TIMEOUT', DEFAULT_TIMEOUT))
+    buffer.start()
+    return buffer
+
+
+def get_event_buffer():
+    """
+    Returns the running write-behind buffer, or ``None`` if events are written to the database directly.
+    """
+    if buffer is not None and buffer.running:
+        return buffer
+    return None
+
+
+@atexit.register
+def _flush_on_exit():
+    if buffer is not None:
+        buffer.stop()
@@ -1,10 +1,16 @@
+from collections import OrderedDict
 from copy import copy
 from faf.api import PlayerEventSchema
 from faf.api.event_schema import EventSchema
+from flask import request
 from flask_jwt import jwt_required, current_identity
 from api import *
 import faf.db as db
-from api.query_commons import fetch_data
+from api.cache import DefinitionCache
+from api.db_pool import get_read_connection
+from api.event_buffer import get_event_buffer
+from api.query_commons import fetch_data, dump_rows, get_select_expressions
+from api.response_cache import cached, invalidate
 
 MAX_PAGE_SIZE = 1000
 
@@ -28,6 +34,8 @@ EVENTS_SELECT_EXPRESSIONS = {
     'name': 'COALESCE(name_langReg.value, name_lang.value, name_def.value)'
 }
 
+DEFAULT_DEFINITIONS_CACHE_TTL = 300
+
 PLAYER_EVENTS_SELECT_EXPRESSIONS = {
     'id': 'id',
     'player_id': 'player_id',
@@ -36,7 +44,45 @@ PLAYER_EVENTS_SELECT_EXPRESSIONS = {
 }
 
 
+def load_event_definitions(language, region):
+    connection = get_read_connection()
+    with connection:
+        cursor = connection.cursor(db.pymysql.cursors.DictCursor)
+        cursor.execute(*get_definitions_query(language, region))
+        return cursor.fetchall()
+
+
+def get_definitions_query(language, region):
+    """
+    Returns the query loading all event definitions and its arguments.
+    """
+    return ('SELECT {} FROM {}'.format(get_select_expressions(None, EVENTS_SELECT_EXPRESSIONS), EVENTS_TABLE),
+            {'language': language, 'region': region})
+
+
+definitions = DefinitionCache(load_event_definitions, ttl=DEFAULT_DEFINITIONS_CACHE_TTL)
+
+
+def get_definitions():
+    """
+    Returns the event definition cache, which resolves the localized name of every event once per language and
+    region.
+    """
+    definitions.ttl = app.config.get('DEFINITIONS_CACHE_TTL', DEFAULT_DEFINITIONS_CACHE_TTL)
+    return definitions
+
+
+def invalidate_definitions():
+    """
+    Drops the cached event definitions and responses of ``/events``, e.g. after the definitions have been changed in
+    the database.
+    """
+    definitions.invalidate()
+    invalidate('events_list')
+
+
 @app.route('/events')
+@cached(ttl=DEFAULT_DEFINITIONS_CACHE_TTL)
 def events_list():
     """
     Lists all event definitions.
@@ -79,8 +125,8 @@ def events_list():
     language = request.args.get('language', 'en')
     region = request.args.get('region', 'US')
 
-    return fetch_data(EventSchema(), EVENTS_TABLE, EVENTS_SELECT_EXPRESSIONS, MAX_PAGE_SIZE, request,
-                      args={'language': language, 'region': region})
+    return dump_rows(EventSchema(), get_definitions().get_all(language, region), EVENTS_SELECT_EXPRESSIONS,
+                     MAX_PAGE_SIZE, request)
 
 
 @app.route('/events/recordMultiple', methods=['POST'])
@@ -201,6 +247,9 @@ def record_event(event_id, player_id, count):
               "count": long
             }
     """
+    if get_event_buffer() is not None:
+        result = record_multiple(player_id, [dict(event_id=event_id, count=count)])
+        return dict(count=result['updated_events'][0]['count'])
 
     with db.connection:
         cursor = db.connection.cursor(db.pymysql.cursors.DictCursor)
@@ -225,15 +274,101 @@ def record_event(event_id, player_id, count):
 
 
 def record_multiple(player_id, updates):
+    """Records multiple events for a player within a single transaction. This function is NOT an endpoint.
+
+    Counts of the same event are summed up and all events are written using one multi-row insert, the new counts are
+    read back using one query. If write-behind is enabled, the counts are added to the event buffer instead. The count
+    returned for each update is the same as if the updates had been recorded one after another.
+
+    :param player_id: ID of the player to record the events for
+    :param updates: a list of dictionaries with the keys ``event_id`` and ``count``
+
+    :return:
+        If successful, this method returns a dictionary with the following structure::
+
+            {
+              "updated_events": [
+                {
+                  "event_id": string,
+                  "count": integer
+                }
+              ]
+            }
+    """
     result = {'updated_events': []}
+    if not updates:
+        return result
 
+    counts = OrderedDict()
     for update in updates:
+        counts[update['event_id']] = counts.get(update['event_id'], 0) + int(update['count'])
+
+    buffer = get_event_buffer()
+    if buffer is not None:
+        buffer.add(player_id, counts)
+        new_counts = buffer.counts(player_id, list(counts.keys()), lambda event_ids: read_counts(player_id, event_ids))
+    else:
+        with db.connection:
+            cursor = db.connection.cursor(db.pymysql.cursors.DictCursor)
+            upsert_events(cursor, [(player_id, event_id, count) for event_id, count in counts.items()])
+            new_counts = select_counts(cursor, player_id, list(counts.keys()))
+
+    # Walk the updates backwards to find the count each of them would have resulted in on its own
+    update_counts = []
+    for update in reversed(updates):
         event_id = update['event_id']
-        count = update['count']
-
-        update_result = dict(event_id=event_id)
-        update_result['count'] = record_event(event_id, player_id, count)['count']
+        update_counts.append(new_counts[event_id])
+        new_counts[event_id] -= int(update['count'])
 
-        result['updated_events'].append(update_result)
+    for update, count in zip(updates, reversed(update_counts)):
+        result['updated_events'].append(dict(event_id=update['event_id'], count=count))
 
     return result
+
+
+def upsert_events(cursor, rows):
+    """
+    Adds counts to player events using one multi-row insert.
+
+    :param rows: a list of ``(player_id, event_id, count)`` tuples
+    """
+    values = []
+    for row in rows:
+        values.extend(row)
+
+    cursor.execute("""INSERT INTO player_events (player_id, event_id, count)
+                    VALUES {}
+                    ON DUPLICATE KEY UPDATE
+                        count = count + VALUES(count)""".format(','.join(['(%s, %s, %s)'] * len(rows))),
+                   values)
+
+
+def select_counts(cursor, player_id, event_ids):
+    """
+    Returns a dict of event id to the count stored for the player, events that haven't been recorded are missing.
+    """
+    cursor.execute("""SELECT
+                        event_id,
+                        count
+                    FROM player_events
+                    WHERE player_id = %s AND event_id IN ({})""".format(','.join(['%s'] * len(event_ids))),
+                   [player_id] + list(event_ids))
+
+    return {row['event_id']: row['count'] for row in cursor.fetchall()}
+
+
+def read_counts(player_id, event_ids):
+    with db.connection:
+        cursor = db.connection.cursor(db.pymysql.cursors.DictCursor)
+        return select_counts(cursor, player_id, event_ids)
+
+
+def write_events(entries):
+    """
+    Writes the increments collected by the event buffer.
+
+    :param entries: a dict of ``(player_id, event_id)`` to the count to add
+    """
+    with db.connection:
+        cursor = db.connection.cursor()
+        upsert_events(cursor, [(player_id, event_id, count) for (player_id, event_id), count in entries.items()])
@@ -0,0 +1,119 @@
+"""
+Maintains ``game_summary``, which holds the player count and the minimum and maximum global and ladder rating of
+every game.
+
+Filtering /games by player count or rating otherwise requires correlated subqueries over ``game_player_stats`` for
+every game, applied through HAVING. With ``GAME_SUMMARY_ENABLED``, /games joins this table instead and only falls
+back to the subqueries for games that haven't been summarized yet.
+
+Ratings are those of the players at the time a game is summarized. :func:`update` summarizes each game only once, so
+if it runs periodically (see ``game_summary.py update --interval``), these are the ratings shortly after the game
+started and they don't change afterwards. :func:`backfill` summarizes past games using the current ratings.
+"""
+import logging
+
+import faf.db as db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 10000
+# Games are not necessarily launched in the order of their ids, so update() also looks for unsummarized games among
+# this many ids before the last summarized one
+DEFAULT_UPDATE_OVERLAP = 1000
+
+CREATE_TABLE = """CREATE TABLE IF NOT EXISTS game_summary (
+    game_id INT UNSIGNED NOT NULL,
+    player_count SMALLINT UNSIGNED NOT NULL,
+    min_global_rating INT NULL,
+    max_global_rating INT NULL,
+    min_ladder_rating INT NULL,
+    max_ladder_rating INT NULL,
+    PRIMARY KEY (game_id),
+    KEY player_count (player_count),
+    KEY min_global_rating (min_global_rating),
+    KEY max_global_rating (max_global_rating),
+    KEY min_ladder_rating (min_ladder_rating),
+    KEY max_ladder_rating (max_ladder_rating)
+)"""
+
+SUMMARIZE = """INSERT INTO game_summary
+                (game_id, player_count, min_global_rating, max_global_rating, min_ladder_rating, max_ladder_rating)
+            SELECT
+                gps.gameId,
+                COUNT(*),
+                MIN(ROUND(gr.mean - 3 * gr.deviation)),
+                MAX(ROUND(gr.mean - 3 * gr.deviation)),
+                MIN(ROUND(lr.mean - 3 * lr.deviation)),
+                MAX(ROUND(lr.mean - 3 * lr.deviation))
+            FROM game_player_stats gps
+            LEFT OUTER JOIN global_rating gr ON gr.id = gps.playerId
+            LEFT OUTER JOIN ladder1v1_rating lr ON lr.id = gps.playerId
+            WHERE gps.gameId BETWEEN %s AND %s
+            GROUP BY gps.gameId
+            {}"""
+
+REPLACE_EXISTING = """ON DUPLICATE KEY UPDATE
+                player_count = VALUES(player_count),
+                min_global_rating = VALUES(min_global_rating),
+                max_global_rating = VALUES(max_global_rating),
+                min_ladder_rating = VALUES(min_ladder_rating),
+                max_ladder_rating = VALUES(max_ladder_rating)"""
+
+KEEP_EXISTING = "ON DUPLICATE KEY UPDATE game_id = game_id"
+
+
+def create_table():
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute(CREATE_TABLE)
+
+
+def summarize(first_game_id, last_game_id, replace=True):
+    """
+    Summarizes all games with an id between `first_game_id` and `last_game_id` (inclusive).
+
+    :param replace: ``False`` to keep the summaries of games that have already been summarized
+    :return: the number of affected rows as reported by MySQL
+    """
+    with db.connection:
+        cursor = db.connection.cursor()
+        return cursor.execute(SUMMARIZE.format(REPLACE_EXISTING if replace else KEEP_EXISTING),
+                              (first_game_id, last_game_id))
+
+
+def backfill(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Summarizes all games, newest first, in transactions of `batch_size` game ids each.
+    """
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute('SELECT MIN(gameId), MAX(gameId) FROM game_player_stats')
+        first_game_id, last_game_id = cursor.fetchone()
+
+    if first_game_id is None:
+        return
+
+    while last_game_id >= first_game_id:
+        batch_start = max(first_game_id, last_game_id - batch_size + 1)
+        summarize(batch_start, last_game_id)
+        logger.info('Summarized games {} to {}'.format(batch_start, last_game_id))
+        last_game_id = batch_start - 1
+
+
+def update(overlap=DEFAULT_UPDATE_OVERLAP):
+    """
+    Summarizes all games that started since the previous update. Games that are already summarized are left as they
+    are, so that their ratings remain those at the time they started.
+    """
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute('SELECT MAX(game_id) FROM game_summary')
+        last_summarized = cursor.fetchone()[0] or 0
+
+        cursor.execute('SELECT MAX(gameId) FROM game_player_stats')
+        last_game_id = cursor.fetchone()[0]
+
+    if last_game_id is None:
+        return
+
+    summarize(max(0, last_summarized - overlap + 1), last_game_id, replace=False)
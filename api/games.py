@@ -2,8 +2,10 @@ from faf.api.game_stats_schema import GameStats
 from faf.game_validity import GameValidity
 from faf.victory_condition import VictoryCondition
 from flask import request
-from api import app, InvalidUsage
-from api.query_commons import fetch_data, get_page_attributes, get_limit
+from api import app, InvalidUsage, metrics
+from api.db_pool import get_read_connection
+from api.query_commons import fetch_data, get_page_attributes, get_limit, get_page_cursor, decode_cursor, \
+    get_page_links, is_streamed, stream_response, get_id_filter, get_limit_args, LIMIT_ARGS_EXPRESSION
 from iso8601 import parse_date, ParseError
 
 MAX_GAME_PAGE_SIZE = 1000
@@ -13,6 +15,7 @@ GAME_STATS_TABLE = 'game_stats gs'
 GAME_PLAYER_STATS_TABLE = 'game_player_stats gps'
 
 GAME_PLAYER_STATS_JOIN = ' INNER JOIN game_player_stats gps ON gs.id = gps.gameId'
+GAME_STATS_JOIN = ' INNER JOIN game_stats gs ON gs.id = gps.gameId'
 MAP_JOIN = ' INNER JOIN table_map tmap ON tmap.id = gs.mapId'
 FEATURED_MOD_JOIN = ' INNER JOIN game_featuredMods gfmod ON gfmod.id = gs.gameMod'
 LOGIN_JOIN = ' INNER JOIN login l ON l.id = gps.playerId'
@@ -24,32 +27,56 @@ RATING_EXPRESSION = '(ROUND(r.mean-3*r.deviation)) FROM ' + GAME_PLAYER_STATS_TA
 MIN_RATING_HEADER_EXPRESSION = '(SELECT MIN'
 MAX_RATING_HEADER_EXPRESSION = '(SELECT MAX'
 HEADER = GAME_STATS_TABLE + GAME_PLAYER_STATS_JOIN + LOGIN_JOIN + MAP_JOIN + FEATURED_MOD_JOIN + '{}'
-SUBQUERY_HEADER = ' WHERE gs.id IN (SELECT * FROM (SELECT {} FROM {}'
 SUBQUERY_ORDER_BY = ' ORDER BY {} DESC'
-SUBQUERY_FOOTER = ' {}) AS games)'
+GAME_IDS_HEADER = 'SELECT {} FROM {}'
+GAME_IDS_ORDER_BY = ' ORDER BY {} DESC {}'
+GAME_IDS_WHERE_EXPRESSION = 'gs.id IN ({})'
 
-GROUP_BY_EXPRESSION = ' GROUP BY gameId HAVING COUNT(*) > {} '
+# Games that haven't been summarized yet fall back to the subqueries
+SUMMARY_JOIN = ' LEFT OUTER JOIN game_summary gsum ON gsum.game_id = gs.id'
+SUMMARY_PLAYER_COUNT_EXPRESSION = 'COALESCE(gsum.player_count, ' + PLAYER_COUNT_EXPRESSION + ')'
+SUMMARY_RATING_EXPRESSION = 'COALESCE(gsum.{}_{}_rating, {})'
+
+GROUP_BY_EXPRESSION = ' GROUP BY gps.gameId HAVING COUNT(*) > {}'
 MAP_NAME_WHERE_EXPRESSION = '{} tmap.name = %s'
-MAX_PLAYER_WHERE_EXPRESSION = 'player_count <= %s'
-MIN_PLAYER_WHERE_EXPRESSION = 'player_count >= %s'
 VICTORY_CONDITION_WHERE_EXPRESSION = 'gs.gameType = %s'
 GAME_MOD_WHERE_EXPRESSION = '{}.{} = %s'
 GAME_MOD_WHERE_ID = 'gs', 'gameMod'
 GAME_MOD_WHERE_NAME = 'gfmod', 'name'
-MAX_RATING_HAVING_EXPRESSION = 'max_rating <= %s'
-MIN_RATING_HAVING_EXPRESSION = 'min_rating >= %s'
-MAX_DATE_HAVING_EXPRESSION = 'startTime <= %s'
-MIN_DATE_HAVING_EXPRESSION = 'startTime >= %s'
+MAX_BOUND_WHERE_EXPRESSION = '{} <= %s'
+MIN_BOUND_WHERE_EXPRESSION = '{} >= %s'
+MAX_DATE_WHERE_EXPRESSION = 'gs.startTime <= %s'
+MIN_DATE_WHERE_EXPRESSION = 'gs.startTime >= %s'
 
 GAMES_NO_FILTER_EXPRESSION = GAME_PLAYER_STATS_TABLE + ' INNER JOIN (SELECT * FROM ' + GAME_STATS_TABLE + \
                              SUBQUERY_ORDER_BY + ' {}) AS gs ON gs.id = gps.gameId' \
                              + LOGIN_JOIN + MAP_JOIN + FEATURED_MOD_JOIN + GLOBAL_JOIN
+GAMES_CURSOR_EXPRESSION = GAME_PLAYER_STATS_TABLE + ' INNER JOIN (SELECT * FROM ' + GAME_STATS_TABLE + \
+                          ' {} ORDER BY gs.id {} {}) AS gs ON gs.id = gps.gameId' \
+                          + LOGIN_JOIN + MAP_JOIN + FEATURED_MOD_JOIN + GLOBAL_JOIN
+CURSOR_AFTER_WHERE_EXPRESSION = 'WHERE gs.id < %s'
+CURSOR_BEFORE_WHERE_EXPRESSION = 'WHERE gs.id > %s'
 
 AND = ' AND '
 WHERE = ' WHERE '
-HAVING = ' HAVING '
 NOT = ' NOT'
 
+# build_query argument names to filter[] parameter names
+FILTER_PARAMETERS = {
+    'player_list': 'players',
+    'map_name': 'map_name',
+    'map_exclude': 'map_exclude',
+    'max_rating': 'max_rating',
+    'min_rating': 'min_rating',
+    'victory_condition': 'victory_condition',
+    'game_mod': 'mod',
+    'rating_type': 'rating_type',
+    'max_players': 'max_player_count',
+    'min_players': 'min_player_count',
+    'max_datetime': 'max_datetime',
+    'min_datetime': 'min_datetime',
+}
+
 GAME_SELECT_EXPRESSIONS = {
     'id': 'gs.id',
     'game_name': 'gameName',
@@ -102,6 +129,13 @@ def games():
         max_datetime         string            Inclusive latest datetime (iso8601 format), based on game start time
         min_datetime         string            Inclusive earliest datetime (iso8601 format), based on game start time
 
+        Instead of ``page[number]``, unfiltered requests may page using the opaque cursors ``page[after]`` and
+        ``page[before]`` as returned in ``links.next`` and ``links.prev``. Pass an empty ``page[after]`` to get the
+        first page.
+
+        ``filter[id]`` takes a comma delimited list of game ids and returns these games instead of a page. It can
+        only be combined with ``filter[rating_type]``.
+
     :return:
         If successful, this method returns a response body with the following structure:
 
@@ -139,47 +173,113 @@ def games():
 
     """
 
-    player_list = request.args.get('filter[players]')
-    map_name = request.args.get('filter[map_name]')
-    map_exclude = request.args.get('filter[map_exclude]')
-    max_rating = request.args.get('filter[max_rating]')
-    min_rating = request.args.get('filter[min_rating]')
-    victory_condition = request.args.get('filter[victory_condition]')
-    game_mod = request.args.get('filter[mod]')
-    rating_type = request.args.get('filter[rating_type]')
-    max_players = request.args.get('filter[max_player_count]')
-    min_players = request.args.get('filter[min_player_count]')
-    max_datetime = request.args.get('filter[max_datetime]')
-    min_datetime = request.args.get('filter[min_datetime]')
+    filters = get_filters(request)
 
     page, page_size = get_page_attributes(MAX_PLAYER_PAGE_SIZE, request)
     limit_expression = get_limit(page, page_size)
+    page_cursor = get_page_cursor(request)
 
-    errors = check_syntax_errors(map_exclude, map_name, max_datetime, min_datetime)
+    errors = check_syntax_errors(filters['map_exclude'], filters['map_name'], filters['max_datetime'],
+                                 filters['min_datetime'])
     if errors:
         return errors
 
-    if player_list or map_name or max_rating or min_rating or rating_type or victory_condition or game_mod \
-            or max_players or min_players or max_datetime or min_datetime:
-        select_expression, args, limit = build_query(victory_condition, map_name, map_exclude, max_rating, min_rating,
-                                                     player_list, rating_type, max_players, min_players, max_datetime,
-                                                     min_datetime, game_mod, limit_expression)
+    filtered = is_filtered(filters)
+    game_ids = get_game_id_filter(request, filters, page_cursor)
+    stream = is_streamed(page_size)
 
-        player_select_expression = PLAYER_SELECT_EXPRESSIONS
-        player_select_expression['max_rating'] = build_rating_selector(rating_type, MAX_RATING_HEADER_EXPRESSION)
-        player_select_expression['min_rating'] = build_rating_selector(rating_type, MIN_RATING_HEADER_EXPRESSION)
+    if game_ids is not None:
+        result = fetch_games(game_ids, filters['rating_type'], stream)
+        if stream:
+            return stream_response(group_game_results(result))
+        return sort_game_results(result)
 
-        result = fetch_data(GameStats(), select_expression, GAME_SELECT_EXPRESSIONS,
-                            MAX_PLAYER_PAGE_SIZE, request, args=args, sort='-id', enricher=enricher, limit=limit,
-                            players=player_select_expression)
+    if page_cursor:
+        if filtered:
+            raise InvalidUsage('Cursor pagination is not supported with filters')
+        return games_by_cursor(page_cursor, page_size)
+
+    if filtered:
+        # Resolve the ids of the page first, so that only the rows of these games are joined and fetched
+        game_ids = fetch_game_ids(*build_query(limit_expression=limit_expression, **filters))
+        if not game_ids:
+            return stream_response(iter(())) if stream else {'data': []}
+
+        result = fetch_games(game_ids, filters['rating_type'], stream)
     else:
+        # The page is passed as arguments, so that all pages share one cached query plan
         result = fetch_data(GameStats(),
-                            GAMES_NO_FILTER_EXPRESSION.format('gs.id', limit_expression),
-                            GAME_SELECT_EXPRESSIONS, MAX_PLAYER_PAGE_SIZE, request, sort='-id', enricher=enricher,
-                            limit=False, players=PLAYER_SELECT_EXPRESSIONS)
+                            GAMES_NO_FILTER_EXPRESSION.format('gs.id', LIMIT_ARGS_EXPRESSION),
+                            GAME_SELECT_EXPRESSIONS, MAX_PLAYER_PAGE_SIZE, request,
+                            args=get_limit_args(page, page_size), sort='-id', enricher=enricher, limit=False,
+                            stream=stream, players=PLAYER_SELECT_EXPRESSIONS)
+
+    if stream:
+        return stream_response(group_game_results(result))
     return sort_game_results(result)
 
 
+def get_filters(request):
+    """
+    Returns the filter parameters of a /games request by the name of the corresponding :func:`build_query` argument.
+    """
+    return {argument: request.args.get('filter[{}]'.format(parameter))
+            for argument, parameter in FILTER_PARAMETERS.items()}
+
+
+def is_filtered(filters):
+    return any(value for argument, value in filters.items() if argument != 'map_exclude')
+
+
+def get_game_id_filter(request, filters, page_cursor):
+    """
+    Returns the game ids requested using ``filter[id]``, or ``None`` if the parameter wasn't passed.
+
+    :raises InvalidUsage: if the ids are combined with other filters than the rating type or with a page cursor
+    """
+    game_ids = get_id_filter(request, int)
+    if game_ids is None:
+        return None
+
+    if page_cursor or any(value for argument, value in filters.items() if argument != 'rating_type'):
+        raise InvalidUsage('filter[id] can only be combined with filter[rating_type]')
+
+    return game_ids
+
+
+def games_by_cursor(page_cursor, page_size):
+    """
+    Fetches a page of unfiltered games using a game id cursor instead of an offset, so that deep pages are resolved
+    by an index range scan on ``game_stats``.
+    """
+    before, cursor = page_cursor
+
+    where = ''
+    args = []
+    if cursor:
+        where = CURSOR_BEFORE_WHERE_EXPRESSION if before else CURSOR_AFTER_WHERE_EXPRESSION
+        args = list(decode_cursor(cursor, 1))
+
+    # Fetch one additional game to find out whether there is another page
+    table = GAMES_CURSOR_EXPRESSION.format(where, 'ASC' if before else 'DESC', 'LIMIT %s')
+    args.append(page_size + 1)
+    result = sort_game_results(fetch_data(GameStats(), table, GAME_SELECT_EXPRESSIONS, MAX_PLAYER_PAGE_SIZE,
+                                          request, args=args, sort='-id', enricher=enricher, limit=False,
+                                          players=PLAYER_SELECT_EXPRESSIONS))
+
+    data = result['data']
+    has_more = len(data) > page_size
+    if has_more:
+        result['data'] = data = data[1:] if before else data[:page_size]
+
+    first_values = [data[0]['id']] if data else None
+    last_values = [data[-1]['id']] if data else None
+    result['links'] = get_page_links(request, first_values, last_values,
+                                     has_previous=has_more if before else bool(cursor),
+                                     has_next=True if before else has_more)
+    return result
+
+
 @app.route('/games/<game_id>')
 def game(game_id):
     result = fetch_data(GameStats(),
@@ -216,57 +316,133 @@ def check_syntax_errors(map_exclude, map_name, max_datetime, min_datetime):
 
 def build_query(victory_condition, map_name, map_exclude, max_rating, min_rating, player_list, rating_type, max_players,
                 min_players, max_datetime, min_datetime, game_mod, limit_expression):
-    table_expression = HEADER
-    having_expression = ''
-    first = True
+    """
+    Builds the first phase of a filtered search: a query selecting only the ids of the games on the requested page.
 
-    subquery_expression, args, limit = build_subquery(victory_condition, map_name, map_exclude,
-                                                      player_list, game_mod, limit_expression)
+    All filters are applied in the WHERE clause of this query. Player count and rating bounds are compared to
+    correlated subqueries per candidate game, or to the columns of ``game_summary`` if enabled, using the subqueries
+    only for games that haven't been summarized yet. The rows of these games are then fetched by id, see
+    :func:`fetch_games`.
+
+    :return: a tuple of the query and its arguments
+    """
+    table_expression, id_expression, where_expression, group_by_expression, args, first = \
+        build_game_filter(victory_condition, map_name, map_exclude, player_list, game_mod)
+
+    if is_summary_enabled():
+        table_expression += SUMMARY_JOIN
+        player_count_expression = SUMMARY_PLAYER_COUNT_EXPRESSION
+    else:
+        player_count_expression = PLAYER_COUNT_EXPRESSION
+    rating_bounds = ((max_rating, MAX_BOUND_WHERE_EXPRESSION.format(get_rating_expression('max', rating_type))),
+                     (min_rating, MIN_BOUND_WHERE_EXPRESSION.format(get_rating_expression('min', rating_type))))
+    player_bounds = ((max_players, MAX_BOUND_WHERE_EXPRESSION.format(player_count_expression)),
+                     (min_players, MIN_BOUND_WHERE_EXPRESSION.format(player_count_expression)))
+    date_bounds = ((max_datetime, MAX_DATE_WHERE_EXPRESSION), (min_datetime, MIN_DATE_WHERE_EXPRESSION))
 
-    table_expression = format_with_rating(rating_type, table_expression)
     if max_rating or min_rating:
-        having_expression, args, first = build_rating_expression(first, having_expression, args,
-                                                                 (max_rating, MAX_RATING_HAVING_EXPRESSION),
-                                                                 (min_rating, MIN_RATING_HAVING_EXPRESSION))
+        where_expression, args, first = build_rating_expression(first, where_expression, args, *rating_bounds)
 
     if max_players or min_players:
-        having_expression, args, first = build_player_count_expression(first, having_expression, args,
-                                                                       (max_players, MAX_PLAYER_WHERE_EXPRESSION),
-                                                                       (min_players, MIN_PLAYER_WHERE_EXPRESSION))
+        where_expression, args, first = build_player_count_expression(first, where_expression, args, *player_bounds)
 
     if max_datetime or min_datetime:
-        having_expression, args, first = build_date_time_expression(first, having_expression, args,
-                                                                    (max_datetime, MAX_DATE_HAVING_EXPRESSION),
-                                                                    (min_datetime, MIN_DATE_HAVING_EXPRESSION))
+        where_expression, args, first = build_date_time_expression(first, where_expression, args, *date_bounds)
+
+    query = GAME_IDS_HEADER.format(id_expression, table_expression) + where_expression + group_by_expression \
+        + GAME_IDS_ORDER_BY.format(id_expression, limit_expression)
+    return query, args
 
-    return table_expression + subquery_expression + having_expression, args, limit
 
+def fetch_game_ids(query, args):
+    connection = get_read_connection()
+    with connection:
+        cursor = connection.cursor()
+        cursor.execute(query, args)
+        return [row[0] for row in cursor.fetchall()]
 
-def build_subquery(victory_condition, map_name, map_exclude, player_list, game_mod, limit_expression):
-    table_expression = SUBQUERY_HEADER
+
+def fetch_games(game_ids, rating_type, stream):
+    """
+    Fetches the second phase of a filtered search: the rows of the given games and their players.
+    """
+    table_expression, game_select_expression, player_select_expression, where = get_games_query(game_ids,
+                                                                                                rating_type)
+    return fetch_data(GameStats(), table_expression, game_select_expression, MAX_PLAYER_PAGE_SIZE, request,
+                      where=where, args=game_ids, sort='-id', enricher=enricher, limit=False, stream=stream,
+                      players=player_select_expression)
+
+
+def get_games_query(game_ids, rating_type):
+    """
+    Returns the table expression, the game and player select expressions and the WHERE clause selecting the rows of
+    the given games.
+    """
+    table_expression = format_with_rating(rating_type, HEADER)
+    game_select_expression = dict(GAME_SELECT_EXPRESSIONS)
+    player_select_expression = dict(PLAYER_SELECT_EXPRESSIONS)
+    if is_summary_enabled():
+        table_expression += SUMMARY_JOIN
+        game_select_expression['player_count'] = SUMMARY_PLAYER_COUNT_EXPRESSION
+    player_select_expression['max_rating'] = get_rating_expression('max', rating_type)
+    player_select_expression['min_rating'] = get_rating_expression('min', rating_type)
+
+    where = GAME_IDS_WHERE_EXPRESSION.format(','.join(['%s'] * len(game_ids)))
+    return table_expression, game_select_expression, player_select_expression, where
+
+
+def is_summary_enabled():
+    """
+    Returns ``True`` if games are filtered by player count and rating using ``game_summary``, see
+    :mod:`api.game_summary`.
+    """
+    return app.config.get('GAME_SUMMARY_ENABLED', False)
+
+
+def get_summary_rating_column(rating_type):
+    return 'ladder' if rating_type == 'ladder' else 'global'
+
+
+def get_rating_expression(bound, rating_type):
+    """
+    Returns the expression selecting the minimum or maximum rating of the players of a game, taken from
+    ``game_summary`` if enabled.
+
+    :param bound: ``'min'`` or ``'max'``
+    """
+    header = MAX_RATING_HEADER_EXPRESSION if bound == 'max' else MIN_RATING_HEADER_EXPRESSION
+    expression = build_rating_selector(rating_type, header)
+    if is_summary_enabled():
+        return SUMMARY_RATING_EXPRESSION.format(bound, get_summary_rating_column(rating_type), expression)
+    return expression
+
+
+def build_game_filter(victory_condition, map_name, map_exclude, player_list, game_mod):
+    """
+    Builds the FROM and WHERE clauses for filtering games by players, map, victory condition and mod.
+
+    Searches for players start at their logins and only visit the games they played in, all other searches walk
+    ``game_stats`` by descending id.
+
+    :return: a tuple of the table expression, the game id column, the WHERE expression, the GROUP BY expression,
+        the arguments and whether the WHERE expression is still empty
+    """
     where_expression = ''
+    group_by_expression = ''
     args = []
     first = True
-    players = None
-
-    if not (victory_condition or map_name or player_list or game_mod):
-        return '', args, True
-
-    if map_name or victory_condition or game_mod:
-        table_expression = table_expression.format('gs.id', GAME_STATS_TABLE)
-        order_by_expression = SUBQUERY_ORDER_BY.format('gs.id')
-        if player_list:
-            table_expression += GAME_PLAYER_STATS_JOIN
-    else:
-        table_expression = table_expression.format('gameId', GAME_PLAYER_STATS_TABLE, '')
-        order_by_expression = SUBQUERY_ORDER_BY.format('gameId')
 
     if player_list:
-        table_expression += LOGIN_JOIN
+        table_expression = GAME_PLAYER_STATS_TABLE + LOGIN_JOIN + GAME_STATS_JOIN
+        id_expression = 'gps.gameId'
         players = player_list.split(',')
         player_expression = 'l.login IN ({})'.format(','.join(['%s'] * len(players)))
         first, where_expression, args = append_filter_expression(WHERE, first, where_expression, player_expression,
                                                                  args, *players)
+        group_by_expression = GROUP_BY_EXPRESSION.format(len(players) - 1)
+    else:
+        table_expression = GAME_STATS_TABLE
+        id_expression = 'gs.id'
 
     if map_name:
         table_expression += MAP_JOIN
@@ -301,12 +477,7 @@ def build_subquery(victory_condition, map_name, map_exclude, player_list, game_m
                                                                  game_mod_expression,
                                                                  args, game_mod)
 
-    if players:
-        where_expression += GROUP_BY_EXPRESSION.format(len(players) - 1)
-
-    table_expression += where_expression + order_by_expression + SUBQUERY_FOOTER.format(limit_expression)
-
-    return table_expression, args, False
+    return table_expression, id_expression, where_expression, group_by_expression, args, first
 
 
 def build_rating_selector(rating_type, rating_expression):
@@ -324,7 +495,7 @@ def format_with_rating(rating_type, expression):
     return expression
 
 
-def build_rating_expression(first, having_expression, args, *rating_bounds):
+def build_rating_expression(first, where_expression, args, *rating_bounds):
     for rating, rating_bound_expression in rating_bounds:
         if not rating:
             continue
@@ -332,14 +503,13 @@ def build_rating_expression(first, having_expression, args, *rating_bounds):
             rating = int(rating)
         except ValueError:
             throw_malformed_query_error('rating field')
-        first, where_expression, args = append_filter_expression(HAVING, first, '', rating_bound_expression, args,
-                                                                 rating)
-        having_expression += where_expression
+        first, where_expression, args = append_filter_expression(WHERE, first, where_expression,
+                                                                 rating_bound_expression, args, rating)
 
-    return having_expression, args, first
+    return where_expression, args, first
 
 
-def build_player_count_expression(first, table_expression, args, *player_counts):
+def build_player_count_expression(first, where_expression, args, *player_counts):
     for player_count, count_expression in player_counts:
         if not player_count:
             continue
@@ -348,22 +518,21 @@ def build_player_count_expression(first, table_expression, args, *player_counts)
         except ValueError:
             throw_malformed_query_error('player count field')
 
-        first, table_expression, args = append_filter_expression(HAVING, first, table_expression, count_expression,
-                                                                 args,
-                                                                 player_count)
+        first, where_expression, args = append_filter_expression(WHERE, first, where_expression, count_expression,
+                                                                 args, player_count)
 
-    return table_expression, args, first
+    return where_expression, args, first
 
 
-def build_date_time_expression(first, having_expression, args, *date_times):
+def build_date_time_expression(first, where_expression, args, *date_times):
     for date_time, date_expression in date_times:
         if not date_time:
             continue
         converted_dt = parse_date(date_time)
-        first, having_expression, args = append_filter_expression(HAVING, first, having_expression, date_expression,
-                                                                  args, converted_dt)
+        first, where_expression, args = append_filter_expression(WHERE, first, where_expression, date_expression,
+                                                                 args, converted_dt)
 
-    return having_expression, args, first
+    return where_expression, args, first
 
 
 def append_filter_expression(prefix, first, where_expression, format_expression, args, *new_args):
@@ -376,30 +545,40 @@ def append_filter_expression(prefix, first, where_expression, format_expression,
     return first, where_expression, args
 
 
+@metrics.timed('sort_game_results')
 def sort_game_results(results):
-    game_player = {'data': []}
-    data = game_player['data']
+    return {'data': list(group_game_results(results['data']))}
 
-    current_game_attributes = None
+
+def group_game_results(resources):
+    """
+    Merges consecutive resources of the same game, each holding the attributes of one player, into one game resource
+    with a list of ``players``.
+    """
+    current_game = None
     current_game_id = None
-    for game_result in results['data']:
+    for game_result in resources:
         game_id = game_result['id']
         game_attributes = game_result['attributes']
         if current_game_id != game_id:
+            if current_game is not None:
+                yield current_game
             current_game_id = game_id
             gs_type = game_result['type']
             current_game_attributes = {key: game_attributes[key] for key in GAME_SELECT_EXPRESSIONS.keys() if
                                        key in game_attributes}
             if any(x in game_attributes for x in PLAYER_SELECT_EXPRESSIONS.keys()):
                 current_game_attributes['players'] = []
-            data.append({'id': game_id, 'type': gs_type, 'attributes': current_game_attributes})
+            current_game = {'id': game_id, 'type': gs_type, 'attributes': current_game_attributes}
         if 'players' in current_game_attributes:
             player_dict = {key: game_attributes[key] for key in PLAYER_SELECT_EXPRESSIONS.keys() if
                            key in game_attributes}
             player_dict.pop('game_id', None)
             if player_dict:
                 current_game_attributes['players'].append(player_dict)
-    return game_player
+
+    if current_game is not None:
+        yield current_game
 
 
 def throw_malformed_query_error(field):
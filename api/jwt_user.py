@@ -1,14 +1,45 @@
+from jwt.algorithms import RSAAlgorithm
+
+from api.cache import TTLCache
 import faf.db as db
 
+USER_CACHE_SIZE = 100
+DEFAULT_USER_CACHE_TTL = 300
+
+# Service accounts by username, so that their public key is only parsed once
+user_cache = TTLCache(max_size=USER_CACHE_SIZE, ttl=DEFAULT_USER_CACHE_TTL)
+
 
 class JwtUser(object):
     def __init__(self, **kwargs):
         self.id = kwargs.get('id')
         self.username = kwargs.get('username')
         self.public_key = kwargs.get('public_key')
+        self._verifying_key = None
+
+    @property
+    def verifying_key(self):
+        """
+        The parsed RS256 public key, which can be passed to ``jwt.decode`` instead of the PEM string.
+        """
+        if self._verifying_key is None:
+            self._verifying_key = RSAAlgorithm(RSAAlgorithm.SHA256).prepare_key(self.public_key)
+        return self._verifying_key
 
     @classmethod
     def get(cls, username):
+        """
+        Find a service account by username. Found accounts are cached for ``user_cache.ttl`` seconds.
+        """
+        user = user_cache.get(username)
+        if user is None:
+            user = cls._select(username)
+            if user is not None:
+                user_cache.set(username, user)
+        return user
+
+    @classmethod
+    def _select(cls, username):
         with db.connection:
             cursor = db.connection.cursor(db.pymysql.cursors.DictCursor)
             cursor.execute("""
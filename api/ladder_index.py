@@ -0,0 +1,264 @@
+"""
+In-memory index of the ranked 1v1 ladder.
+
+The index holds every ladder row sorted by rating so that leaderboard pages, the rank of a player and the players
+around them can be answered without touching MySQL. It is rebuilt from the database after a configurable time to
+live or when :meth:`LadderIndex.invalidate` is called.
+
+The :class:`RatingHistogram` behind /ranked1v1/stats is synced with every rebuild, so it is at most as old as the
+index. ``ladder1v1_rating`` has no column telling which rows changed, so there is no cheaper way to find them than
+the full reload the index does anyway.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+DEFAULT_TTL = 30
+DEFAULT_BUCKET_WIDTHS = (100,)
+
+# Players outside of these bounds are not part of the rating distribution
+MIN_MEAN = 0
+MAX_MEAN = 3000
+MAX_DEVIATION = 250
+
+
+def sort_key(row):
+    """
+    Orders rows by descending rating, using the player id as tie breaker.
+    """
+    return -row['rating'], int(row['id'])
+
+
+def is_ranked(row):
+    """
+    Returns ``True`` if the player counts towards the ranking, i.e. is active and has played a ranked game.
+    """
+    return bool(row['is_active']) and row['num_games'] > 0
+
+
+class LadderSnapshot(object):
+    """
+    An immutable, sorted view of the ladder at the time it was loaded.
+
+    :param rows: the ladder rows, each a dict with at least ``id``, ``login``, ``rating``, ``is_active`` and
+        ``num_games``
+    """
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=sort_key)
+        self.keys = [sort_key(row) for row in self.rows]
+        self.by_id = {int(row['id']): row for row in self.rows}
+        self.ranked_ratings = sorted(row['rating'] for row in self.rows if is_ranked(row))
+        self._views = {}
+
+    def view(self, active=None):
+        """
+        Returns the rows matching the ``filter[is_active]`` semantics of the ladder endpoint, in ranking order.
+
+        :param active: ``None`` for all players, ``True`` for ranked players, ``False`` for inactive players that
+            played at least one game
+        :return: a tuple of the rows and their sort keys
+        """
+        if active is None:
+            return self.rows, self.keys
+
+        view = self._views.get(active)
+        if view is None:
+            rows = [row for row in self.rows if row['num_games'] > 0 and bool(row['is_active']) == active]
+            view = self._views[active] = rows, [sort_key(row) for row in rows]
+        return view
+
+    def rank(self, rating):
+        """
+        Returns the number of ranked players with a rating greater than or equal to `rating`.
+        """
+        return len(self.ranked_ratings) - bisect_left(self.ranked_ratings, rating)
+
+    def get(self, player_id):
+        return self.by_id.get(int(player_id))
+
+    def position(self, player_id, active=None):
+        """
+        Returns the zero based position of a player within :meth:`view`, or ``None`` if the player isn't part of it.
+        """
+        row = self.get(player_id)
+        if row is None:
+            return None
+
+        rows, keys = self.view(active)
+        index = bisect_left(keys, sort_key(row))
+        if index < len(rows) and rows[index] is row:
+            return index
+        return None
+
+
+def get_distribution_rating(row):
+    """
+    Returns the rating a player is counted with in the rating distribution, or ``None`` if the player isn't part of
+    it.
+    """
+    if row['num_games'] > 0 and MIN_MEAN <= row['mean'] <= MAX_MEAN and row['deviation'] <= MAX_DEVIATION:
+        return row['mean'] - 3 * row['deviation']
+    return None
+
+
+def get_bucket(rating, width):
+    """
+    Returns the lower bound of the bucket of the given `width` that `rating` falls into.
+    """
+    return int(math.floor(rating / width) * width)
+
+
+class RatingHistogram(object):
+    """
+    Number of players per rating bucket, for a number of bucket widths and separately for active and inactive players.
+
+    Each player's rating is remembered, so that syncing the histogram with the ladder only touches the buckets of
+    players whose rating or activity changed.
+
+    :param widths: the bucket widths to count players for
+    """
+
+    def __init__(self, widths=DEFAULT_BUCKET_WIDTHS):
+        self.widths = tuple(widths)
+        self._entries = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._recount()
+
+    def set_widths(self, widths):
+        """
+        Changes the bucket widths, recounting all players if they differ from the current ones.
+        """
+        widths = tuple(widths)
+        with self._lock:
+            if widths != self.widths:
+                self.widths = widths
+                self._recount()
+
+    def sync(self, rows):
+        """
+        Makes the histogram match `rows`, which hold the whole ladder. Players not part of `rows` are removed.
+        """
+        with self._lock:
+            player_ids = set()
+            for row in rows:
+                player_id = int(row['id'])
+                player_ids.add(player_id)
+                self._set(player_id, row)
+
+            for player_id in [player_id for player_id in self._entries if player_id not in player_ids]:
+                self._count(self._entries.pop(player_id), -1)
+
+    def distribution(self, width, active=True):
+        """
+        Returns the number of active (or inactive) players by the lower bound of their rating bucket.
+
+        :raises KeyError: if `width` isn't one of :attr:`widths`
+        """
+        with self._lock:
+            return {str(bucket): count for bucket, count in sorted(self._counts[width, active].items())}
+
+    def _set(self, player_id, row):
+        rating = get_distribution_rating(row)
+        entry = (rating, bool(row['is_active'])) if rating is not None else None
+
+        previous = self._entries.get(player_id)
+        if entry == previous:
+            return
+
+        if previous is not None:
+            self._count(previous, -1)
+
+        if entry is None:
+            del self._entries[player_id]
+        else:
+            self._entries[player_id] = entry
+            self._count(entry, 1)
+
+    def _count(self, entry, delta):
+        rating, active = entry
+        for width in self.widths:
+            counts = self._counts[width, active]
+            bucket = get_bucket(rating, width)
+            counts[bucket] += delta
+            if not counts[bucket]:
+                del counts[bucket]
+
+    def _recount(self):
+        self._counts = {(width, active): Counter() for width in self.widths for active in (True, False)}
+        for entry in self._entries.values():
+            self._count(entry, 1)
+
+
+class LadderIndex(object):
+    """
+    Lazily loaded, periodically refreshed :class:`LadderSnapshot`.
+
+    While a refresh is in progress, other threads keep being served the previous snapshot.
+
+    :param load: a callable returning all ladder rows
+    :param ttl: seconds after which the snapshot is reloaded
+    :param on_update: an optional callable invoked with every new :class:`LadderSnapshot`
+    """
+
+    def __init__(self, load, ttl=DEFAULT_TTL, on_update=None):
+        self._load = load
+        self.ttl = ttl
+        self._on_update = on_update
+        self._snapshot = None
+        self._expires_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """
+        Forces the next access to reload the ladder.
+        """
+        self._expires_at = None
+
+    def _is_fresh(self):
+        return self._expires_at is not None and time.monotonic() < self._expires_at
+
+    def peek(self):
+        """
+        Returns the current snapshot if it doesn't need to be reloaded, ``None`` otherwise.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and self._is_fresh():
+            return snapshot
+        return None
+
+    def update(self, rows):
+        """
+        Replaces the snapshot with rows that were loaded elsewhere, e.g. by an asynchronous database driver.
+        """
+        snapshot = self._install(LadderSnapshot(rows))
+        self._expires_at = time.monotonic() + self.ttl
+        return snapshot
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None and self._is_fresh():
+            return snapshot
+
+        # Only one thread reloads, everyone else keeps using the stale snapshot unless there is none yet
+        if not self._lock.acquire(blocking=snapshot is None):
+            return snapshot
+
+        try:
+            if self._snapshot is not snapshot and self._is_fresh():
+                return self._snapshot
+
+            self._install(LadderSnapshot(self._load()))
+            self._expires_at = time.monotonic() + self.ttl
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+    def _install(self, snapshot):
+        if self._on_update is not None:
+            self._on_update(snapshot)
+        self._snapshot = snapshot
+        return snapshot
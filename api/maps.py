@@ -1,10 +1,10 @@
-import os
 import urllib.parse
 from faf.api.map_schema import MapSchema
 from flask import request
-from werkzeug.utils import secure_filename
-from api import app, InvalidUsage
+from api import app
 from api.query_commons import fetch_data
+from api.response_cache import cached, invalidate
+from api.uploads import receive_file, DEFAULT_MAX_SIZE
 
 ALLOWED_EXTENSIONS = {'zip'}
 MAX_PAGE_SIZE = 1000
@@ -56,23 +56,19 @@ def maps_upload():
 
         "ok"
 
-    :query file file: The file submitted (Must be ZIP)
+    :query file file: The file submitted (Must be ZIP). It is written to disk while it is received and rejected as
+        soon as it exceeds ``MAP_UPLOAD_MAX_SIZE`` bytes or turns out not to be a ZIP archive
     :type: zip
 
     """
-    file = request.files.get('file')
-    if not file:
-        raise InvalidUsage("No file has been provided")
-
-    if not file_allowed(file.filename):
-        raise InvalidUsage("Invalid file extension")
-
-    filename = secure_filename(file.filename)
-    file.save(os.path.join(app.config['MAP_UPLOAD_PATH'], filename))
+    receive_file(request, app.config['MAP_UPLOAD_PATH'], app.config.get('MAP_UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE),
+                 ALLOWED_EXTENSIONS, validate_zip=True)
+    invalidate('maps')
     return "ok"
 
 
 @app.route('/maps')
+@cached()
 def maps():
     """
     Lists all map definitions.
@@ -118,23 +114,28 @@ def maps():
           ]
         }
 
-
+    :param page[after]: Opaque cursor from ``links.next``, returns the page following it. Pass it empty to get the
+        first page with cursor links.
+    :param page[before]: Opaque cursor from ``links.prev``, returns the page preceding it.
+    :param filter[id]: A comma separated list of map ids, returns these maps instead of a page
     """
-    where = ''
-    args = None
-    many = True
-
-    filename_filter = request.values.get('filter[technical_name]')
-    if filename_filter:
-        where = ' filename = %s'
-        args = 'maps/' + filename_filter + '.zip'
-        many = False
+    where, args, many = get_filter(request)
 
     results = fetch_data(MapSchema(), TABLE, SELECT_EXPRESSIONS, MAX_PAGE_SIZE, request, where=where, args=args,
-                         many=many, enricher=enricher)
+                         many=many, enricher=enricher, keyset=True, id_filter=True)
     return results
 
 
+def get_filter(request):
+    """
+    Returns the WHERE clause, its arguments and whether many maps are selected for a /maps request.
+    """
+    filename_filter = request.values.get('filter[technical_name]')
+    if filename_filter:
+        return ' filename = %s', 'maps/' + filename_filter + '.zip', False
+    return '', None, True
+
+
 def enricher(map):
     if 'thumbnail_url_small' in map:
         if not map['thumbnail_url_small']:
@@ -152,8 +153,3 @@ def enricher(map):
     if 'download_url' in map:
         map['download_url'] = '{}/faf/vault/{}'.format(app.config['CONTENT_URL'],
                                                        urllib.parse.quote(map['download_url']))
-
-
-def file_allowed(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1] in ALLOWED_EXTENSIONS
@@ -0,0 +1,207 @@
+"""
+statsd instrumentation.
+
+When ``STATSD_SERVER`` is set, the following metrics are sent, ``<endpoint>`` being the name of the flask endpoint
+(``none`` for requests that didn't match a route):
+
+- ``api.request``: time to build each response, as before
+- ``api.endpoint.<endpoint>.<method>.<status>``: time and count of the requests by endpoint, method and status
+- ``api.sql.<endpoint>.<verb>.<table>``: time of each SQL statement, by the statement's verb and first table
+- ``api.enrich.<endpoint>`` and ``api.serialize.<endpoint>``: time spent in enrichers and serializing rows
+- ``api.rows.<endpoint>``: number of rows serialized per document, sent as a timer so that statsd aggregates it into
+  percentiles like a histogram
+- ``api.function.<name>``: time of functions decorated with :func:`timed`
+- ``api.plan_cache.<endpoint>.hit`` and ``api.plan_cache.<endpoint>.miss``: lookups of compiled queries, see
+  :func:`api.query_commons.get_query_plan`
+
+statsd has no tags, so method and status are part of the name. Without ``STATSD_SERVER`` every helper returns
+immediately.
+"""
+import functools
+import re
+import time
+
+import statsd
+from flask import g, has_request_context, request
+
+client = None
+
+STATEMENT_PATTERN = re.compile(r'^\s*\(?\s*(\w+)')
+TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)', re.IGNORECASE)
+
+
+def get_endpoint():
+    if has_request_context() and request.endpoint:
+        return request.endpoint
+    return None
+
+
+def get_name(kind, endpoint=None, *parts):
+    """
+    Returns ``api.<kind>.<endpoint>[.<part>...]``, the endpoint defaulting to the one of the current flask request.
+    """
+    endpoint = endpoint or get_endpoint() or 'none'
+    return '.'.join(['api', kind, endpoint] + [str(part) for part in parts])
+
+
+def get_statement_name(sql):
+    """
+    Returns a short name for an SQL statement: its lower cased verb and the first table it refers to, e.g.
+    ``select.game_stats``.
+    """
+    verb = STATEMENT_PATTERN.match(sql)
+    table = TABLE_PATTERN.search(sql)
+    return '{}.{}'.format(verb.group(1).lower() if verb else 'unknown', table.group(1) if table else 'none')
+
+
+class Timer(object):
+    """
+    Context manager sending the time spent in it as a statsd timer.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if client is not None:
+            self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if client is not None and self.start is not None:
+            client.timing(self.name, (time.monotonic() - self.start) * 1000)
+        return False
+
+
+def timer(kind, endpoint=None, *parts):
+    """
+    Returns a :class:`Timer` for the metric named by :func:`get_name`.
+    """
+    if client is None:
+        return Timer(None)
+    return Timer(get_name(kind, endpoint, *parts))
+
+
+def timed(name):
+    """
+    Decorator sending the time spent in a function as ``api.function.<name>``.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if client is None:
+                return function(*args, **kwargs)
+            with Timer('api.function.' + name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(kind, endpoint=None, *parts):
+    if client is not None:
+        client.incr(get_name(kind, endpoint, *parts))
+
+
+def histogram(kind, value, endpoint=None):
+    if client is not None:
+        client.timing(get_name(kind, endpoint), value)
+
+
+def sql_timer(sql, endpoint=None):
+    """
+    Returns a :class:`Timer` for an SQL statement, see :func:`get_statement_name`.
+    """
+    if client is None:
+        return Timer(None)
+    return Timer(get_name('sql', endpoint, get_statement_name(sql)))
+
+
+class TimedCursor(object):
+    """
+    Wraps a DB-API cursor, timing its ``execute`` and ``executemany`` calls.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, query, args=None):
+        with sql_timer(query):
+            return self.cursor.execute(query, args)
+
+    def executemany(self, query, args):
+        with sql_timer(query):
+            return self.cursor.executemany(query, args)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        self.cursor.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.cursor.__exit__(exc_type, exc_value, traceback)
+
+    def __getattr__(self, item):
+        return getattr(self.cursor, item)
+
+
+def timed_cursor(cursor):
+    """
+    Returns `cursor` wrapped into a :class:`TimedCursor` if metrics are enabled, `cursor` itself otherwise.
+    """
+    if client is None:
+        return cursor
+    return TimedCursor(cursor)
+
+
+def init_metrics(app):
+    """
+    Creates the statsd client if ``STATSD_SERVER`` (``host:port``) is set in the flask config and registers the request
+    hooks timing each request.
+    """
+    global client
+    client = None
+
+    if not app.config.get('STATSD_SERVER'):
+        return None
+
+    host, port = app.config['STATSD_SERVER'].split(':')
+    client = statsd.StatsClient(host, int(port))
+
+    if not app.extensions.get('metrics'):
+        app.extensions['metrics'] = True
+        app.before_request(start_request)
+        app.after_request(record_request)
+
+    return client
+
+
+def start_request():
+    g._metrics_start = time.monotonic()
+
+
+def record_request(response):
+    start = g.get('_metrics_start')
+    if client is None or start is None:
+        return response
+
+    record_response(None, request.method, response.status_code, start)
+    return response
+
+
+def record_response(endpoint, method, status, start):
+    """
+    Sends the time since `start` (a ``time.monotonic()`` value) and the count of a request.
+    """
+    if client is None:
+        return
+
+    elapsed = (time.monotonic() - start) * 1000
+    name = get_name('endpoint', endpoint, method, status)
+    client.timing('api.request', elapsed)
+    client.timing(name, elapsed)
+    client.incr(name)
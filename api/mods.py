@@ -1,15 +1,16 @@
-import os
 import urllib.parse
 
 from faf.api import ModSchema
 from flask import request
-from werkzeug.utils import secure_filename
 
-from api import app, InvalidUsage
+from api import app
 from api.query_commons import fetch_data
+from api.response_cache import cached, invalidate
+from api.uploads import receive_file, DEFAULT_MAX_SIZE
 
 ALLOWED_EXTENSIONS = {'zip'}
 MAX_PAGE_SIZE = 1000
+TABLE = 'table_mod'
 
 SELECT_EXPRESSIONS = {
     'id': 'uid',
@@ -51,19 +52,14 @@ def mods_upload():
 
         "ok"
 
-    :query file file: The file submitted (Must be ZIP)
+    :query file file: The file submitted (Must be ZIP). It is written to disk while it is received and rejected as
+        soon as it exceeds ``MOD_UPLOAD_MAX_SIZE`` bytes or turns out not to be a ZIP archive
     :type: zip
 
     """
-    file = request.files.get('file')
-    if not file:
-        raise InvalidUsage("No file has been provided")
-
-    if not file_allowed(file.filename):
-        raise InvalidUsage("Invalid file extension")
-
-    filename = secure_filename(file.filename)
-    file.save(os.path.join(app.config['MOD_UPLOAD_PATH'], filename))
+    receive_file(request, app.config['MOD_UPLOAD_PATH'], app.config.get('MOD_UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE),
+                 ALLOWED_EXTENSIONS, validate_zip=True)
+    invalidate('mods')
     return "ok"
 
 
@@ -108,7 +104,7 @@ def mod(mod_uid):
 
 
     """
-    result = fetch_data(ModSchema(), 'table_mod', SELECT_EXPRESSIONS, MAX_PAGE_SIZE, request,
+    result = fetch_data(ModSchema(), TABLE, SELECT_EXPRESSIONS, MAX_PAGE_SIZE, request,
                         where="`uid` = %s", args=mod_uid, many=False, enricher=enricher)
 
     if 'id' not in result['data']:
@@ -118,6 +114,7 @@ def mod(mod_uid):
 
 
 @app.route('/mods')
+@cached()
 def mods():
     """
     Lists all mod definitions.
@@ -159,9 +156,13 @@ def mods():
           ]
         }
 
-
+    :param page[after]: Opaque cursor from ``links.next``, returns the page following it. Pass it empty to get the
+        first page with cursor links.
+    :param page[before]: Opaque cursor from ``links.prev``, returns the page preceding it.
+    :param filter[id]: A comma separated list of mod uids, returns these mods instead of a page
     """
-    return fetch_data(ModSchema(), 'table_mod', SELECT_EXPRESSIONS, MAX_PAGE_SIZE, request, enricher=enricher)
+    return fetch_data(ModSchema(), TABLE, SELECT_EXPRESSIONS, MAX_PAGE_SIZE, request, enricher=enricher,
+                      keyset=True, id_filter=True)
 
 
 def enricher(mod):
@@ -173,8 +174,3 @@ def enricher(mod):
 
     if 'download_url' in mod:
         mod['download_url'] = '{}/faf/vault/{}'.format(app.config['CONTENT_URL'], urllib.parse.quote(mod['download_url']))
-
-
-def file_allowed(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1] in ALLOWED_EXTENSIONS
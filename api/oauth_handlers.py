@@ -6,7 +6,7 @@ from flask_oauthlib.contrib.cache import Cache
 
 from api import *
 from api.oauth_client import OAuthClient
-from api.oauth_token import OAuthToken
+from api.oauth_token import OAuthToken, token_cache, DEFAULT_TOKEN_CACHE_TTL
 
 cache = Cache(app, 'OAUTH2')
 
@@ -18,6 +18,7 @@ def get_client(client_id):
 
 @oauth.tokengetter
 def get_token(access_token=None, refresh_token=None):
+    token_cache.ttl = app.config.get('OAUTH_TOKEN_CACHE_TTL', DEFAULT_TOKEN_CACHE_TTL)
     return OAuthToken.get(access_token=access_token, refresh_token=refresh_token)
 
 
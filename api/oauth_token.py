@@ -1,7 +1,24 @@
+from datetime import datetime
+
 from oauthlib.oauth2.rfc6749 import utils
+from api.cache import TTLCache
 from api.user import User
 import faf.db as db
 
+TOKEN_CACHE_SIZE = 10000
+DEFAULT_TOKEN_CACHE_TTL = 60
+
+TOKEN_SELECT_EXPRESSION = """
+            SELECT
+                t.id, t.token_type, t.access_token, t.refresh_token, t.client_id, t.scope, t.expires, t.user_id,
+                l.login
+            FROM oauth_tokens t
+            LEFT OUTER JOIN login l ON l.id = t.user_id
+            WHERE {} = %s"""
+
+# Validated tokens by access token, so that authenticated requests don't need to query the token and its user
+token_cache = TTLCache(max_size=TOKEN_CACHE_SIZE, ttl=DEFAULT_TOKEN_CACHE_TTL)
+
 
 class OAuthToken(object):
     def __init__(self, **kwargs):
@@ -19,17 +36,46 @@ class OAuthToken(object):
         return utils.scope_to_list(self.scope)
 
     @classmethod
-    def get(cls, **kwargs):
+    def get(cls, access_token=None, refresh_token=None):
+        """
+        Find a token by access token or, if no access token is given, by refresh token. Tokens found by access token
+        are cached until they expire, but no longer than ``token_cache.ttl`` seconds.
+        """
+        if access_token is not None:
+            token = token_cache.get(access_token)
+            if token is None:
+                token = cls._select('t.access_token', access_token)
+                if token is not None:
+                    cls._cache(token)
+            return token
+
+        if refresh_token is not None:
+            return cls._select('t.refresh_token', refresh_token)
+
+        return None
+
+    @classmethod
+    def _select(cls, column, value):
         with db.connection:
             cursor = db.connection.cursor(db.pymysql.cursors.DictCursor)
-            cursor.execute("""
-            SELECT
-                id, token_type, access_token, refresh_token, client_id, scope, expires, user_id
-            FROM oauth_tokens
-            WHERE access_token = %s OR refresh_token = %s""", (kwargs.get('access_token'), kwargs.get('refresh_token')))
+            cursor.execute(TOKEN_SELECT_EXPRESSION.format(column), value)
 
             token = cursor.fetchone()
-            return OAuthToken(**token) if token else None
+            if not token:
+                return None
+
+            login = token.pop('login')
+            user = User(id=token['user_id'], login=login) if login is not None else None
+            return OAuthToken(user=user, **token)
+
+    @staticmethod
+    def _cache(token):
+        ttl = token_cache.ttl
+        if token.expires is not None:
+            remaining = (token.expires - datetime.utcnow()).total_seconds()
+            ttl = min(ttl, remaining) if ttl is not None else remaining
+        if ttl is None or ttl > 0:
+            token_cache.set(token.access_token, token, ttl=ttl)
 
     @classmethod
     def delete(cls, client_id, user_id):
@@ -37,6 +83,9 @@ class OAuthToken(object):
             cursor = db.connection.cursor(db.pymysql.cursors.DictCursor)
             cursor.execute("DELETE FROM oauth_tokens WHERE client_id = %s AND user_id = %s", (client_id, user_id))
 
+        token_cache.delete_if(lambda access_token, token: str(token.client_id) == str(client_id)
+                              and token.user is not None and token.user.id == user_id)
+
     @classmethod
     def insert(cls, **kwargs):
         with db.connection:
@@ -0,0 +1,223 @@
+"""
+Pre-forked worker processes sharing one listening socket.
+
+The supervisor opens the socket, forks the workers, which inherit it and accept connections from it, and then only
+watches them: crashed workers are replaced, ``SIGHUP`` replaces all workers one after another (each new worker has to
+be ready before the old one is asked to stop) and ``SIGTERM``/``SIGINT`` stop all workers gracefully. Nothing that
+starts threads or opens connections (i.e. ``api_init``) must run in the supervisor, every worker initializes itself.
+"""
+import atexit
+import logging
+import os
+import select
+import signal
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRACEFUL_TIMEOUT = 30
+DEFAULT_READY_TIMEOUT = 60
+# Minimum number of seconds between replacing two crashed workers, so that a worker that can't start doesn't spin
+RESTART_INTERVAL = 1
+POLL_INTERVAL = 0.2
+
+
+def create_socket(host, port, backlog=128):
+    """
+    Returns a listening TCP socket that can be inherited by the workers.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor(object):
+    """
+    Runs and supervises worker processes.
+
+    :param worker: a callable taking the listening socket and a ``ready`` callable, run in every worker process. It
+        must call ``ready()`` once it accepts connections and return after a graceful shut down on ``SIGTERM``
+    :param sock: the listening socket
+    :param workers: the number of worker processes
+    :param graceful_timeout: seconds a worker may take to stop before it is killed
+    :param ready_timeout: seconds a worker may take to become ready during a reload
+    """
+
+    def __init__(self, worker, sock, workers, graceful_timeout=DEFAULT_GRACEFUL_TIMEOUT,
+                 ready_timeout=DEFAULT_READY_TIMEOUT):
+        self.worker = worker
+        self.sock = sock
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.ready_timeout = ready_timeout
+
+        # Worker pid to the read end of the pipe the worker signals readiness on
+        self.pids = {}
+        self._retiring = set()
+        self._reload_requested = False
+        self._stop_requested = False
+        self._next_restart = 0
+
+    def run(self):
+        """
+        Starts the workers and supervises them until ``SIGTERM`` or ``SIGINT`` is received.
+        """
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        for _ in range(self.workers):
+            self.spawn()
+
+        try:
+            while not self._stop_requested:
+                self.reap()
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+                self.replace_crashed()
+                time.sleep(POLL_INTERVAL)
+        finally:
+            self.stop()
+
+    def _on_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def _on_stop(self, signum, frame):
+        self._stop_requested = True
+
+    def spawn(self):
+        """
+        Forks a new worker process.
+
+        :return: the pid of the worker
+        """
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            self._run_worker(ready_write)
+
+        os.close(ready_write)
+        self.pids[pid] = ready_read
+        logger.info('Started worker {}'.format(pid))
+        return pid
+
+    def _run_worker(self, ready_write):
+        """
+        Runs the worker in the forked process and exits it, never returning to the code of the supervisor.
+        """
+        code = 1
+        try:
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+            def ready():
+                os.write(ready_write, b'1')
+
+            self.worker(self.sock, ready)
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            logger.exception('Worker {} failed'.format(os.getpid()))
+        finally:
+            try:
+                # os._exit() skips them, but e.g. the event buffer flushes pending events on exit
+                atexit._run_exitfuncs()
+            finally:
+                os._exit(code)
+
+    def reap(self):
+        """
+        Collects exited workers.
+        """
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            ready_read = self.pids.pop(pid, None)
+            if ready_read is not None:
+                os.close(ready_read)
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+            else:
+                logger.warning('Worker {} exited unexpectedly with status {}'.format(pid, status))
+
+    def replace_crashed(self):
+        missing = self.workers - (len(self.pids) - len(self._retiring))
+        if missing <= 0 or time.monotonic() < self._next_restart:
+            return
+
+        self._next_restart = time.monotonic() + RESTART_INTERVAL
+        self.spawn()
+
+    def wait_ready(self, pid):
+        """
+        Waits until a worker signalled that it is ready.
+
+        :return: ``True`` if the worker is ready, ``False`` if it exited or didn't become ready in time
+        """
+        deadline = time.monotonic() + self.ready_timeout
+        ready_read = self.pids[pid]
+        while not self._stop_requested:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([ready_read], [], [], min(remaining, POLL_INTERVAL))
+            if readable:
+                # Empty if the worker exited without writing to the pipe
+                return os.read(ready_read, 1) == b'1'
+        return False
+
+    def reload(self):
+        """
+        Replaces the workers one at a time, stopping each old worker only after its replacement is ready.
+        """
+        logger.info('Reloading workers')
+        for old_pid in [pid for pid in self.pids if pid not in self._retiring]:
+            new_pid = self.spawn()
+            if not self.wait_ready(new_pid):
+                logger.error('Worker {} did not become ready, keeping the remaining old workers'.format(new_pid))
+                self.terminate([new_pid])
+                return
+            self.terminate([old_pid])
+
+    def terminate(self, pids):
+        """
+        Asks workers to stop and waits for them, killing those that take longer than ``graceful_timeout``.
+        """
+        for pid in pids:
+            self._retiring.add(pid)
+            self._signal(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while any(pid in self.pids for pid in pids):
+            if time.monotonic() >= deadline:
+                for pid in pids:
+                    if pid in self.pids:
+                        logger.warning('Killing worker {} that did not stop in time'.format(pid))
+                        self._signal(pid, signal.SIGKILL)
+                deadline = float('inf')
+            time.sleep(POLL_INTERVAL)
+            self.reap()
+
+    def stop(self):
+        logger.info('Stopping workers')
+        self.terminate(list(self.pids))
+        self.sock.close()
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
@@ -1,7 +1,21 @@
-from pymysql.cursors import DictCursor
+import base64
+import json
+from collections import OrderedDict
+from urllib.parse import urlencode
 
-from api import InvalidUsage
-from faf import db
+from flask import current_app, json as flask_json, stream_with_context
+from pymysql.cursors import DictCursor, SSDictCursor
+
+from api import InvalidUsage, metrics
+from api.cache import TTLCache
+from api.db_pool import get_read_connection
+from api.serialization import fast_dump
+
+PLAN_CACHE_SIZE = 1000
+DEFAULT_MAX_ID_FILTER_SIZE = 1000
+
+# Compiled queries of fetch_data, see get_query_plan()
+plan_cache = TTLCache(max_size=PLAN_CACHE_SIZE)
 
 
 def get_select_expressions(fields, field_expression_dict):
@@ -62,31 +76,54 @@ def get_order_by(sort_expression, valid_fields):
     :return: an MySQL conform ORDER BY string (see example above) or an empty string if `sort_expression` is None or
     empty
     """
-    if not sort_expression:
+    sort_keys = get_sort_keys(sort_expression, valid_fields)
+    if not sort_keys:
         return ''
 
-    sort_expressions = sort_expression.split(',')
+    return format_order_by(sort_keys)
 
-    order_bys = []
 
-    for expression in sort_expressions:
+def get_sort_keys(sort_expression, valid_fields):
+    """
+    Parses a json-api conform `sort_expression` into a list of ``(column, descending)`` tuples.
+
+    :param sort_expression: a json-api conform sort expression, e.g. ``likes,-timestamp``
+    :param valid_fields: a list of valid sort fields
+    :return: a list of ``(column, descending)`` tuples, e.g. ``[('likes', False), ('timestamp', True)]``
+    """
+    if not sort_expression:
+        return []
+
+    sort_keys = []
+
+    for expression in sort_expression.split(','):
         if not expression or expression == '-':
             continue
 
         if expression[0] == '-':
-            order = 'DESC'
+            descending = True
             column = expression[1:]
         else:
-            order = 'ASC'
+            descending = False
             column = expression
 
         if column not in valid_fields:
             raise InvalidUsage("Invalid sort field")
 
-        order_bys.append('`{}` {}'.format(column, order))
+        sort_keys.append((column, descending))
+
+    return sort_keys
 
-    if not order_bys:
-        return ''
+
+def format_order_by(sort_keys, reverse=False):
+    """
+    Formats a list of ``(column, descending)`` tuples as an ORDER BY clause.
+
+    :param sort_keys: the sort keys as returned by :func:`get_sort_keys`
+    :param reverse: ``True`` to invert the direction of every column
+    """
+    order_bys = ['`{}` {}'.format(column, 'DESC' if descending != reverse else 'ASC')
+                 for column, descending in sort_keys]
 
     return 'ORDER BY {}'.format(', '.join(order_bys))
 
@@ -97,10 +134,262 @@ def get_limit(page, limit):
     return 'LIMIT {}, {}'.format((page - 1) * limit, limit)
 
 
+LIMIT_ARGS_EXPRESSION = 'LIMIT %s, %s'
+
+
+def get_limit_args(page, limit):
+    """
+    Returns the arguments for :data:`LIMIT_ARGS_EXPRESSION`, so that the page doesn't end up in the SQL itself. Use it
+    for limits within the `table` of :func:`fetch_data`, which is part of the cached query plan.
+    """
+    page = int(page)
+    limit = int(limit)
+    return [(page - 1) * limit, limit]
+
+
+def encode_cursor(values):
+    """
+    Encodes the sort key values of a row into an opaque, URL safe page cursor.
+    """
+    token = json.dumps(values, default=str, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(token).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    """
+    Decodes a page cursor created by :func:`encode_cursor`.
+
+    :param cursor: the cursor as passed by the client
+    :param length: the number of values the cursor is expected to hold
+    :raises InvalidUsage: if the cursor can't be decoded
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError):
+        raise InvalidUsage("Invalid page cursor")
+
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidUsage("Invalid page cursor")
+
+    return values
+
+
+def get_page_cursor(request):
+    """
+    Returns ``(before, cursor)`` if the client requested cursor pagination using ``page[after]`` or
+    ``page[before]``, ``None`` otherwise. An empty ``page[after]`` requests the first page.
+    """
+    if 'page[before]' in request.values:
+        cursor = request.values.get('page[before]')
+        if not cursor:
+            raise InvalidUsage("Invalid page cursor")
+        return True, cursor
+
+    if 'page[after]' in request.values:
+        return False, request.values.get('page[after]')
+
+    return None
+
+
+def get_keyset_condition(sort_keys, select_dict, values, before):
+    """
+    Builds a WHERE condition that selects all rows following (or, if `before` is set, preceding) the row with the
+    given sort key `values`, in the order defined by `sort_keys`. NULLs are treated as the smallest value, as MySQL
+    does.
+
+    Example: for ``sort_keys=[('rating', True), ('id', True)]`` the condition for rows after the cursor is::
+
+        (features.rating < %s OR features.rating IS NULL) OR (features.rating <=> %s AND map.id < %s)
+
+    :return: a tuple of the condition and a list of values to bind to its placeholders, in order
+    """
+    conditions = []
+    condition_args = []
+
+    for index, (column, descending) in enumerate(sort_keys):
+        expression = select_dict[column]
+        parts = []
+
+        for previous_index in range(index):
+            parts.append('{} <=> %s'.format(select_dict[sort_keys[previous_index][0]]))
+            condition_args.append(values[previous_index])
+
+        value = values[index]
+        if descending != before:
+            if value is None:
+                parts.append('FALSE')
+            else:
+                parts.append('({expression} < %s OR {expression} IS NULL)'.format(expression=expression))
+                condition_args.append(value)
+        else:
+            if value is None:
+                parts.append('{} IS NOT NULL'.format(expression))
+            else:
+                parts.append('{} > %s'.format(expression))
+                condition_args.append(value)
+
+        conditions.append('({})'.format(' AND '.join(parts)))
+
+    return '({})'.format(' OR '.join(conditions)), condition_args
+
+
+def get_id_filter(request, type_=str):
+    """
+    Returns the ids requested using ``filter[id]=a,b,c`` in the order they were given, without duplicates, or
+    ``None`` if the parameter wasn't passed.
+
+    :param request: the flask HTTP request
+    :param type_: the type to convert each id to, e.g. ``int``
+    :raises InvalidUsage: if an id is invalid, or if none or more than ``MAX_ID_FILTER_SIZE`` ids were requested
+    """
+    value = request.values.get('filter[id]')
+    if value is None:
+        return None
+
+    try:
+        ids = list(OrderedDict.fromkeys(type_(part.strip()) for part in value.split(',') if part.strip()))
+    except ValueError:
+        raise InvalidUsage("Invalid id filter")
+
+    if not ids:
+        raise InvalidUsage("Invalid id filter")
+
+    max_size = current_app.config.get('MAX_ID_FILTER_SIZE', DEFAULT_MAX_ID_FILTER_SIZE)
+    if len(ids) > max_size:
+        raise InvalidUsage("At most {} ids can be requested at once".format(max_size))
+
+    return ids
+
+
+def get_id_condition(expression, ids):
+    """
+    Returns a condition selecting the rows whose `expression` is one of `ids`, with one ``%s`` placeholder per id.
+    """
+    return '{} IN ({})'.format(expression, ','.join(['%s'] * len(ids)))
+
+
+def bind_args(sql, args, new_args):
+    """
+    Appends `new_args` to the query arguments `args`, which may be ``None``, a single value, a sequence or a dict.
+    `sql` must use ``%s`` placeholders for the new arguments; they are rewritten to named placeholders if `args`
+    is a dict.
+
+    :return: a tuple of the (possibly rewritten) `sql` and the combined arguments
+    """
+    if not new_args:
+        return sql, args
+
+    if isinstance(args, dict):
+        args = dict(args)
+        parts = sql.split('%s')
+        sql = parts[0]
+        for index, (part, value) in enumerate(zip(parts[1:], new_args)):
+            name = '_bound_{}'.format(index)
+            while name in args:
+                name = '_' + name
+            args[name] = value
+            sql += '%({})s'.format(name) + part
+        return sql, args
+
+    if args is None:
+        args = []
+    elif isinstance(args, (list, tuple)):
+        args = list(args)
+    else:
+        args = [args]
+
+    return sql, args + list(new_args)
+
+
+def get_page_links(request, first_values, last_values, has_previous, has_next):
+    """
+    Builds the ``links`` object for a page fetched using cursor pagination.
+    """
+    query = [(key, value) for key, value in request.args.items(multi=True)
+             if key not in ('page[after]', 'page[before]', 'page[number]')]
+
+    links = {}
+    if has_previous and first_values is not None:
+        links['prev'] = '{}?{}'.format(request.base_url, urlencode(query + [('page[before]',
+                                                                              encode_cursor(first_values))]))
+    if has_next and last_values is not None:
+        links['next'] = '{}?{}'.format(request.base_url, urlencode(query + [('page[after]',
+                                                                             encode_cursor(last_values))]))
+    return links
+
+
+class QueryPlan(object):
+    """
+    The parts of a :func:`fetch_data` query that only depend on the endpoint and the requested fields and sort order,
+    i.e. everything but the page and the query arguments.
+
+    :param requested_fields: the value of the ``fields[<type>]`` parameter, or ``None``
+    :param sort: a json-api conform sort expression, or ``None``
+    :param nested_expression_dict: dict of nested objects, see :func:`fetch_data`
+    """
+
+    def __init__(self, table, root_select_expression_dict, requested_fields, sort, where, many, keyset,
+                 nested_expression_dict):
+        self.select_dict = {**root_select_expression_dict}
+        for nested_dict in nested_expression_dict.values():
+            self.select_dict.update(nested_dict)
+
+        self.fields, self.id_selected = parse_requested_fields(requested_fields, self.select_dict,
+                                                               nested_expression_dict)
+
+        self.select_expression = "SELECT {} FROM {}".format(get_select_expressions(self.fields, self.select_dict),
+                                                            table)
+        self.where = where
+        self.where_expression = "WHERE {}".format(where) if where else ''
+
+        self.order_by_expression = ''
+        self.cursor_sort_keys = None
+        self.cursor_order_by_expressions = None
+        if many:
+            self.order_by_expression = get_order_by(sort, self.fields)
+
+            if keyset:
+                sort_keys = get_sort_keys(sort, self.fields)
+                if ('id', False) not in sort_keys and ('id', True) not in sort_keys:
+                    sort_keys.append(('id', sort_keys[-1][1] if sort_keys else False))
+
+                self.cursor_sort_keys = sort_keys
+                self.cursor_order_by_expressions = {
+                    False: format_order_by(sort_keys),
+                    True: format_order_by(sort_keys, reverse=True),
+                }
+
+
+def get_query_plan(schema, table, root_select_expression_dict, request, where='', many=True, sort=None, keyset=False,
+                   nested_expression_dict=None):
+    """
+    Returns the :class:`QueryPlan` for a request, compiling it only if the same query hasn't been requested before.
+    """
+    nested_expression_dict = nested_expression_dict or {}
+    requested_fields = request.values.get('fields[{}]'.format(schema.Meta.type_))
+
+    key = (schema.Meta.type_, table, tuple(root_select_expression_dict.items()),
+           tuple((name, tuple(nested_dict.items())) for name, nested_dict in nested_expression_dict.items()),
+           requested_fields, sort, where, many, keyset)
+
+    plan = plan_cache.get(key)
+    metrics.count('plan_cache', None, 'miss' if plan is None else 'hit')
+    if plan is None:
+        plan = QueryPlan(table, root_select_expression_dict, requested_fields, sort, where, many, keyset,
+                         nested_expression_dict)
+        plan_cache.set(key, plan)
+    return plan
+
+
 def fetch_data(schema, table, root_select_expression_dict, max_page_size, request, where='', args=None, many=True,
-               enricher=None, sort=None, limit=True, **nested_expression_dict):
+               enricher=None, sort=None, limit=True, keyset=False, stream=False, id_filter=False,
+               **nested_expression_dict):
     """ Fetches data in an JSON-API conforming way.
 
+    The SQL (apart from the page) is compiled once per combination of endpoint, requested fields and sort order and
+    then reused, see :func:`get_query_plan`.
+
     :param schema: the marshmallow schema to use for serialization, provided by faftools: https://github.com/FAForever/faftools/tree/develop/faf/api 
     :param table: the table to select the data from (or any FROM expression, without the FROM)
     :param root_select_expression_dict: a dictionary that maps API field names to select expressions
@@ -111,17 +400,283 @@ def fetch_data(schema, table, root_select_expression_dict, max_page_size, reques
     :param many: ``True`` for selecting many entries, ``False`` for single entries
     :param enricher: an option function to apply to each item BEFORE it's dumped using the schema
     :param sort: order the query by given column name in asc order, prefix with '-' for desc order
+    :param keyset: ``True`` to allow clients to page using ``page[after]``/``page[before]`` cursors instead of
+        ``page[number]``. The cursor holds the sort key values (plus the id as a tie breaker) of the last/first row so
+        that pages are fetched with a range condition instead of an offset. Requires `table` and `where` to not depend
+        on the page.
+    :param stream: ``True`` to return an iterator over the serialized resources instead of the JSON-API document. The
+        rows are read from an unbuffered cursor and enriched and serialized one by one, see :func:`stream_response`.
+        Requires `many` and can't be combined with `keyset`
+    :param id_filter: ``True`` to allow clients to select the entries with the given ids using ``filter[id]=a,b,c``,
+        see :func:`get_id_filter`. All of them are selected with a single ``IN`` condition on the `id` select
+        expression and returned unpaged. Requires `table` to not limit the rows itself
     :param nested_expression_dict: dict of nested objects to be found in select_expression_dict e.g.
         nested_expression_dict = {'nest_atr_name' : { 'nest_atr_key' : 'nest_atr_value'}}
     """
-    requested_fields = request.values.get('fields[{}]'.format(schema.Meta.type_))
+    if stream and (keyset or not many):
+        raise ValueError('Streaming requires many and does not support keyset pagination')
+
+    query = prepare_fetch(schema, table, root_select_expression_dict, max_page_size, request, where, args, many,
+                          enricher, sort, limit, keyset, id_filter, **nested_expression_dict)
+
+    connection = get_read_connection()
+    if stream:
+        cursor = connection.cursor(SSDictCursor)
+        cursor.execute(query.sql, query.args)
+        return iter_resources(schema, cursor, query.plan.id_selected, enricher)
+
+    with connection:
+        cursor = connection.cursor(DictCursor)
+        cursor.execute(query.sql, query.args)
+
+        if many:
+            result = cursor.fetchall()
+        else:
+            result = cursor.fetchone()
+
+    return query.to_document(result)
+
+
+class FetchQuery(object):
+    """
+    A :func:`fetch_data` query ready to be executed, see :func:`prepare_fetch`.
+
+    :ivar sql: the SQL to execute
+    :ivar args: the arguments to execute the SQL with
+    """
+
+    def __init__(self, schema, plan, sql, args, request, many, enricher, page_size, page_cursor):
+        self.schema = schema
+        self.plan = plan
+        self.sql = sql
+        self.args = args
+        self.request = request
+        self.many = many
+        self.enricher = enricher
+        self.page_size = page_size
+        self.page_cursor = page_cursor
+
+    def to_document(self, result):
+        """
+        Serializes the rows selected by the query into the JSON-API document returned by :func:`fetch_data`.
+
+        :param result: a list of rows if the query selects many entries, a single row (or ``None``) otherwise
+        """
+        plan = self.plan
+        links = None
+        if self.page_cursor:
+            before, cursor_token = self.page_cursor
+            has_more = len(result) > self.page_size
+            result = list(result[:self.page_size])
+            if before:
+                result.reverse()
+
+            first_values = [result[0][column] for column, _ in plan.cursor_sort_keys] if result else None
+            last_values = [result[-1][column] for column, _ in plan.cursor_sort_keys] if result else None
+            links = get_page_links(self.request, first_values, last_values,
+                                   has_previous=has_more if before else bool(cursor_token),
+                                   has_next=True if before else has_more)
+
+        data = dump_data(self.schema, result, self.many, plan.id_selected, self.enricher,
+                         getattr(self.request, 'endpoint', None))
+
+        if links is not None:
+            data['links'] = links
+
+        return data
+
+
+def prepare_fetch(schema, table, root_select_expression_dict, max_page_size, request, where='', args=None, many=True,
+                  enricher=None, sort=None, limit=True, keyset=False, id_filter=False, **nested_expression_dict):
+    """
+    Builds the query of :func:`fetch_data` without executing it, so that it can be run by another driver (see
+    :mod:`api.aio`). Takes the same parameters as :func:`fetch_data`, apart from `stream`.
+
+    :return: a :class:`FetchQuery`
+    """
+    if not sort:
+        sort = request.values.get('sort')
+
+    plan = get_query_plan(schema, table, root_select_expression_dict, request, where, many, sort, keyset,
+                          nested_expression_dict)
+
+    where_expression = plan.where_expression
+    limit_expression = ''
+    order_by_expression = ''
+    page_size = None
+    page_cursor = None
+    ids = get_id_filter(request) if id_filter and many else None
+    if ids is not None:
+        if keyset and get_page_cursor(request):
+            raise InvalidUsage("Page cursors can't be combined with an id filter")
+
+        condition, args = bind_args(get_id_condition(plan.select_dict['id'], ids), args, ids)
+        where_expression = "WHERE ({}) AND {}".format(where, condition) if where else "WHERE " + condition
+        order_by_expression = plan.order_by_expression
+    elif many:
+        page, page_size = get_page_attributes(max_page_size, request)
+        page_cursor = get_page_cursor(request) if keyset else None
+
+        if page_cursor:
+            before, cursor_token = page_cursor
+
+            if cursor_token:
+                cursor_values = decode_cursor(cursor_token, len(plan.cursor_sort_keys))
+                condition, condition_args = get_keyset_condition(plan.cursor_sort_keys, plan.select_dict,
+                                                                 cursor_values, before)
+                condition, args = bind_args(condition, args, condition_args)
+                where_expression = "WHERE ({}) AND {}".format(where, condition) if where else "WHERE " + condition
+
+            # Fetch one additional row to find out whether there is another page
+            order_by_expression = plan.cursor_order_by_expressions[before]
+            limit_expression = 'LIMIT {}'.format(page_size + 1)
+        else:
+            if limit:
+                limit_expression = get_limit(page, page_size)
+            order_by_expression = plan.order_by_expression
+
+    sql = "{} {} {} {}".format(plan.select_expression, where_expression, order_by_expression, limit_expression)
+    return FetchQuery(schema, plan, sql, args, request, many, enricher, page_size, page_cursor)
+
+
+def iter_resources(schema, cursor, id_selected, enricher=None):
+    """
+    Enriches and serializes the rows of an unbuffered cursor one at a time, closing the cursor when done.
+    """
+    count = 0
+    try:
+        for row in cursor:
+            yield dump_resource(schema, row, id_selected, enricher)
+            count += 1
+    finally:
+        cursor.close()
+        metrics.histogram('rows', count)
+
+
+def dump_resource(schema, row, id_selected, enricher=None):
+    """
+    Enriches and serializes a single row into a JSON-API resource object, like one item of :func:`dump_data`.
+    """
+    # Not timed, per row metrics would outweigh the work. iter_resources() records the number of rows of a stream
+    if enricher:
+        _enrich(row, False, enricher)
+    return _serialize(schema, row, False, id_selected)['data']
+
+
+def is_streamed(page_size):
+    """
+    Returns ``True`` if a list with the given page size should be sent using :func:`stream_response`, which is the
+    case if the page size is at least ``STREAM_MIN_PAGE_SIZE``.
+    """
+    min_page_size = current_app.config.get('STREAM_MIN_PAGE_SIZE')
+    return min_page_size is not None and page_size >= min_page_size
+
+
+def stream_response(resources, links=None):
+    """
+    Returns a response that sends the JSON-API document ``{"data": [...]}`` in chunks while iterating over
+    `resources`, so that neither the resources nor the document need to be held in memory at once.
+
+    :param resources: an iterable of resource objects
+    :param links: an optional ``links`` object
+    """
+    def generate():
+        yield '{"data":['
+        separator = ''
+        for resource in resources:
+            yield separator + flask_json.dumps(resource, separators=(',', ':'))
+            separator = ','
+        yield ']'
+        if links is not None:
+            yield ',"links":' + flask_json.dumps(links, separators=(',', ':'))
+        yield '}'
+
+    return current_app.response_class(stream_with_context(generate()), content_type='application/vnd.api+json')
+
+
+def dump_rows(schema, rows, select_expression_dict, max_page_size, request, many=True, sort=None, enricher=None,
+              id_filter=False):
+    """ Serializes rows held in memory the same way :func:`fetch_data` serializes rows selected from the database,
+    i.e. honoring ``fields[<type>]`` and, if `many` is ``True``, ``sort``, ``page[size]`` and ``page[number]``.
+
+    :param schema: the marshmallow schema to use for serialization
+    :param rows: a list of rows if `many` is ``True``, a single row (or ``None``) otherwise. The rows are not modified
+    :param select_expression_dict: a dictionary whose keys are the fields available in the rows
+    :param max_page_size: max number of items per page
+    :param request: the flask HTTP request
+    :param many: ``True`` if `rows` is a list of rows
+    :param sort: order the rows by given column name in asc order, prefix with '-' for desc order
+    :param enricher: an option function to apply to each item BEFORE it's dumped using the schema
+    :param id_filter: ``True`` to allow clients to select the rows with the given ids using ``filter[id]=a,b,c``
+        instead of a page, see :func:`get_id_filter`
+    """
+    fields, id_selected = get_requested_fields(schema, request, select_expression_dict)
+
+    if not many:
+        result = {field: rows[field] for field in fields if field in rows} if rows else None
+        return dump_data(schema, result, many, id_selected, enricher, request.endpoint)
 
     if not sort:
         sort = request.values.get('sort')
 
-    select_dict = {**root_select_expression_dict}
-    for nested_dict in nested_expression_dict.values():
-        select_dict.update(nested_dict)
+    ids = get_id_filter(request) if id_filter else None
+    if ids is not None:
+        ids = set(ids)
+        rows = sort_rows([row for row in rows if str(row['id']) in ids], get_sort_keys(sort, fields))
+    else:
+        page, page_size = get_page_attributes(max_page_size, request)
+        rows = sort_rows(rows, get_sort_keys(sort, fields))
+        rows = rows[(page - 1) * page_size:page * page_size]
+
+    result = [{field: row[field] for field in fields if field in row} for row in rows]
+    return dump_data(schema, result, many, id_selected, enricher, request.endpoint)
+
+
+def sort_rows(rows, sort_keys):
+    """
+    Sorts rows in memory like MySQL would, i.e. with NULLs first and strings compared case insensitively.
+
+    :param rows: the rows to sort
+    :param sort_keys: the sort keys as returned by :func:`get_sort_keys`
+    :return: a new, sorted list
+    """
+    rows = list(rows)
+
+    # Python's sort is stable, so sorting by the least significant key first yields the combined order
+    for column, descending in reversed(sort_keys):
+        rows.sort(key=lambda row: _sort_value(row[column]), reverse=descending)
+
+    return rows
+
+
+def _sort_value(value):
+    if value is None:
+        return False, 0
+    if isinstance(value, str):
+        return True, value.lower()
+    return True, value
+
+
+def get_requested_fields(schema, request, select_dict, nested_expression_dict=None):
+    """
+    Returns the fields requested using ``fields[<type>]``, restricted to the keys of `select_dict`, and whether the
+    client asked for the `id`. The returned list always contains `id`.
+
+    :param schema: the marshmallow schema whose type is used to look up the requested fields
+    :param request: the flask HTTP request
+    :param select_dict: a dictionary whose keys are the available fields
+    :param nested_expression_dict: dict of nested objects, see :func:`fetch_data`
+    :return: a tuple of the list of fields and ``True`` if `id` was requested
+    """
+    requested_fields = request.values.get('fields[{}]'.format(schema.Meta.type_))
+    return parse_requested_fields(requested_fields, select_dict, nested_expression_dict)
+
+
+def parse_requested_fields(requested_fields, select_dict, nested_expression_dict=None):
+    """
+    Like :func:`get_requested_fields`, but takes the value of the ``fields[<type>]`` parameter.
+    """
+    nested_expression_dict = nested_expression_dict or {}
 
     # Sanitize fields
     if requested_fields:
@@ -138,36 +693,44 @@ def fetch_data(schema, table, root_select_expression_dict, max_page_size, reques
         fields.append('id')
         id_selected = False
 
-    select_expressions = get_select_expressions(fields, select_dict)
+    return fields, id_selected
+
+
+def dump_data(schema, result, many, id_selected, enricher=None, endpoint=None):
+    """
+    Enriches and serializes rows into a JSON-API document. Rows are serialized by :func:`fast_dump` unless the schema
+    requires marshmallow.
+
+    :param schema: the marshmallow schema to use for serialization
+    :param result: a list of rows if `many` is ``True``, a single row (or ``None``) otherwise
+    :param many: ``True`` if `result` is a list of rows
+    :param id_selected: ``True`` if `id` should also be put into the attributes
+    :param enricher: an option function to apply to each item BEFORE it's dumped using the schema
+    :param endpoint: the endpoint to record metrics for, defaults to the one of the current flask request
+    """
+    if enricher:
+        with metrics.timer('enrich', endpoint):
+            _enrich(result, many, enricher)
 
-    limit_expression = ''
-    order_by_expression = ''
     if many:
-        page, page_size = get_page_attributes(max_page_size, request)
-        if limit:
-            limit_expression = get_limit(page, page_size)
-        order_by_expression = get_order_by(sort, fields)
+        metrics.histogram('rows', len(result), endpoint)
 
-    if where:
-        where = "WHERE {}".format(where)
+    with metrics.timer('serialize', endpoint):
+        return _serialize(schema, result, many, id_selected)
 
-    with db.connection:
-        cursor = db.connection.cursor(DictCursor)
-        cursor.execute("SELECT {} FROM {} {} {} {}"
-                       .format(select_expressions, table, where, order_by_expression, limit_expression),
-                       args)
 
-        if many:
-            result = cursor.fetchall()
-        else:
-            result = cursor.fetchone()
+def _enrich(result, many, enricher):
+    if many:
+        for item in result:
+            enricher(item)
+    elif result:
+        enricher(result)
 
-    if enricher:
-        if many:
-            for item in result:
-                enricher(item)
-        elif result:
-            enricher(result)
+
+def _serialize(schema, result, many, id_selected):
+    data = fast_dump(schema, result, many, id_selected)
+    if data is not None:
+        return data
 
     data = schema.dump(result, many=many).data
 
@@ -1,11 +1,17 @@
+from bisect import bisect_left, bisect_right
+
 from faf.api.ranked1v1_schema import Ranked1v1Schema
 from faf.api.ranked1v1_stats_schema import Ranked1v1StatsSchema
 from flask import request
 from pymysql.cursors import DictCursor
 
 from api import app, InvalidUsage
-from api.query_commons import fetch_data
-from faf import db
+from api.db_pool import get_read_connection
+from api.ladder_index import LadderIndex, RatingHistogram, DEFAULT_BUCKET_WIDTHS, sort_key
+from api.query_commons import get_page_attributes, get_page_cursor, decode_cursor, get_page_links, \
+    get_requested_fields, get_select_expressions, dump_data, dump_resource, is_streamed, stream_response, \
+    get_id_filter
+from api.response_cache import cached
 
 ALLOWED_EXTENSIONS = {'zip'}
 MAX_PAGE_SIZE = 5000
@@ -22,7 +28,81 @@ SELECT_EXPRESSIONS = {
     'ranking': '@rownum:=@rownum+1'
 }
 
-TABLE = 'ladder1v1_rating r JOIN login l on r.id = l.id, (SELECT @rownum:=%(row_num)s) n'
+TABLE = 'ladder1v1_rating r JOIN login l on r.id = l.id'
+MAX_AROUND_COUNT = 100
+LADDER_QUERY = 'SELECT {} FROM {}'.format(
+    get_select_expressions([field for field in SELECT_EXPRESSIONS if field != 'ranking'], SELECT_EXPRESSIONS), TABLE)
+
+
+def load_ladder():
+    """
+    Loads all ladder rows for the :class:`LadderIndex`.
+    """
+    connection = get_read_connection()
+    with connection:
+        cursor = connection.cursor(DictCursor)
+        cursor.execute(LADDER_QUERY)
+        return cursor.fetchall()
+
+
+def update_rating_histogram(ladder):
+    """
+    Syncs the rating histogram with every reload of the ladder index.
+    """
+    rating_histogram.sync(ladder.rows)
+
+
+rating_histogram = RatingHistogram()
+ladder_index = LadderIndex(load_ladder, on_update=update_rating_histogram)
+
+
+def get_ladder_index():
+    ladder_index.ttl = app.config.get('LADDER_INDEX_TTL', ladder_index.ttl)
+    return ladder_index
+
+
+def get_ladder():
+    return get_ladder_index().get()
+
+
+def get_rating_histogram():
+    """
+    Returns the rating histogram, brought up to date with the ladder if it needs to be reloaded.
+    """
+    rating_histogram.set_widths(app.config.get('RANKED1V1_STATS_BUCKET_WIDTHS', DEFAULT_BUCKET_WIDTHS))
+    get_ladder()
+    return rating_histogram
+
+
+def dump_players(request, rows, rankings, many=True, stream=False):
+    """
+    Serializes ladder rows, honoring ``fields[ranked1v1]``.
+
+    :param request: the HTTP request
+    :param rows: the ladder rows to serialize
+    :param rankings: the ranking of each row
+    :param stream: ``True`` to return a streamed response, see :func:`stream_response`
+    """
+    fields, id_selected = get_requested_fields(Ranked1v1Schema(), request, SELECT_EXPRESSIONS)
+
+    items = player_items(rows, rankings, fields)
+
+    if stream:
+        return stream_response(dump_resource(Ranked1v1Schema(), item, id_selected) for item in items)
+
+    result = list(items)
+    if not many:
+        result = result[0] if result else None
+
+    return dump_data(Ranked1v1Schema(), result, many, id_selected, endpoint=request.endpoint)
+
+
+def player_items(rows, rankings, fields):
+    for row, ranking in zip(rows, rankings):
+        item = {field: row[field] for field in fields if field in row}
+        if 'ranking' in fields:
+            item['ranking'] = ranking
+        yield item
 
 
 @app.route('/ranked1v1')
@@ -79,30 +159,69 @@ def ranked1v1():
     :type filter[isActive]: boolean
     :param filter[player]: Allows search functionality in the ranked1v1 endpoint based upon the players login name (EX.: /ranked1v1?filter[player]=Zock)
     :type filter[player]: name
+    :param page[after]: Opaque cursor from ``links.next``, returns the page following it. Pass it empty to get the first page with cursor links.
+    :param page[before]: Opaque cursor from ``links.prev``, returns the page preceding it.
+    :param filter[id]: A comma separated list of player ids, returns these players instead of a page. Can't be combined with other filters or page cursors (EX.: /ranked1v1?filter[id]=781,1035)
     :status 200: No error
 
+    """
+    return ladder_page(request, get_ladder())
+
+
+def ladder_page(request, ladder):
+    """
+    Returns the /ranked1v1 response for a request, using the given :class:`LadderSnapshot`.
     """
     if request.values.get('sort'):
         raise InvalidUsage('Sorting is not supported for ranked1v1')
 
-    page = int(request.values.get('page[number]', 1))
-    page_size = int(request.values.get('page[size]', MAX_PAGE_SIZE))
-    player = request.args.get('filter[player]')
-    row_num = (page - 1) * page_size
+    player_ids = get_id_filter(request, int)
+    if player_ids is not None:
+        if any(request.values.get(parameter) is not None
+               for parameter in ('filter[player]', 'filter[is_active]', 'page[after]', 'page[before]')):
+            raise InvalidUsage('filter[id] can not be combined with other filters or page cursors')
+
+        rows = sorted((row for row in map(ladder.get, player_ids) if row is not None), key=sort_key)
+        return dump_players(request, rows, [ladder.rank(row['rating']) for row in rows])
 
-    args = {'row_num': row_num}
+    page, page_size = get_page_attributes(MAX_PAGE_SIZE, request)
+    page_cursor = get_page_cursor(request)
+    player = request.args.get('filter[player]')
 
-    where = ''
+    active = None
     active_filter = request.values.get('filter[is_active]')
     if active_filter:
-        where += 'is_active = ' + ('1' if active_filter.lower() == 'true' else '0') + ' AND r.numGames > 0'
+        active = active_filter.lower() == 'true'
 
-    if player:
-        where += " l.login LIKE %(player)s"
-        args['player'] = '%' + player + '%'
+    rows, keys = ladder.view(active)
 
-    return fetch_data(Ranked1v1Schema(), TABLE, SELECT_EXPRESSIONS, MAX_PAGE_SIZE, request, sort='-rating',
-                      args=args, where=where)
+    if player:
+        player = player.lower()
+        rows = [row for row in rows if player in row['login'].lower()]
+        keys = [sort_key(row) for row in rows]
+
+    if not page_cursor:
+        start = (page - 1) * page_size
+        page_rows = rows[start:start + page_size]
+        return dump_players(request, page_rows, range(start + 1, start + len(page_rows) + 1),
+                            stream=is_streamed(page_size))
+
+    before, cursor = page_cursor
+    if not cursor:
+        start = 0
+    else:
+        rating, player_id = decode_cursor(cursor, 2)
+        index = (bisect_left if before else bisect_right)(keys, (-rating, int(player_id)))
+        start = max(0, index - page_size) if before else index
+
+    page_rows = rows[start:start + page_size]
+
+    result = dump_players(request, page_rows, range(start + 1, start + len(page_rows) + 1))
+    result['links'] = get_page_links(request,
+                                     [page_rows[0]['rating'], page_rows[0]['id']] if page_rows else None,
+                                     [page_rows[-1]['rating'], page_rows[-1]['id']] if page_rows else None,
+                                     has_previous=start > 0, has_next=start + page_size < len(rows))
+    return result
 
 
 @app.route('/ranked1v1/<int:player_id>')
@@ -147,26 +266,96 @@ def ranked1v1_get(player_id):
     :status 404: No entry with this id was found
 
     """
-    select_expressions = SELECT_EXPRESSIONS.copy()
-    select_expressions['ranking'] = """(SELECT count(*) FROM ladder1v1_rating
-                                        WHERE ROUND(mean - 3 * deviation) >= ROUND(r.mean - 3 * r.deviation)
-                                        AND is_active = 1
-                                        AND numGames > 0)
-                                        """
-
-    result = fetch_data(Ranked1v1Schema(), TABLE, select_expressions, MAX_PAGE_SIZE, request,
-                        many=False, where='r.id=%(id)s', args=dict(id=player_id, row_num=0))
+    ladder = get_ladder()
+    row = ladder.get(player_id)
 
-    if 'id' not in result['data']:
+    if row is None:
         return {'errors': [{'title': 'No entry with this id was found'}]}, 404
 
-    return result
+    return dump_players(request, [row], [ladder.rank(row['rating'])], many=False)
+
+
+@app.route('/ranked1v1/<int:player_id>/around')
+def ranked1v1_around(player_id):
+    """
+    Gets the ranked players around a player, ordered by ranking. Player must be active and have played at least one
+    ranked game.
+
+    **Example Request**:
+
+    .. sourcecode:: http
+
+       GET /ranked1v1/781/around?count=1
+
+    **Example Response**:
+
+    .. sourcecode:: http
+
+        HTTP/1.1 200 OK
+        Vary: Accept
+        Content-Type: text/javascript
+
+        {
+          "data": [
+            {
+              "attributes": {
+                "id": "781",
+                "login": "Zock",
+                "ranking": 1,
+                "rating": 2330,
+                ...
+              },
+              "id": "781",
+              "type": "ranked1v1"
+            },
+            {
+              "attributes": {
+                "id": "782",
+                "login": "Sheeo",
+                "ranking": 2,
+                "rating": 2201,
+                ...
+              },
+              "id": "782",
+              "type": "ranked1v1"
+            }
+          ]
+        }
+
+    :param count: The number of players to return above and below the player, default is 5
+    :type count: int
+    :status 200: No error
+    :status 404: No ranked entry with this id was found
+
+    """
+    try:
+        count = int(request.values.get('count', 5))
+    except ValueError:
+        raise InvalidUsage('Invalid count')
+    if count < 0 or count > MAX_AROUND_COUNT:
+        raise InvalidUsage('Invalid count')
+
+    ladder = get_ladder()
+    position = ladder.position(player_id, active=True)
+
+    if position is None:
+        return {'errors': [{'title': 'No ranked entry with this id was found'}]}, 404
+
+    rows = ladder.view(active=True)[0]
+    start = max(0, position - count)
+    page_rows = rows[start:position + count + 1]
+
+    return dump_players(request, page_rows, [ladder.rank(row['rating']) for row in page_rows])
 
 
 @app.route("/ranked1v1/stats")
+@cached()
 def ranked1v1_stats():
     """
-    Gets all player stats sorted by rankings.
+    Gets the number of players per rating bucket. Players are counted if they played at least one game, have a mean
+    between 0 and 3000 and a deviation of at most 250.
+
+    The distribution is held in memory and updated whenever the ladder is reloaded (see ``LADDER_INDEX_TTL``).
 
     **Example Request**:
 
@@ -224,29 +413,25 @@ def ranked1v1_stats():
           }
         }
 
+    :param bucket_width: The width of the rating buckets, one of ``RANKED1V1_STATS_BUCKET_WIDTHS`` (EX.: /ranked1v1/stats?bucket_width=100)
+    :type bucket_width: int
+    :param filter[is_active]: Whether to count active (default) or inactive players (true or false)
+    :type filter[is_active]: boolean
     :status 200: No error
 
     """
-    with db.connection:
-        cursor = db.connection.cursor(DictCursor)
-        cursor.execute("""
-        SELECT
-            FLOOR((mean - 3 * deviation)/100) * 100 AS `rating`,
-            count(*) as count
-        FROM ladder1v1_rating
-        WHERE `is_active` = 1
-            AND mean BETWEEN 0 AND 3000
-            AND deviation <= 250
-            AND numGames > 0
-        GROUP BY `rating`
-        ORDER BY CAST(`rating` as SIGNED) ASC;
-        """)
+    histogram = get_rating_histogram()
 
-        result = cursor.fetchall()
+    try:
+        width = int(request.values.get('bucket_width', histogram.widths[0]))
+    except ValueError:
+        raise InvalidUsage('Invalid bucket width')
+    if width not in histogram.widths:
+        raise InvalidUsage('Invalid bucket width')
 
-    data = dict(id='/ranked1v1/stats', rating_distribution={})
+    active_filter = request.values.get('filter[is_active]')
+    active = active_filter is None or active_filter.lower() == 'true'
 
-    for item in result:
-        data['rating_distribution'][str(int(item['rating']))] = item['count']
+    data = dict(id='/ranked1v1/stats', rating_distribution=histogram.distribution(width, active))
 
     return Ranked1v1StatsSchema().dump(data, many=False).data
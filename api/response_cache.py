@@ -0,0 +1,202 @@
+"""
+Caches the responses of read-only GET routes.
+
+Routes decorated with :func:`cached` are looked up by endpoint and normalized query string (so fields, sort, page,
+filters, language and region each get their own entry) before the view is called. Responses carry a strong ``ETag``
+and a ``Cache-Control`` header; a request whose ``If-None-Match`` matches the cached ``ETag`` is answered with
+``304 Not Modified`` without calling the view. Only complete ``200`` responses are cached, streamed responses are not.
+
+Entries are kept in a :class:`LocalStorage` per worker process by default, or in a shared :class:`SharedStorage`
+(e.g. redis) if ``RESPONSE_CACHE_REDIS_URL`` is set.
+"""
+import functools
+import hashlib
+import pickle
+import threading
+import time
+
+from flask import current_app, request
+
+from api.cache import TTLCache
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 1000
+KEY_PREFIX = 'api:response:'
+
+storage = None
+route_ttls = {}
+
+
+class CachedResponse(object):
+    def __init__(self, body, content_type, etag):
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+
+
+class LocalStorage(object):
+    """
+    Stores responses in an LRU cache of the current process.
+
+    :param max_size: maximum number of cached responses
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_ENTRIES):
+        self._cache = TTLCache(max_size=max_size)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, entry, ttl):
+        self._cache.set(key, entry, ttl)
+
+    def delete_prefix(self, prefix):
+        self._cache.delete_if(lambda key, _: key.startswith(prefix))
+
+
+class SharedStorage(object):
+    """
+    Stores responses in a key value store shared by all workers.
+
+    :param client: a client with the ``get``, ``setex``, ``scan_iter`` and ``delete`` methods of ``redis.StrictRedis``
+    """
+
+    def __init__(self, client, key_prefix=KEY_PREFIX):
+        self._client = client
+        self._key_prefix = key_prefix
+
+    def get(self, key):
+        value = self._client.get(self._key_prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, entry, ttl):
+        self._client.setex(self._key_prefix + key, ttl, pickle.dumps(entry))
+
+    def delete_prefix(self, prefix):
+        keys = list(self._client.scan_iter(match=self._key_prefix + prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+
+class InMemoryClient(object):
+    """
+    Stand-in for a redis client, implementing what :class:`SharedStorage` uses. Useful for tests and development.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._values.get(name)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._values[name]
+                return None
+            return value
+
+    def setex(self, name, time_, value):
+        with self._lock:
+            self._values[name] = value, time.monotonic() + time_
+
+    def scan_iter(self, match):
+        with self._lock:
+            prefix = match.rstrip('*')
+            return [name for name in self._values if name.startswith(prefix)]
+
+    def delete(self, *names):
+        with self._lock:
+            for name in names:
+                self._values.pop(name, None)
+
+
+def init_response_cache(app):
+    """
+    Sets up the response cache if ``RESPONSE_CACHE_ENABLED`` is set in the flask config, replacing (and thereby
+    emptying) any cache set up before.
+
+    Further supported configuration keys are ``RESPONSE_CACHE_MAX_ENTRIES``, ``RESPONSE_CACHE_REDIS_URL`` and
+    ``RESPONSE_CACHE_TTLS``, a dict of endpoint names to seconds overriding the TTLs passed to :func:`cached`.
+    """
+    global storage, route_ttls
+    storage = None
+    route_ttls = dict(app.config.get('RESPONSE_CACHE_TTLS') or {})
+
+    if not app.config.get('RESPONSE_CACHE_ENABLED'):
+        return None
+
+    redis_url = app.config.get('RESPONSE_CACHE_REDIS_URL')
+    if redis_url:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RESPONSE_CACHE_REDIS_URL requires the redis package')
+        storage = SharedStorage(redis.StrictRedis.from_url(redis_url))
+    else:
+        storage = LocalStorage(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+    return storage
+
+
+def cached(ttl=DEFAULT_TTL):
+    """
+    Decorates a GET view so that its responses are cached for `ttl` seconds. Must be applied below ``@app.route``.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if storage is None or request.method != 'GET':
+                return view(*args, **kwargs)
+
+            route_ttl = route_ttls.get(request.endpoint, ttl)
+            key = get_key(request)
+            entry = storage.get(key)
+            if entry is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+
+                body = response.get_data()
+                entry = CachedResponse(body, response.headers.get('Content-Type'), make_etag(body))
+                storage.set(key, entry, route_ttl)
+
+            return make_cached_response(entry, route_ttl)
+
+        wrapper.cache_ttl = ttl
+        return wrapper
+
+    return decorator
+
+
+def get_key(request):
+    """
+    Returns the cache key of a request: its endpoint, view arguments and its query parameters, sorted.
+    """
+    view_args = sorted((request.view_args or {}).items())
+    query = sorted(request.args.items(multi=True))
+    return '{}:{}:{}:{}'.format(request.endpoint, request.host, view_args, query)
+
+
+def make_etag(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+def make_cached_response(entry, ttl):
+    if request.if_none_match.contains_weak(entry.etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(entry.body, content_type=entry.content_type)
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = 'public, max-age={}'.format(ttl)
+    return response
+
+
+def invalidate(endpoint):
+    """
+    Drops all cached responses of an endpoint, e.g. after its data changed.
+    """
+    if storage is not None:
+        storage.delete_prefix(endpoint + ':')
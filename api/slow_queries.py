@@ -0,0 +1,215 @@
+"""
+Slow query log.
+
+When ``SLOW_QUERY_THRESHOLD_MS`` is set, every statement executed through the connection pool (or the aiomysql pool
+of :mod:`api.aio`) that takes longer is logged together with the types of its arguments, the endpoint and the query
+parameters of the request, and kept in a bounded in-memory log served by ``/admin/slow_queries``. The arguments
+themselves, which may be tokens or other secrets, are only logged with ``SLOW_QUERY_LOG_ARGS``. With
+``SLOW_QUERY_EXPLAIN``, the plan of slow SELECT statements is captured by running ``EXPLAIN`` on a background thread,
+so the request doesn't wait for it. Each worker process keeps its own log.
+"""
+import collections
+import itertools
+import logging
+import queue
+import threading
+import time
+
+from flask import has_request_context, request
+
+from faf import db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_SIZE = 100
+# Slow statements waiting to be explained, further statements aren't explained
+EXPLAIN_QUEUE_SIZE = 100
+
+recorder = None
+
+
+class SlowQueryRecorder(object):
+    """
+    Records statements that took longer than a threshold.
+
+    :param threshold: milliseconds above which a statement is recorded
+    :param size: maximum number of samples kept, older samples are discarded
+    :param explain: a callable taking the SQL and arguments of a statement and returning its plan, called on a
+        background thread, or ``None`` to not capture plans
+    :param log_args: ``True`` to record the arguments of statements, ``False`` to only record their types (see
+        :func:`redact`)
+    """
+
+    def __init__(self, threshold, size=DEFAULT_LOG_SIZE, explain=None, log_args=False):
+        self.threshold = threshold
+        self.log_args = log_args
+        self._samples = collections.deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._explain = explain
+        self._queue = None
+        self._thread = None
+
+        if explain is not None:
+            self._queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+            self._thread = threading.Thread(target=self._run, name='slow-query-explain', daemon=True)
+            self._thread.start()
+
+    def record(self, sql, args, duration, endpoint=None, parameters=None):
+        """
+        Records a statement if it took longer than the threshold.
+
+        :param duration: milliseconds the statement took
+        :param endpoint: the endpoint that ran the statement, defaults to the one of the current flask request
+        :param parameters: the query parameters of the request, as a dict of lists, defaults to the ones of the current
+            flask request
+        :return: the sample, or ``None`` if the statement wasn't slow
+        """
+        if duration < self.threshold or sql.lstrip()[:7].upper() == 'EXPLAIN':
+            return None
+
+        if endpoint is None and has_request_context():
+            endpoint = request.endpoint
+            parameters = request.args.to_dict(flat=False)
+
+        sample = {
+            'id': next(self._ids),
+            'timestamp': time.time(),
+            'duration': round(duration, 3),
+            'endpoint': endpoint,
+            'parameters': parameters or {},
+            'sql': sql,
+            'args': args if self.log_args or args is None else redact(args),
+            'explain': None,
+        }
+        with self._lock:
+            self._samples.append(sample)
+
+        logger.warning('Slow query ({:.0f} ms) on {}, parameters {}: {} {}'.format(
+            duration, endpoint, sample['parameters'], sql, sample['args']))
+
+        if self._queue is not None and sample['sql'].lstrip()[:6].upper() == 'SELECT':
+            try:
+                self._queue.put_nowait((sample, args))
+            except queue.Full:
+                pass
+
+        return sample
+
+    def samples(self):
+        """
+        Returns the recorded samples, most recent first.
+        """
+        with self._lock:
+            return list(reversed(self._samples))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            sample, args = item
+            try:
+                sample['explain'] = self._explain(sample['sql'], args)
+            except Exception:
+                logger.exception('Failed to explain slow query {}'.format(sample['id']))
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+
+def redact(args):
+    """
+    Replaces the values of statement arguments by the names of their types, keeping the structure of sequences and
+    dicts, e.g. ``redact([1, ('a', None)]) == ['int', ['str', 'NoneType']]``.
+    """
+    if isinstance(args, dict):
+        return {key: redact(value) for key, value in args.items()}
+    if isinstance(args, (list, tuple)):
+        return [redact(arg) for arg in args]
+    return type(args).__name__
+
+
+class RecordingCursor(object):
+    """
+    Wraps a DB-API cursor, recording its slow ``execute`` and ``executemany`` calls.
+    """
+
+    def __init__(self, cursor, recorder):
+        self.cursor = cursor
+        self.recorder = recorder
+
+    def execute(self, query, args=None):
+        start = time.monotonic()
+        try:
+            return self.cursor.execute(query, args)
+        finally:
+            self.recorder.record(query, args, (time.monotonic() - start) * 1000)
+
+    def executemany(self, query, args):
+        start = time.monotonic()
+        try:
+            return self.cursor.executemany(query, args)
+        finally:
+            self.recorder.record(query, args, (time.monotonic() - start) * 1000)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        self.cursor.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.cursor.__exit__(exc_type, exc_value, traceback)
+
+    def __getattr__(self, item):
+        return getattr(self.cursor, item)
+
+
+def recording_cursor(cursor):
+    """
+    Returns `cursor` wrapped into a :class:`RecordingCursor` if the slow query log is enabled, `cursor` itself
+    otherwise.
+    """
+    if recorder is None:
+        return cursor
+    return RecordingCursor(cursor, recorder)
+
+
+def explain(sql, args):
+    """
+    Returns the rows of ``EXPLAIN`` for a statement, using a connection of the pool that is returned afterwards.
+    """
+    try:
+        cursor = db.connection.cursor(db.pymysql.cursors.DictCursor)
+        cursor.execute('EXPLAIN ' + sql, args)
+        return cursor.fetchall()
+    finally:
+        db.connection.release()
+
+
+def init_slow_queries(app):
+    """
+    Starts recording slow queries if ``SLOW_QUERY_THRESHOLD_MS`` is set in the flask config, replacing any recorder
+    started before.
+
+    Further supported configuration keys are ``SLOW_QUERY_LOG_SIZE``, ``SLOW_QUERY_EXPLAIN`` and
+    ``SLOW_QUERY_LOG_ARGS``.
+    """
+    global recorder
+    if recorder is not None:
+        recorder.stop()
+        recorder = None
+
+    threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    if threshold is None:
+        return None
+
+    recorder = SlowQueryRecorder(threshold, size=app.config.get('SLOW_QUERY_LOG_SIZE', DEFAULT_LOG_SIZE),
+                                 explain=explain if app.config.get('SLOW_QUERY_EXPLAIN') else None,
+                                 log_args=app.config.get('SLOW_QUERY_LOG_ARGS', False))
+    return recorder
@@ -0,0 +1,178 @@
+"""
+Streaming file uploads.
+
+``FileStorage.save()`` has werkzeug spool the whole upload into a temporary file first, which is then copied to its
+destination. :func:`receive_file` instead parses the multipart body itself and writes every chunk of the uploaded file
+straight into a temporary file next to its destination, while
+
+* enforcing a maximum size, rejecting requests announcing a larger body before reading it,
+* computing the SHA-1 and MD5 of the content,
+* checking that it starts like a ZIP archive (if requested), so that other files are rejected with the first chunk.
+
+Once the upload is complete, the central directory of the archive is checked (this only reads the end of the file)
+and the temporary file is renamed to its destination using :func:`os.replace`, so readers never see partial files.
+
+Served by aiohttp, the upload routes get the body while it is being received, see :mod:`api.aio`.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import zipfile
+from collections import namedtuple
+
+from werkzeug.formparser import parse_form_data
+from werkzeug.utils import secure_filename
+
+from api import InvalidUsage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+# Room for the multipart boundaries and headers and the other form fields of an upload request
+MAX_FORM_SIZE = 64 * 1024
+
+ZIP_SIGNATURES = (b'PK\x03\x04', b'PK\x05\x06')
+
+# mkstemp() creates files only readable by their owner, stored uploads get the mode other new files would get.
+# The umask can only be read by setting it, which isn't thread safe, so it's read once on import.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+StoredUpload = namedtuple('StoredUpload', ['path', 'filename', 'size', 'sha1', 'md5'])
+
+
+class UploadSink(object):
+    """
+    A writable file object that stores an upload in a temporary file within `directory`, as werkzeug passes it.
+
+    :param directory: the directory the upload will be stored in
+    :param max_size: the maximum size of the upload in bytes
+    :param validate_zip: ``True`` to only accept ZIP archives
+    """
+
+    def __init__(self, directory, max_size, validate_zip=False):
+        self.max_size = max_size
+        self.validate_zip = validate_zip
+        self.size = 0
+        self._sha1 = hashlib.sha1()
+        self._md5 = hashlib.md5()
+        self._head = b''
+
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise InvalidUsage("File is too large", status_code=413)
+
+        if self.validate_zip and len(self._head) < 4:
+            self._head += data[:4 - len(self._head)]
+            if not any(signature.startswith(self._head) for signature in ZIP_SIGNATURES):
+                raise InvalidUsage("File is not a valid zip archive")
+
+        self._sha1.update(data)
+        self._md5.update(data)
+        self._file.write(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def commit(self, path):
+        """
+        Checks the complete upload and moves it to `path`, replacing any existing file.
+        """
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+            if self.validate_zip:
+                self._file.seek(0)
+                try:
+                    zipfile.ZipFile(self._file).close()
+                except (zipfile.BadZipFile, EOFError):
+                    raise InvalidUsage("File is not a valid zip archive")
+
+            os.fchmod(self._file.fileno(), FILE_MODE)
+            self._file.close()
+            os.replace(self.temp_path, path)
+        except BaseException:
+            self.discard()
+            raise
+
+        return StoredUpload(path, os.path.basename(path), self.size, self._sha1.hexdigest(), self._md5.hexdigest())
+
+    def discard(self):
+        """
+        Removes the temporary file.
+        """
+        self._file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+
+def receive_file(request, directory, max_size=DEFAULT_MAX_SIZE, allowed_extensions=None, validate_zip=False,
+                 field='file'):
+    """
+    Stores the file `field` of a ``multipart/form-data`` request in `directory` while it is being received, see the
+    module documentation. Must be called before anything accesses ``request.form``, ``request.files`` or
+    ``request.values``.
+
+    :param request: the flask HTTP request
+    :param directory: the directory to store the file in, using its secured name
+    :param max_size: the maximum size of the file in bytes
+    :param allowed_extensions: the allowed file extensions, or ``None`` to allow any
+    :param validate_zip: ``True`` to only accept ZIP archives
+    :param field: the name of the form field holding the file
+    :return: a tuple of the :class:`StoredUpload` and the other form fields
+    :raises InvalidUsage: if no file was provided or the file isn't acceptable
+    """
+    if request.content_length is not None and request.content_length > max_size + MAX_FORM_SIZE:
+        raise InvalidUsage("File is too large", status_code=413)
+
+    sinks = []
+
+    def stream_factory(total_content_length, content_type, filename=None, content_length=None):
+        # Parts without a file name are rejected once parsing is done
+        if filename and allowed_extensions is not None and not is_allowed(filename, allowed_extensions):
+            raise InvalidUsage("Invalid file extension")
+
+        sink = UploadSink(directory, max_size, validate_zip)
+        sinks.append(sink)
+        return sink
+
+    try:
+        _, form, files = parse_form_data(request.environ, stream_factory=stream_factory,
+                                         max_form_memory_size=MAX_FORM_SIZE)
+
+        file = files.get(field)
+        if file is None or not file.filename:
+            raise InvalidUsage("No file has been provided")
+
+        filename = secure_filename(file.filename)
+        if not filename:
+            raise InvalidUsage("Invalid file name")
+
+        upload = file.stream.commit(os.path.join(directory, filename))
+    finally:
+        for sink in sinks:
+            if os.path.exists(sink.temp_path):
+                sink.discard()
+
+    logger.info('Stored upload {} ({} bytes, sha1 {}, md5 {})'.format(upload.path, upload.size, upload.sha1,
+                                                                         upload.md5))
+    return upload, form
+
+
+def is_allowed(filename, allowed_extensions):
+    return '.' in filename and filename.rsplit('.', 1)[1] in allowed_extensions
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""Seeds the configured database with generated data and measures the hot API paths
+
+Usage:
+  benchmark.py seed [options]
+  benchmark.py run [--requests=<n>] [--warmup=<n>] [--concurrency=<n>] [--filter-depth=<n>] [--only=<prefix>]
+                   [--output=<file>]
+  benchmark.py compare <baseline> <result> [--threshold=<percent>]
+
+Options:
+  -h                      Show this screen
+  --players=<n>           Number of players, each with a global rating [default: 100000]
+  --ladder-ratings=<n>    Number of ladder ratings [default: 100000]
+  --game-players=<n>      Number of game_player_stats rows [default: 1000000]
+  --players-per-game=<n>  Average number of players per game [default: 4]
+  --maps=<n>              Number of maps [default: 10000]
+  --mods=<n>              Number of mods [default: 10000]
+  --summary               Also fill the game_summary table, see game_summary.py
+  --seed=<n>              Seed of the random data [default: 1]
+  --requests=<n>          Measured requests per case [default: 50]
+  --warmup=<n>            Unmeasured requests per case sent first [default: 5]
+  --concurrency=<n>       Number of threads sending requests [default: 1]
+  --filter-depth=<n>      Maximum number of /games filters combined [default: 2]
+  --only=<prefix>         Only run the cases whose name starts with the given prefix
+  --output=<file>         Write the results to this file instead of stdout
+  --threshold=<percent>   Report cases whose median latency grew by more than this [default: 10]
+
+`seed` truncates the tables it fills, so it refuses to run if ENVIRONMENT is 'production'. Requests are sent using
+the flask test client, so the results cover the API and MySQL but not the HTTP server. `run` disables the response
+cache and event write-behind, which would otherwise answer the measured requests from memory. Results are written as
+JSON, `compare` lists the cases that got slower between two result files.
+"""
+import itertools
+import json
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from docopt import docopt
+
+from api import app, api_init, achievements, events, game_summary
+from faf import db
+
+SEED_BATCH_SIZE = 10000
+FEATURED_MODS = ['faf', 'ladder1v1', 'coop', 'nomads']
+FIRST_GAME_TIME = datetime(2014, 1, 1)
+
+# Value of each /games filter, given the seeded volumes
+GAME_FILTERS = [
+    ('players', lambda volumes: 'benchmark{},benchmark{}'.format(1, volumes['players'] // 2)),
+    ('map_name', lambda volumes: 'map{}'.format(volumes['maps'] // 2)),
+    ('max_rating', lambda volumes: 1000),
+    ('min_rating', lambda volumes: 1500),
+    ('victory_condition', lambda volumes: 'demoralization'),
+    ('mod', lambda volumes: 'ladder1v1'),
+    ('max_player_count', lambda volumes: 2),
+    ('min_player_count', lambda volumes: 6),
+    ('max_datetime', lambda volumes: '2015-01-01T00:00'),
+    ('min_datetime', lambda volumes: '2016-01-01T00:00'),
+]
+
+# Filters that only modify the others
+GAME_FILTER_VARIANTS = [
+    ('map_name,map_exclude', {'map_name': lambda volumes: 'map1', 'map_exclude': lambda volumes: 'true'}),
+    ('min_rating,rating_type', {'min_rating': lambda volumes: 1500, 'rating_type': lambda volumes: 'ladder'}),
+]
+
+RANKED1V1_PAGE_SIZE = 100
+BATCH_SIZE = 10
+
+# Settings forced by `run`, since they would let the measured requests skip the database
+RUN_CONFIG = {
+    'RESPONSE_CACHE_ENABLED': False,
+    'EVENT_WRITE_BEHIND': False,
+}
+# Settings changing the measured queries, recorded with the results
+RECORDED_CONFIG = ['RESPONSE_CACHE_ENABLED', 'EVENT_WRITE_BEHIND', 'GAME_SUMMARY_ENABLED', 'CLAN_SUMMARY_ENABLED',
+                   'LADDER_INDEX_TTL', 'DATABASE_POOL_MAX_SIZE']
+
+
+def insert_rows(cursor, table, columns, rows):
+    """
+    Inserts the rows of an iterable in batches of ``SEED_BATCH_SIZE``.
+    """
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(table, ', '.join(columns), ', '.join(['%s'] * len(columns)))
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == SEED_BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+
+
+def seed(volumes, rng, summary=False):
+    """
+    Replaces the contents of the tables read by the benchmarked endpoints with generated rows.
+
+    :param volumes: a dict with the number of ``players``, ``ladder_ratings``, ``game_players``, ``players_per_game``,
+        ``maps`` and ``mods``
+    :param rng: the :class:`random.Random` to generate the rows with
+    :param summary: ``True`` to also fill the game_summary table
+    """
+    players = volumes['players']
+    games = volumes['game_players'] // volumes['players_per_game']
+
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute('SET FOREIGN_KEY_CHECKS = 0')
+        for table in ['login', 'global_rating', 'ladder1v1_rating', 'game_featuredMods', 'table_map', 'table_mod',
+                      'game_stats', 'game_player_stats', 'player_achievements', 'player_events']:
+            cursor.execute('TRUNCATE TABLE {}'.format(table))
+
+        print('seeding {} players'.format(players))
+        insert_rows(cursor, 'login', ['id', 'login', 'password', 'salt', 'email'],
+                    ((i, 'benchmark{}'.format(i), '', '', 'benchmark{}@example.com'.format(i))
+                     for i in range(1, players + 1)))
+        insert_rows(cursor, 'global_rating', ['id', 'mean', 'deviation', 'numGames', 'is_active'],
+                    ((i, rng.gauss(1500, 300), rng.uniform(50, 500), rng.randint(0, 2000), 1)
+                     for i in range(1, players + 1)))
+
+        ladder_players = rng.sample(range(1, players + 1), min(volumes['ladder_ratings'], players))
+        print('seeding {} ladder ratings'.format(len(ladder_players)))
+        insert_rows(cursor, 'ladder1v1_rating', ['id', 'mean', 'deviation', 'numGames', 'winGames', 'is_active'],
+                    ((i, rng.gauss(1500, 300), rng.uniform(50, 500), rng.randint(0, 2000), rng.randint(0, 1000),
+                      rng.randint(0, 1))
+                     for i in ladder_players))
+
+        insert_rows(cursor, 'game_featuredMods', ['id', 'name', 'description'],
+                    ((i, name, name) for i, name in enumerate(FEATURED_MODS, 1)))
+
+        print('seeding {} maps and {} mods'.format(volumes['maps'], volumes['mods']))
+        insert_rows(cursor, 'table_map', ['id', 'mapuid', 'max_players', 'name', 'filename', 'hidden'],
+                    ((i, i, rng.choice([2, 4, 6, 8, 12]), 'map{}'.format(i), 'maps/map{}.v0001.zip'.format(i), 0)
+                     for i in range(1, volumes['maps'] + 1)))
+        insert_rows(cursor, 'table_mod', ['uid', 'name', 'version', 'author', 'ui', 'date', 'description',
+                                          'filename', 'icon', 'likes', 'likers'],
+                    (('mod-{}'.format(i), 'mod{}'.format(i), 1, 'author{}'.format(i % 1000), rng.randint(0, 1),
+                      FIRST_GAME_TIME + timedelta(hours=i), '', 'mod{}.zip'.format(i), '', rng.randint(0, 1000),
+                      b'\x00')
+                     for i in range(1, volumes['mods'] + 1)))
+
+        print('seeding {} games with {} players'.format(games, volumes['game_players']))
+        game_sizes = [rng.randint(1, 2 * volumes['players_per_game'] - 1) for _ in range(games)]
+        insert_rows(cursor, 'game_stats', ['id', 'startTime', 'gameType', 'gameMod', 'host', 'mapId', 'gameName',
+                                           'validity'],
+                    ((i, FIRST_GAME_TIME + timedelta(minutes=5 * i), rng.randint(0, 3),
+                      rng.randint(1, len(FEATURED_MODS)), rng.randint(1, players), rng.randint(1, volumes['maps']),
+                      'game{}'.format(i), 0)
+                     for i in range(1, games + 1)))
+
+        def game_players():
+            row_id = 0
+            for game_id, size in enumerate(game_sizes, 1):
+                start = FIRST_GAME_TIME + timedelta(minutes=5 * game_id)
+                for player_id in rng.sample(range(1, players + 1), size):
+                    row_id += 1
+                    mean, deviation = rng.gauss(1500, 300), rng.uniform(50, 500)
+                    yield (row_id, game_id, player_id, 0, rng.randint(1, 4), rng.randint(1, 8), 1, 0, mean,
+                           deviation, mean + rng.gauss(0, 20), deviation * 0.95, rng.randint(-10, 10), start)
+
+        insert_rows(cursor, 'game_player_stats', ['id', 'gameId', 'playerId', 'AI', 'faction', 'color', 'team',
+                                                  'place', 'mean', 'deviation', 'after_mean', 'after_deviation',
+                                                  'score', 'scoreTime'],
+                    game_players())
+        cursor.execute('SET FOREIGN_KEY_CHECKS = 1')
+
+    if summary:
+        print('filling game_summary')
+        game_summary.create_table()
+        game_summary.backfill()
+
+
+def get_volumes():
+    """
+    Returns the number of rows of the seeded tables.
+    """
+    volumes = {}
+    with db.connection:
+        cursor = db.connection.cursor()
+        for table in ['login', 'ladder1v1_rating', 'game_stats', 'game_player_stats', 'table_map', 'table_mod']:
+            cursor.execute('SELECT COUNT(*) FROM {}'.format(table))
+            volumes[table] = cursor.fetchone()[0]
+    return volumes
+
+
+def get_cases(volumes, filter_depth, rng):
+    """
+    Returns the benchmark cases as ``(name, function)`` tuples, each function sending one request and returning its
+    status code.
+    """
+    client = app.test_client()
+    generator_volumes = {'players': volumes['login'], 'maps': volumes['table_map']}
+
+    def get(path):
+        return lambda: client.get(path).status_code
+
+    cases = [('games', get('/games'))]
+    filter_sets = []
+    for depth in range(1, filter_depth + 1):
+        for combination in itertools.combinations(GAME_FILTERS, depth):
+            filter_sets.append((','.join(name for name, _ in combination), dict(combination)))
+    filter_sets.extend(GAME_FILTER_VARIANTS)
+    for name, filters in filter_sets:
+        query = '&'.join('filter[{}]={}'.format(parameter, value(generator_volumes))
+                         for parameter, value in sorted(filters.items()))
+        cases.append(('games[{}]'.format(name), get('/games?' + query)))
+
+    last_page = max(1, -(-volumes['ladder1v1_rating'] // RANKED1V1_PAGE_SIZE))
+    for page in sorted({1, max(1, last_page // 2), last_page}):
+        cases.append(('ranked1v1[page={}]'.format(page),
+                      get('/ranked1v1?page[size]={}&page[number]={}'.format(RANKED1V1_PAGE_SIZE, page))))
+
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute("SELECT id FROM achievement_definitions WHERE type = 'INCREMENTAL'")
+        achievement_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute('SELECT id FROM event_definitions')
+        event_ids = [row[0] for row in cursor.fetchall()]
+
+    def update_achievements():
+        updates = [{'achievement_id': rng.choice(achievement_ids), 'update_type': 'INCREMENT', 'steps': 1}
+                   for _ in range(BATCH_SIZE)]
+        with app.test_request_context():
+            achievements.update_multiple(rng.randint(1, volumes['login']), updates)
+        return 200
+
+    def record_events():
+        updates = [{'event_id': rng.choice(event_ids), 'count': 1} for _ in range(BATCH_SIZE)]
+        with app.test_request_context():
+            events.record_multiple(rng.randint(1, volumes['login']), updates)
+        return 200
+
+    if achievement_ids:
+        cases.append(('achievements.update_multiple', update_achievements))
+    if event_ids:
+        cases.append(('events.record_multiple', record_events))
+    return cases
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def measure(function, requests, warmup, concurrency):
+    """
+    Calls `function` `warmup` times, then `requests` times on `concurrency` threads.
+
+    :return: a dict with the latency percentiles in milliseconds, the throughput and the number of errors
+    """
+    def call(_):
+        start = time.perf_counter()
+        try:
+            status = function()
+        except Exception:
+            status = 500
+        return (time.perf_counter() - start) * 1000, status
+
+    for _ in range(warmup):
+        call(None)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'requests': requests,
+        'errors': sum(1 for _, status in results if status >= 400),
+        'throughput': round(requests / elapsed, 2),
+        'latency_ms': {
+            'min': round(latencies[0], 3),
+            'mean': round(sum(latencies) / len(latencies), 3),
+            'p50': round(percentile(latencies, 0.5), 3),
+            'p90': round(percentile(latencies, 0.9), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+            'max': round(latencies[-1], 3),
+        },
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(requests, warmup, concurrency, filter_depth, only=None):
+    volumes = get_volumes()
+    results = {}
+    for name, function in get_cases(volumes, filter_depth, random.Random(1)):
+        if only and not name.startswith(only):
+            continue
+        print('measuring {}'.format(name), file=sys.stderr)
+        results[name] = measure(function, requests, warmup, concurrency)
+
+    return {
+        'commit': get_commit(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'volumes': volumes,
+        'settings': {'requests': requests, 'warmup': warmup, 'concurrency': concurrency,
+                     'filter_depth': filter_depth,
+                     'config': {key: app.config.get(key) for key in RECORDED_CONFIG}},
+        'results': results,
+    }
+
+
+def compare(baseline, result, threshold):
+    """
+    Prints the cases of `result` whose median latency grew by more than `threshold` percent compared to `baseline`.
+
+    :return: the number of slower cases
+    """
+    if baseline['settings'].get('config') != result['settings'].get('config'):
+        print('Warning: the results were measured with different settings', file=sys.stderr)
+
+    slower = 0
+    for name, measurement in sorted(result['results'].items()):
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        old, new = before['latency_ms']['p50'], measurement['latency_ms']['p50']
+        change = (new - old) / old * 100 if old else 0
+        if change > threshold:
+            slower += 1
+            print('{}: {:.3f} ms -> {:.3f} ms ({:+.1f}%)'.format(name, old, new, change))
+    return slower
+
+
+if __name__ == '__main__':
+    args = docopt(__doc__)
+    app.config.from_object('config')
+
+    if args.get('compare'):
+        with open(args['<baseline>']) as baseline, open(args['<result>']) as result:
+            sys.exit(1 if compare(json.load(baseline), json.load(result), float(args['--threshold'])) else 0)
+
+    if args.get('run'):
+        app.config.update(RUN_CONFIG)
+
+    api_init()
+    if args.get('seed'):
+        if app.config.get('ENVIRONMENT') == 'production':
+            sys.exit('Refusing to seed a production database')
+        seed({'players': int(args['--players']),
+              'ladder_ratings': int(args['--ladder-ratings']),
+              'game_players': int(args['--game-players']),
+              'players_per_game': int(args['--players-per-game']),
+              'maps': int(args['--maps']),
+              'mods': int(args['--mods'])},
+             random.Random(int(args['--seed'])), summary=args.get('--summary'))
+    elif args.get('run'):
+        output = run(int(args['--requests']), int(args['--warmup']), int(args['--concurrency']),
+                     int(args['--filter-depth']), args.get('--only'))
+        if args.get('--output'):
+            with open(args['--output'], 'w') as file:
+                json.dump(output, file, indent=2, sort_keys=True)
+        else:
+            print(json.dumps(output, indent=2, sort_keys=True))
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Maintains the clan_summary table holding the member count of every clan
+
+Usage:
+  clan_summary.py create
+  clan_summary.py backfill
+  clan_summary.py check [--repair] [--interval=<seconds>]
+
+Options:
+  -h                    Show this screen
+  --repair              Count the members of clans with a wrong member count again
+  --interval=<seconds>  Keep running and check every this many seconds
+"""
+import logging
+import sys
+import time
+
+from docopt import docopt
+
+from api import app, api_init, clan_summary
+
+if __name__ == '__main__':
+    args = docopt(__doc__)
+    logging.basicConfig(level=logging.INFO)
+    app.config.from_object('config')
+    api_init()
+
+    if args.get('create'):
+        clan_summary.create_table()
+    elif args.get('backfill'):
+        clan_summary.create_table()
+        clan_summary.summarize()
+    elif args.get('check'):
+        interval = args.get('--interval')
+        mismatches = clan_summary.check(args.get('--repair'))
+        while interval:
+            time.sleep(float(interval))
+            mismatches = clan_summary.check(args.get('--repair'))
+
+        sys.exit(1 if mismatches and not args.get('--repair') else 0)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Maintains the game_summary table used to filter /games by player count and rating
+
+Usage:
+  game_summary.py create
+  game_summary.py backfill [--batch-size=<size>]
+  game_summary.py update [--interval=<seconds>]
+
+Options:
+  -h                    Show this screen
+  --batch-size=<size>   Number of game ids summarized per transaction [default: 10000]
+  --interval=<seconds>  Keep running and update every this many seconds
+"""
+import logging
+import time
+
+from docopt import docopt
+
+from api import app, api_init, game_summary
+
+if __name__ == '__main__':
+    args = docopt(__doc__)
+    logging.basicConfig(level=logging.INFO)
+    app.config.from_object('config')
+    api_init()
+
+    if args.get('create'):
+        game_summary.create_table()
+    elif args.get('backfill'):
+        game_summary.create_table()
+        game_summary.backfill(int(args.get('--batch-size')))
+    elif args.get('update'):
+        interval = args.get('--interval')
+        game_summary.update()
+        while interval:
+            time.sleep(float(interval))
+            game_summary.update()
@@ -3,32 +3,89 @@
 
 Usage:
   run.py
-  run.py [-d | -aio] -p 80
-  run.py [-d | -aio] --port=80
+  run.py --native
+  run.py [-d | -aio | --native] -p 80
+  run.py [-d | -aio | --native] --port=80
+  run.py [-aio | --native] [--port=80] --workers=<n>
 
 Options:
   -h             Show this screen
   -aio           Use aiohttp
+  --native       Use aiohttp and serve the hot read endpoints with asyncio-native handlers, see api/aio.py
   -d             Enable debug mode
   -p --port=<port>  Listen on given port [default: 8080].
+  --workers=<n>  Pre-fork n worker processes sharing the port, see api/prefork.py. Crashed workers are restarted,
+                 SIGHUP reloads config.py and replaces the workers one at a time
 """
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
 from docopt import docopt
 
 from api import app, api_init
 
+
+def create_app(native, executor):
+    if native:
+        from api.aio import create_app
+        return create_app(app, executor)
+
+    from api.aio import create_wsgi_app
+    return create_wsgi_app(app, executor)
+
+
+def run_worker(native):
+    def worker(sock, ready):
+        import config
+        from api.aio import serve
+
+        # Picks up changes of config.py on reloads
+        app.config.from_object(importlib.reload(config))
+        api_init()
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            aio_app = create_app(native, executor)
+
+            async def on_startup(aio_app):
+                ready()
+
+            aio_app.on_startup.append(on_startup)
+            serve(aio_app, sock=sock)
+
+    return worker
+
+
 if __name__ == '__main__':
     args = docopt(__doc__)
     app.config.from_object('config')
-    api_init()
     port = int(args.get("--port"))
     print('listen on port {0}'.format(port))
-    if args.get('-d'):
+    if args.get('--workers'):
+        workers = int(args.get('--workers'))
+        print('with {0} workers'.format(workers))
+        from api.prefork import DEFAULT_GRACEFUL_TIMEOUT, DEFAULT_READY_TIMEOUT, Supervisor, create_socket
+
+        # api_init() starts threads and opens connections, which must not be shared with forked processes, so
+        # every worker runs it itself
+        graceful_timeout = app.config.get('WORKER_GRACEFUL_TIMEOUT', DEFAULT_GRACEFUL_TIMEOUT)
+        ready_timeout = app.config.get('WORKER_READY_TIMEOUT', DEFAULT_READY_TIMEOUT)
+        Supervisor(run_worker(args.get('--native')), create_socket('0.0.0.0', port), workers,
+                   graceful_timeout=graceful_timeout, ready_timeout=ready_timeout).run()
+    elif args.get('-d'):
+        api_init()
         app.debug = True
         app.run(host='0.0.0.0', port=port)
+    elif args.get('--native'):
+        api_init()
+        print('with native asyncio handlers')
+        from api.aio import serve
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            serve(create_app(True, executor), port=port)
     else:
+        api_init()
         print('with aiohttp')
-        from aiohttp_wsgi import serve
-        from concurrent.futures import ThreadPoolExecutor
+        from api.aio import serve
 
         with ThreadPoolExecutor(max_workers=10) as executor:
-            serve(app, executor=executor)
+            serve(create_app(False, executor), port=port)
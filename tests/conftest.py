@@ -1,4 +1,6 @@
 import importlib
+import zipfile
+from io import BytesIO
 
 import pytest
 import api
@@ -25,3 +27,17 @@ def app():
 @pytest.fixture
 def test_client(app):
     return app.test_client()
+
+
+@pytest.fixture
+def make_zip():
+    """
+    Returns a function creating a ZIP archive holding `contents`.
+    """
+    def make_zip(contents):
+        data = BytesIO()
+        with zipfile.ZipFile(data, 'w') as archive:
+            archive.writestr('contents.txt', contents)
+        return data.getvalue()
+
+    return make_zip
@@ -7,7 +7,7 @@ from faf.api.player_achievement_schema import PlayerAchievementSchema
 
 import api
 import json
-from api import User
+from api import User, response_cache
 import faf.db as db
 import unittest
 
@@ -56,6 +56,18 @@ class AchievementsTestCase(unittest.TestCase):
         self.assertEqual("http://content.faforever.com/achievements/c6e6039f-c543-424e-ab5f-b34df1336e81.png", result[0]['revealed_icon_url'])
         self.assertEqual("http://content.faforever.com/achievements/c6e6039f-c543-424e-ab5f-b34df1336e81.png", result[0]['unlocked_icon_url'])
 
+    def test_invalidate_definitions(self):
+        storage_client = response_cache.InMemoryClient()
+        response_cache.storage = response_cache.SharedStorage(storage_client)
+        try:
+            self.app.get('/achievements')
+            self.assertEqual(1, len(storage_client.scan_iter(response_cache.KEY_PREFIX)))
+
+            api.achievements.invalidate_definitions()
+            self.assertEqual([], storage_client.scan_iter(response_cache.KEY_PREFIX))
+        finally:
+            response_cache.storage = None
+
     def test_achievements_get(self):
         response = self.app.get('/achievements/c6e6039f-c543-424e-ab5f-b34df1336e81')
         self.assertEqual(200, response.status_code)
@@ -70,6 +82,10 @@ class AchievementsTestCase(unittest.TestCase):
         self.assertEqual("http://content.faforever.com/achievements/c6e6039f-c543-424e-ab5f-b34df1336e81.png", result['revealed_icon_url'])
         self.assertEqual("http://content.faforever.com/achievements/c6e6039f-c543-424e-ab5f-b34df1336e81.png", result['unlocked_icon_url'])
 
+    def test_achievements_get_not_found(self):
+        response = self.app.get('/achievements/does-not-exist')
+        self.assertEqual(404, response.status_code)
+
     def test_achievements_increment_inserts_if_not_existing(self):
         response = self.app.post('/achievements/c6e6039f-c543-424e-ab5f-b34df1336e81/increment', data=dict(steps=5))
         self.assertEqual(200, response.status_code)
@@ -266,6 +282,50 @@ class AchievementsTestCase(unittest.TestCase):
         self.assertEqual('REVEALED', data['updated_achievements'][3]['current_state'])
         self.assertTrue(data['updated_achievements'][1]['newly_unlocked'])
 
+    def test_achievements_update_multiple_same_achievement(self):
+        request_data = dict(
+            updates=[
+                dict(achievement_id='c6e6039f-c543-424e-ab5f-b34df1336e81', update_type='INCREMENT', steps=4),
+                dict(achievement_id='c6e6039f-c543-424e-ab5f-b34df1336e81', update_type='INCREMENT', steps=4),
+                dict(achievement_id='c6e6039f-c543-424e-ab5f-b34df1336e81', update_type='INCREMENT', steps=4),
+                dict(achievement_id='c6e6039f-c543-424e-ab5f-b34df1336e81', update_type='INCREMENT', steps=1)
+            ]
+        )
+
+        response = self.app.post('/achievements/updateMultiple', headers=[('Content-Type', 'application/json')],
+                                 data=json.dumps(request_data))
+        self.assertEqual(200, response.status_code)
+        data = json.loads(response.get_data(as_text=True))
+
+        self.assertEqual([4, 8, 10, 10], [item['current_steps'] for item in data['updated_achievements']])
+        self.assertEqual(['REVEALED', 'REVEALED', 'UNLOCKED', 'UNLOCKED'],
+                         [item['current_state'] for item in data['updated_achievements']])
+        self.assertEqual([False, False, True, False],
+                         [item['newly_unlocked'] for item in data['updated_achievements']])
+
+        with db.connection:
+            cursor = db.connection.cursor()
+            cursor.execute('SELECT current_steps, state FROM player_achievements WHERE achievement_id = %s',
+                           'c6e6039f-c543-424e-ab5f-b34df1336e81')
+            self.assertEqual((10, 'UNLOCKED'), cursor.fetchone())
+
+    def test_achievements_update_multiple_is_atomic(self):
+        request_data = dict(
+            updates=[
+                dict(achievement_id='c6e6039f-c543-424e-ab5f-b34df1336e81', update_type='INCREMENT', steps=4),
+                dict(achievement_id='c6e6039f-c543-424e-ab5f-b34df1336e81', update_type='UNLOCK')
+            ]
+        )
+
+        response = self.app.post('/achievements/updateMultiple', headers=[('Content-Type', 'application/json')],
+                                 data=json.dumps(request_data))
+        self.assertEqual(400, response.status_code)
+
+        with db.connection:
+            cursor = db.connection.cursor()
+            cursor.execute('SELECT COUNT(*) FROM player_achievements')
+            self.assertEqual(0, cursor.fetchone()[0])
+
     def test_achievements_list_player(self):
         response = self.app.post('/achievements/5b7ec244-58c0-40ca-9d68-746b784f0cad/unlock', data=dict(player_id=1))
         self.assertEqual(200, response.status_code)
@@ -0,0 +1,60 @@
+import datetime
+import importlib
+import json
+from unittest.mock import Mock
+
+import pytest
+
+import api
+from api import User, slow_queries
+
+
+@pytest.fixture
+def scopes():
+    return ['read_slow_queries']
+
+
+@pytest.fixture
+def admin_client(app, scopes):
+    importlib.reload(api.oauth_handlers)
+    importlib.reload(api.admin)
+    token = Mock(user=User(id=1), expires=datetime.datetime.now() + datetime.timedelta(hours=1), scopes=scopes)
+    api.oauth.tokengetter(lambda access_token=None, refresh_token=None: token)
+    return app.test_client()
+
+
+@pytest.fixture
+def recorder(app):
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = 0
+    yield slow_queries.init_slow_queries(app)
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = None
+    slow_queries.init_slow_queries(app)
+
+
+def test_slow_queries(admin_client, recorder):
+    recorder.record('SELECT id FROM oauth_tokens WHERE access_token = %s', ('secret',), 1500, 'oauth_token', {})
+
+    response = admin_client.get('/admin/slow_queries', headers={'Authorization': 'Bearer token'})
+
+    assert response.status_code == 200
+    assert 'secret' not in response.get_data(as_text=True)
+    [sample] = json.loads(response.get_data(as_text=True))['data']
+    assert sample['type'] == 'slow_query'
+    assert sample['attributes']['sql'] == 'SELECT id FROM oauth_tokens WHERE access_token = %s'
+    assert sample['attributes']['args'] == ['str']
+    assert sample['attributes']['duration'] == 1500
+    assert sample['attributes']['endpoint'] == 'oauth_token'
+
+
+def test_slow_queries_disabled(admin_client):
+    response = admin_client.get('/admin/slow_queries', headers={'Authorization': 'Bearer token'})
+
+    assert response.status_code == 404
+    assert json.loads(response.get_data(as_text=True))['message'] == 'The slow query log is disabled'
+
+
+@pytest.mark.parametrize('scopes', [['read_achievements']])
+def test_slow_queries_scope(admin_client, recorder):
+    response = admin_client.get('/admin/slow_queries', headers={'Authorization': 'Bearer token'})
+
+    assert response.status_code == 401
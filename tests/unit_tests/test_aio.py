@@ -0,0 +1,153 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiomysql
+from aiohttp.test_utils import TestClient, TestServer
+
+from api import aio, response_cache
+
+LADDER_ROWS = [
+    {'id': 1, 'login': 'a', 'mean': 1000, 'deviation': 300, 'num_games': 10, 'won_games': 5, 'is_active': 0,
+     'rating': 100},
+    {'id': 2, 'login': 'b', 'mean': 2000, 'deviation': 200, 'num_games': 20, 'won_games': 9, 'is_active': 1,
+     'rating': 1400},
+    {'id': 3, 'login': 'c', 'mean': 1720, 'deviation': 100, 'num_games': 13, 'won_games': 7, 'is_active': 1,
+     'rating': 1420},
+]
+
+
+class FakeDatabase(object):
+    def __init__(self, *results):
+        self.results = list(results)
+        self.queries = []
+
+    async def fetch(self, sql, args=None, many=True, cursor_class=aiomysql.DictCursor):
+        self.queries.append((sql, args, cursor_class))
+        return self.results.pop(0)
+
+
+def get(app, database, *requests):
+    """
+    Sends GET requests, each a path or a tuple of a path and headers, to the native app and returns the status,
+    headers and body of each response.
+    """
+    async def run():
+        client = TestClient(TestServer(aio.create_app(app, ThreadPoolExecutor(max_workers=1), database)))
+        await client.start_server()
+        try:
+            responses = []
+            for request in requests:
+                path, headers = request if isinstance(request, tuple) else (request, None)
+                response = await client.get(path, headers=headers)
+                responses.append((response.status, response.headers, await response.read()))
+            return responses
+        finally:
+            await client.close()
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+def test_ranked1v1(app):
+    database = FakeDatabase(LADDER_ROWS)
+
+    [(status, headers, body)] = get(app, database, '/ranked1v1?page[size]=2')
+
+    assert status == 200
+    assert headers['Content-Type'] == 'application/vnd.api+json'
+    assert headers['Access-Control-Allow-Origin'] == '*'
+    data = json.loads(body.decode('utf-8'))['data']
+    assert [player['id'] for player in data] == ['3', '2']
+    assert [player['attributes']['ranking'] for player in data] == [1, 2]
+
+
+def test_invalid_usage(app):
+    [(status, _, body)] = get(app, FakeDatabase(), '/maps?page[size]=abc')
+
+    assert status == 400
+    assert json.loads(body.decode('utf-8'))['message'] == 'Invalid page size'
+
+
+def test_games_filtered(app):
+    database = FakeDatabase([(235,)], [{'id': 235, 'game_name': 'testGame2', 'player_id': 146316},
+                                       {'id': 235, 'game_name': 'testGame2', 'player_id': 146317}])
+
+    [(status, _, body)] = get(app, database, '/games?filter[players]=testUser2')
+
+    assert status == 200
+    ids_query, games_query = database.queries
+    assert ids_query[2] is aiomysql.Cursor
+    assert games_query[0].count('%s') == 1
+    assert games_query[1] == [235]
+
+    data = json.loads(body.decode('utf-8'))['data']
+    assert len(data) == 1
+    assert data[0]['attributes']['game_name'] == 'testGame2'
+    assert len(data[0]['attributes']['players']) == 2
+
+
+def test_response_cache(app):
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    response_cache.init_response_cache(app)
+    database = FakeDatabase([{'id': 1, 'display_name': 'map'}])
+
+    first, second = get(app, database, '/maps', '/maps')
+    etag = second[1]['ETag']
+    [not_modified] = get(app, database, ('/maps', {'If-None-Match': etag}))
+
+    assert first[0] == second[0] == 200
+    assert first[2] == second[2]
+    assert first[1]['ETag'] == etag
+    assert not_modified[0] == 304
+    assert len(database.queries) == 1
+
+
+def test_flask_routes(app):
+    [(status, _, _)] = get(app, FakeDatabase(), '/does/not/exist')
+
+    assert status == 404
+
+
+def test_upload_streamed(app, tmpdir, make_zip):
+    upload_dir = tmpdir.mkdir("map_upload")
+    app.config['MAP_UPLOAD_PATH'] = upload_dir.strpath
+    contents = make_zip('x' * 256 * 1024)
+    body = (b'--boundary\r\nContent-Disposition: form-data; name="file"; filename="map_name.zip"\r\n\r\n' +
+            contents + b'\r\n--boundary--\r\n')
+    received = []
+
+    async def chunks():
+        yield body[:len(body) // 2]
+        deadline = time.monotonic() + 5
+        while not upload_dir.listdir() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        received.extend(upload_dir.listdir())
+        yield body[len(body) // 2:]
+
+    async def run():
+        client = TestClient(TestServer(aio.create_wsgi_app(app, ThreadPoolExecutor(max_workers=1))))
+        await client.start_server()
+        try:
+            response = await client.post('/maps/upload', data=chunks(),
+                                         headers={'Content-Type': 'multipart/form-data; boundary=boundary'})
+            return response.status, await response.text()
+        finally:
+            await client.close()
+
+    loop = asyncio.new_event_loop()
+    try:
+        status, text = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert status == 200
+    assert text == 'ok'
+    # The upload was being stored before the whole body had been sent
+    assert [path.basename.endswith('.part') for path in received] == [True]
+    with open(upload_dir.join('map_name.zip').strpath, 'rb') as file:
+        assert file.read() == contents
@@ -0,0 +1,84 @@
+import time
+
+from api.cache import TTLCache, DefinitionCache
+
+
+def test_cache_get_set():
+    cache = TTLCache()
+    cache.set('a', 1)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('b', 2) == 2
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_cache_expires_entries():
+    cache = TTLCache(ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=0.01)
+    time.sleep(0.02)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+
+
+def test_cache_delete_if():
+    cache = TTLCache()
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.delete_if(lambda key, value: value == 2)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+
+
+def test_cache_stats():
+    cache = TTLCache()
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('b')
+
+    assert cache.stats() == dict(size=1, hits=1, misses=1, hit_ratio=0.5)
+
+
+def test_definition_cache():
+    loads = []
+
+    def load(language, region):
+        loads.append((language, region))
+        return [dict(id='x', name=language)]
+
+    definitions = DefinitionCache(load)
+
+    assert definitions.get('x')['name'] == 'en'
+    assert definitions.get_all('de', 'DE') == [dict(id='x', name='de')]
+    assert definitions.get('y') is None
+    assert loads == [('en', 'US'), ('de', 'DE')]
+
+    definitions.invalidate()
+    definitions.get('x')
+
+    assert len(loads) == 3
+
+
+def test_definition_cache_peek_and_put():
+    definitions = DefinitionCache(lambda language, region: [])
+
+    assert definitions.peek('de', 'DE') is None
+
+    definitions.put('de', 'DE', [dict(id='x', name='de')])
+
+    assert definitions.peek('de', 'DE') == [dict(id='x', name='de')]
+    assert definitions.get('x', 'de', 'DE')['name'] == 'de'
@@ -93,6 +93,79 @@ def test_clan_list(test_client, clans, clan_members, clan_login):
     assert result['data'][0]['attributes']['clan_members'] == 3
 
 
+def test_clan_list_streamed(app, test_client, clans, clan_members, clan_login):
+    app.config['STREAM_MIN_PAGE_SIZE'] = None
+    expected = json.loads(test_client.get('/clans').data.decode('utf-8'))
+
+    app.config['STREAM_MIN_PAGE_SIZE'] = 1
+    response = test_client.get('/clans')
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.content_type == 'application/vnd.api+json'
+    assert json.loads(response.data.decode('utf-8')) == expected
+
+
+def test_clan_list_include_members(test_client, clans, clan_members, clan_login):
+    response = test_client.get('/clans?include=members')
+
+    assert response.status_code == 200
+
+    result = json.loads(response.data.decode('utf-8'))
+    assert len(result['data']) == 9
+    assert len(result['included']) == 6
+
+    relationships = result['data'][0]['relationships']['members']['data']
+    assert relationships == [{'type': 'clan_member', 'id': '21-447'}, {'type': 'clan_member', 'id': '21-449'},
+                             {'type': 'clan_member', 'id': '21-474'}]
+    assert result['data'][3]['relationships']['members']['data'] == []
+    assert result['included'][2]['attributes']['player_name'] == 'Pathogen'
+
+
+def test_clan_list_invalid_include(test_client, clans):
+    response = test_client.get('/clans?include=leader')
+
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def summarized_clans(app, clans, clan_members):
+    from api import clan_summary
+
+    clan_summary.create_table()
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute("TRUNCATE TABLE clan_summary")
+    clan_summary.summarize()
+
+    app.config['CLAN_SUMMARY_ENABLED'] = True
+
+
+def test_clan_list_summary(test_client, clan_login, summarized_clans):
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute("INSERT INTO clan_members (`clan_id`, `player_id`) VALUES (21, 448)")
+        cursor.execute("DELETE FROM clan_members WHERE clan_id = 25")
+
+    response = test_client.get('/clans')
+
+    assert response.status_code == 200
+
+    result = json.loads(response.data.decode('utf-8'))
+    assert [item['attributes']['clan_members'] for item in result['data'][:4]] == [4, 2, 0, 0]
+
+
+def test_clan_summary_check(summarized_clans):
+    from api import clan_summary
+
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute("UPDATE clan_summary SET member_count = 7 WHERE clan_id = 24")
+
+    assert clan_summary.check(repair=True) == {24: (7, 2)}
+    assert clan_summary.check() == {}
+
+
 def test_clan_founder_names(test_client, clans, clan_login):
     response = test_client.get('/clans')
     result = json.loads(response.data.decode('utf-8'))
@@ -172,3 +245,14 @@ def test_clan_details(test_client, clans, clan_members, clan_login):
     assert result['members'][0]['player_name'] == 'Dragonfire'
     assert result['members'][1]['player_name'] == 'Blackheart'
     assert result['members'][2]['player_name'] == 'Pathogen'
+    assert result['clan_details'][0]['clan_members'] == 3
+
+
+def test_clan_details_without_members(test_client, clans, clan_members, clan_login):
+    response = test_client.get('/clan/27')
+
+    assert response.status_code == 200
+    result = json.loads(response.data.decode('utf-8'))
+    assert [item['clan_name'] for item in result['clan_details']] == ['Mockingjay Clan']
+    assert result['clan_details'][0]['clan_members'] == 0
+    assert result['members'] == []
@@ -0,0 +1,146 @@
+import threading
+
+import pytest
+from flask import Flask, has_app_context
+
+from api import InvalidUsage, event_buffer
+from api.event_buffer import EventBuffer
+
+
+class FakeStore(object):
+    def __init__(self):
+        self.counts = {}
+        self.batches = []
+        self.fail = False
+
+    def write(self, entries):
+        if self.fail:
+            raise ConnectionError()
+        self.batches.append(dict(entries))
+        for key, count in entries.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def read(self, player_id):
+        return lambda event_ids: {event_id: self.counts[(player_id, event_id)]
+                                  for event_id in event_ids if (player_id, event_id) in self.counts}
+
+
+def test_buffer_aggregates_increments():
+    store = FakeStore()
+    buffer = EventBuffer(store.write)
+
+    buffer.add(1, {'a': 2, 'b': 1})
+    buffer.add(1, {'a': 3})
+    buffer.add(2, {'a': 1})
+
+    assert buffer.flush() == 3
+    assert store.batches == [{(1, 'a'): 5, (1, 'b'): 1, (2, 'a'): 1}]
+    assert buffer.flush() == 0
+
+
+def test_buffer_counts_include_pending():
+    store = FakeStore()
+    buffer = EventBuffer(store.write)
+
+    buffer.add(1, {'a': 2})
+    buffer.flush()
+    buffer.add(1, {'a': 3, 'b': 4})
+
+    assert buffer.pending(1, 'a') == 3
+    assert buffer.counts(1, ['a', 'b', 'c'], store.read(1)) == {'a': 5, 'b': 4, 'c': 0}
+
+
+def test_buffer_counts_read_again_after_flush():
+    store = FakeStore()
+    buffer = EventBuffer(store.write)
+    buffer.add(1, {'a': 2})
+    reads = []
+
+    def read(event_ids):
+        reads.append(event_ids)
+        if len(reads) == 1:
+            # The pending increment is written after counts() took its snapshot
+            buffer.flush()
+        return store.read(1)(event_ids)
+
+    assert buffer.counts(1, ['a'], read) == {'a': 2}
+    assert len(reads) == 2
+
+
+def test_buffer_keeps_increments_if_write_fails():
+    store = FakeStore()
+    buffer = EventBuffer(store.write)
+    buffer.add(1, {'a': 2})
+
+    store.fail = True
+    assert buffer.flush() == 0
+    buffer.add(1, {'a': 1})
+
+    store.fail = False
+    assert buffer.flush() == 1
+    assert store.counts == {(1, 'a'): 3}
+
+
+def test_buffer_flushes_on_stop():
+    store = FakeStore()
+    buffer = EventBuffer(store.write, flush_interval=60)
+    buffer.start()
+
+    buffer.add(1, {'a': 2})
+    buffer.stop()
+
+    assert not buffer.running
+    assert store.counts == {(1, 'a'): 2}
+
+
+def test_buffer_flushes_when_full():
+    store = FakeStore()
+    flushed = threading.Event()
+
+    def write(entries):
+        store.write(entries)
+        flushed.set()
+
+    buffer = EventBuffer(write, flush_interval=60, flush_entries=2)
+    buffer.start()
+
+    buffer.add(1, {'a': 1, 'b': 1})
+
+    assert flushed.wait(5)
+    buffer.stop()
+    assert store.counts == {(1, 'a'): 1, (1, 'b'): 1}
+
+
+def test_buffer_back_pressure():
+    store = FakeStore()
+    buffer = EventBuffer(store.write, max_entries=2, timeout=0.01)
+
+    buffer.add(1, {'a': 1, 'b': 1})
+    buffer.add(1, {'a': 1})
+
+    with pytest.raises(InvalidUsage) as exception:
+        buffer.add(1, {'c': 1})
+
+    assert exception.value.status_code == 503
+
+
+def test_init_event_buffer_writes_in_app_context():
+    app = Flask('event_buffer_test')
+    app.config.update(EVENT_WRITE_BEHIND=True, EVENT_FLUSH_INTERVAL_MS=60000)
+    teardowns = []
+    app.teardown_appcontext(teardowns.append)
+    contexts = []
+
+    def write(entries):
+        contexts.append(has_app_context())
+        raise ConnectionError()
+
+    buffer = event_buffer.init_event_buffer(app, write)
+    buffer.add(1, {'a': 1})
+    buffer.flush()
+
+    app.config['EVENT_WRITE_BEHIND'] = False
+    event_buffer.init_event_buffer(app, write)
+
+    assert contexts[0]
+    assert isinstance(teardowns[0], ConnectionError)
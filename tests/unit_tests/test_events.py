@@ -5,7 +5,7 @@ import json
 from faf.api.event_schema import EventSchema
 
 import api
-from api import User
+from api import User, response_cache
 from api.oauth_token import OAuthToken
 import faf.db as db
 import unittest
@@ -53,6 +53,18 @@ class EventsTestCase(unittest.TestCase):
         self.assertEqual('NUMERIC', result[0]['type'])
         self.assertEqual(None, result[0]['image_url'])
 
+    def test_invalidate_definitions(self):
+        storage_client = response_cache.InMemoryClient()
+        response_cache.storage = response_cache.SharedStorage(storage_client)
+        try:
+            self.app.get('/events')
+            self.assertEqual(1, len(storage_client.scan_iter(response_cache.KEY_PREFIX)))
+
+            api.events.invalidate_definitions()
+            self.assertEqual([], storage_client.scan_iter(response_cache.KEY_PREFIX))
+        finally:
+            response_cache.storage = None
+
     def test_events_record(self):
         response = self.app.post('/events/15b6c19a-6084-4e82-ada9-6c30e282191f/record', data=dict(count=5))
         self.assertEqual(200, response.status_code)
@@ -79,6 +91,29 @@ class EventsTestCase(unittest.TestCase):
 
         self.assertEqual(15, data['updated_events'][1]['count'])
 
+    def test_record_multiple_same_event(self):
+        request_data = dict(
+            player_id=1,
+            updates=[
+                dict(event_id='15b6c19a-6084-4e82-ada9-6c30e282191f', count=10),
+                dict(event_id='1b900d26-90d2-43d0-a64e-ed90b74c3704', count=15),
+                dict(event_id='15b6c19a-6084-4e82-ada9-6c30e282191f', count=3)
+            ]
+        )
+
+        response = self.app.post('/events/recordMultiple', headers=[('Content-Type', 'application/json')],
+                                 data=json.dumps(request_data))
+        self.assertEqual(200, response.status_code)
+        data = json.loads(response.get_data(as_text=True))
+
+        self.assertEqual([10, 15, 13], [event['count'] for event in data['updated_events']])
+
+        with db.connection:
+            cursor = db.connection.cursor()
+            cursor.execute('SELECT count FROM player_events WHERE event_id = %s',
+                           '15b6c19a-6084-4e82-ada9-6c30e282191f')
+            self.assertEqual(13, cursor.fetchone()[0])
+
     def test_events_list_player(self):
         request_data = dict(
             player_id=1,
@@ -485,6 +485,80 @@ def test_games_query_max_player_count(test_client, maps, game_stats, game_player
     assert len(results_data) == 3
 
 
+@pytest.fixture
+def game_summary(app, game_stats, game_player_stats, global_rating, ladder):
+    from api import game_summary
+
+    game_summary.create_table()
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute("TRUNCATE TABLE game_summary")
+    game_summary.backfill(batch_size=2)
+
+    app.config['GAME_SUMMARY_ENABLED'] = True
+
+
+def test_game_summary_update(game_summary):
+    from api import game_summary as summary
+
+    with db.connection:
+        cursor = db.connection.cursor()
+        # Game 235 was launched after the last summarized game, 238 is a new game
+        cursor.execute("DELETE FROM game_summary WHERE game_id = 235")
+        cursor.execute("""INSERT INTO game_player_stats (id, gameId, playerId, AI, faction, color, team, place,
+        mean, deviation, after_mean, after_deviation, score, scoreTime) VALUES
+        (11, 238, 146316, 0, 1, 1, 1, 1, 0, 1, 2, 2, 50, now())""")
+        cursor.execute("UPDATE global_rating SET mean = 2500 WHERE id = 146316")
+
+    summary.update()
+
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute("SELECT game_id, player_count, min_global_rating FROM game_summary ORDER BY game_id")
+        rows = cursor.fetchall()
+
+    # Games that were summarized before keep the ratings of that time
+    assert [tuple(row) for row in rows] == [(234, 4, 500), (235, 1, 2500), (236, 2, 2000), (237, 2, 500),
+                                            (238, 1, 2500)]
+
+
+def test_games_query_player_count_summary(test_client, maps, login, game_summary):
+    response = test_client.get('/games?filter[max_player_count]=2')
+    assert response.status_code == 200
+    assert len(json.loads(response.data.decode('utf-8'))['data']) == 3
+
+    response = test_client.get('/games?filter[min_player_count]=4')
+    assert response.status_code == 200
+    results_data = json.loads(response.data.decode('utf-8'))['data']
+    assert len(results_data) == 1
+    assert len(results_data[0]['attributes']['players']) == 4
+
+
+def test_games_query_rating_summary(test_client, maps, login, game_summary):
+    response = test_client.get('/games?filter[min_rating]=1100')
+    assert response.status_code == 200
+    results_data = json.loads(response.data.decode('utf-8'))['data']
+    assert len(results_data) == 2
+    for game in results_data:
+        assert all([player['mean'] - 3 * player['deviation'] >= 1100
+                    for player in game['attributes']['players']])
+
+
+def test_games_query_unsummarized_game(test_client, maps, login, game_summary):
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute("DELETE FROM game_summary WHERE game_id = 237")
+
+    response = test_client.get('/games?filter[max_player_count]=2&filter[min_rating]=500')
+    assert response.status_code == 200
+    results_data = json.loads(response.data.decode('utf-8'))['data']
+
+    assert sorted(game['id'] for game in results_data) == ['235', '236', '237']
+    game = next(game for game in results_data if game['id'] == '237')
+    assert [(player['min_rating'], player['max_rating']) for player in game['attributes']['players']] == \
+        [(500, 1000), (500, 1000)]
+
+
 def test_games_query_min_player_count(test_client, maps, game_stats, game_player_stats, login, global_rating):
     response = test_client.get('/games?filter[min_player_count]=4')
 
@@ -577,6 +651,17 @@ def test_games_page_size(test_client, game_stats, game_player_stats, maps, mods,
     assert result['data'][0]['attributes']['game_name'] == testGame4Name
 
 
+def test_games_query_page_size(test_client, game_stats, game_player_stats, maps, mods, global_rating, login):
+    response = test_client.get('/games?filter[min_player_count]=2&page[size]=1&page[number]=2')
+
+    assert response.status_code == 200
+
+    result = json.loads(response.data.decode('utf-8'))
+    assert len(result['data']) == 1
+    assert result['data'][0]['attributes']['game_name'] == testGame3Name
+    assert len(result['data'][0]['attributes']['players']) == 2
+
+
 # TODO: Not sure how we should approach this with game_player_stats structure
 # def test_games_invalid_page_size(test_client, game_stats):
 #     response = test_client.get('/games?page[size]=1001')
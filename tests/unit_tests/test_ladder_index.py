@@ -0,0 +1,130 @@
+from api.ladder_index import LadderIndex, LadderSnapshot, RatingHistogram
+
+ROWS = [
+    dict(id=1, login='a', rating=100, is_active=0, num_games=10),
+    dict(id=2, login='b', rating=1400, is_active=1, num_games=20),
+    dict(id=3, login='c', rating=1420, is_active=1, num_games=13),
+    dict(id=4, login='d', rating=1203, is_active=1, num_games=30),
+    dict(id=5, login='e', rating=1400, is_active=1, num_games=0),
+]
+
+
+def test_snapshot_sorted_by_rating():
+    snapshot = LadderSnapshot(ROWS)
+
+    assert [row['id'] for row in snapshot.rows] == [3, 2, 5, 4, 1]
+
+
+def test_snapshot_views():
+    snapshot = LadderSnapshot(ROWS)
+
+    assert [row['id'] for row in snapshot.view(True)[0]] == [3, 2, 4]
+    assert [row['id'] for row in snapshot.view(False)[0]] == [1]
+
+
+def test_snapshot_rank():
+    snapshot = LadderSnapshot(ROWS)
+
+    assert snapshot.rank(1420) == 1
+    assert snapshot.rank(1400) == 2
+    assert snapshot.rank(1203) == 3
+    assert snapshot.rank(100) == 3
+
+
+def test_snapshot_position():
+    snapshot = LadderSnapshot(ROWS)
+
+    assert snapshot.position(4) == 3
+    assert snapshot.position(4, active=True) == 2
+    assert snapshot.position(1, active=True) is None
+    assert snapshot.position(999) is None
+
+
+def test_index_caches_until_invalidated():
+    loads = []
+
+    def load():
+        loads.append(1)
+        return ROWS
+
+    index = LadderIndex(load, ttl=60)
+
+    assert index.get() is index.get()
+    assert len(loads) == 1
+
+    index.invalidate()
+    index.get()
+
+    assert len(loads) == 2
+
+
+def test_index_reloads_after_ttl():
+    loads = []
+
+    def load():
+        loads.append(1)
+        return ROWS
+
+    index = LadderIndex(load, ttl=0)
+    index.get()
+    index.get()
+
+    assert len(loads) == 2
+
+
+def test_index_peek_and_update():
+    index = LadderIndex(lambda: [], ttl=60)
+
+    assert index.peek() is None
+
+    snapshot = index.update(ROWS)
+
+    assert index.peek() is snapshot
+    assert index.get() is snapshot
+    assert len(snapshot.rows) == len(ROWS)
+
+
+def test_histogram_sync():
+    histogram = RatingHistogram(widths=[100, 500])
+    histogram.sync([
+        dict(id=1, mean=1000, deviation=300, num_games=10, is_active=0),
+        dict(id=2, mean=2000, deviation=200, num_games=20, is_active=1),
+        dict(id=3, mean=1720, deviation=100, num_games=13, is_active=1),
+        dict(id=4, mean=1500, deviation=99, num_games=30, is_active=1),
+        dict(id=5, mean=1500, deviation=99, num_games=0, is_active=1),
+        dict(id=6, mean=1200, deviation=200, num_games=3, is_active=0),
+    ])
+
+    assert histogram.distribution(100) == {'1200': 1, '1400': 2}
+    assert histogram.distribution(500) == {'1000': 3}
+    assert histogram.distribution(100, active=False) == {'600': 1}
+
+    histogram.sync([
+        dict(id=2, mean=2000, deviation=200, num_games=20, is_active=1),
+        dict(id=3, mean=1000, deviation=100, num_games=14, is_active=1),
+    ])
+
+    assert histogram.distribution(100) == {'700': 1, '1400': 1}
+    assert histogram.distribution(100, active=False) == {}
+
+
+def test_histogram_widths():
+    histogram = RatingHistogram()
+    histogram.sync([dict(id=1, mean=1000, deviation=100, num_games=1, is_active=1),
+                    dict(id=2, mean=-50, deviation=10, num_games=1, is_active=1)])
+    histogram.sync([dict(id=1, mean=1000, deviation=120, num_games=2, is_active=1),
+                    dict(id=2, mean=-50, deviation=10, num_games=1, is_active=1)])
+
+    assert histogram.distribution(100) == {'600': 1}
+
+    histogram.set_widths([50])
+
+    assert histogram.distribution(50) == {'600': 1}
+
+
+def test_index_on_update():
+    snapshots = []
+    index = LadderIndex(lambda: ROWS, ttl=60, on_update=snapshots.append)
+
+    assert snapshots == [index.get()]
+    assert index.update(ROWS) is snapshots[-1]
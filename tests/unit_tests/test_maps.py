@@ -106,6 +106,15 @@ def test_maps_page(test_client, maps):
     assert result['data'][0]['attributes']['display_name'] == 'b'
 
 
+def test_maps_filter_id(test_client, maps):
+    response = test_client.get('/maps?filter[id]=3,1&sort=display_name')
+
+    assert response.status_code == 200
+
+    result = json.loads(response.data.decode('utf-8'))
+    assert [item['attributes']['display_name'] for item in result['data']] == ['a', 'c']
+
+
 def test_maps_invalid_page(test_client, maps):
     response = test_client.get('/maps?page[number]=-1')
 
@@ -113,6 +122,35 @@ def test_maps_invalid_page(test_client, maps):
     assert json.loads(response.get_data(as_text=True))['message'] == 'Invalid page number'
 
 
+def test_maps_page_cursor(test_client, maps):
+    response = test_client.get('/maps?sort=max_players&page[size]=2&page[after]=')
+
+    assert response.status_code == 200
+    result = json.loads(response.data.decode('utf-8'))
+    assert [item['attributes']['display_name'] for item in result['data']] == ['a', 'b']
+    assert 'prev' not in result['links']
+
+    response = test_client.get(result['links']['next'])
+
+    assert response.status_code == 200
+    result = json.loads(response.data.decode('utf-8'))
+    assert [item['attributes']['display_name'] for item in result['data']] == ['c']
+    assert 'next' not in result['links']
+
+    response = test_client.get(result['links']['prev'])
+
+    assert response.status_code == 200
+    result = json.loads(response.data.decode('utf-8'))
+    assert [item['attributes']['display_name'] for item in result['data']] == ['a', 'b']
+
+
+def test_maps_invalid_page_cursor(test_client, maps):
+    response = test_client.get('/maps?page[after]=foobar')
+
+    assert response.status_code == 400
+    assert json.loads(response.get_data(as_text=True))['message'] == 'Invalid page cursor'
+
+
 def test_maps_sort_by_max_players(test_client, maps):
     response = test_client.get('/maps?sort=max_players')
 
@@ -150,17 +188,39 @@ def test_maps_inject_sql_sort(test_client):
     assert json.loads(response.get_data(as_text=True))['message'] == 'Invalid sort field'
 
 
-def test_maps_upload(test_client, app, tmpdir):
+def test_maps_upload(test_client, app, tmpdir, make_zip):
     upload_dir = tmpdir.mkdir("map_upload")
     app.config['MAP_UPLOAD_PATH'] = upload_dir.strpath
-    response = test_client.post('/maps/upload',
-                                data={'file': (BytesIO('my file contents'.encode('utf-8')), 'map_name.zip')})
+    contents = make_zip('my file contents')
+    response = test_client.post('/maps/upload', data={'file': (BytesIO(contents), 'map_name.zip')})
 
     assert response.status_code == 200
     assert 'ok' == response.get_data(as_text=True)
 
-    with open(upload_dir.join('map_name.zip').strpath, 'r') as file:
-        assert file.read() == 'my file contents'
+    with open(upload_dir.join('map_name.zip').strpath, 'rb') as file:
+        assert file.read() == contents
+    assert upload_dir.listdir() == [upload_dir.join('map_name.zip')]
+
+
+def test_maps_upload_too_large_results_413(test_client, app, tmpdir, make_zip):
+    upload_dir = tmpdir.mkdir("map_upload")
+    app.config['MAP_UPLOAD_PATH'] = upload_dir.strpath
+    app.config['MAP_UPLOAD_MAX_SIZE'] = 10
+    response = test_client.post('/maps/upload', data={'file': (BytesIO(make_zip('my file contents')), 'map_name.zip')})
+
+    assert response.status_code == 413
+    assert upload_dir.listdir() == []
+
+
+def test_maps_upload_no_zip_results_400(test_client, app, tmpdir):
+    upload_dir = tmpdir.mkdir("map_upload")
+    app.config['MAP_UPLOAD_PATH'] = upload_dir.strpath
+    contents = 'my file contents'.encode('utf-8')
+    response = test_client.post('/maps/upload', data={'file': (BytesIO(contents), 'map_name.zip')})
+
+    assert response.status_code == 400
+    assert json.loads(response.get_data(as_text=True))['message'] == 'File is not a valid zip archive'
+    assert upload_dir.listdir() == []
 
 
 def test_maps_upload_no_file_results_400(test_client, app, tmpdir):
@@ -0,0 +1,99 @@
+import pytest
+from flask import Flask
+
+from api import metrics
+
+
+class RecordingClient(object):
+    def __init__(self):
+        self.timings = []
+        self.counters = []
+
+    def timing(self, name, value):
+        self.timings.append((name, value))
+
+    def incr(self, name):
+        self.counters.append(name)
+
+
+class FakeCursor(object):
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query, args=None):
+        self.executed.append((query, args))
+        return 1
+
+    def fetchall(self):
+        return [{'id': 1}]
+
+
+@pytest.fixture
+def client():
+    client = metrics.client = RecordingClient()
+    yield client
+    metrics.client = None
+
+
+def timing_names(client):
+    return [name for name, _ in client.timings]
+
+
+@pytest.mark.parametrize('sql,name', [
+    ('SELECT id FROM game_stats gs WHERE gs.id = %s', 'select.game_stats'),
+    ('  select count(*) from `login`', 'select.login'),
+    ('INSERT INTO player_events (player_id, event_id, count) VALUES (%s, %s, %s)', 'insert.player_events'),
+    ('UPDATE clan SET name = %s', 'update.clan'),
+    ('SELECT * FROM (SELECT id FROM ladder1v1_rating) r', 'select.ladder1v1_rating'),
+    ('SELECT 1', 'select.none'),
+])
+def test_statement_name(sql, name):
+    assert metrics.get_statement_name(sql) == name
+
+
+def test_disabled():
+    metrics.client = None
+
+    with metrics.timer('serialize', 'maps'):
+        pass
+    cursor = FakeCursor()
+
+    assert metrics.timed_cursor(cursor) is cursor
+
+
+def test_timed_cursor(client):
+    cursor = metrics.timed_cursor(FakeCursor())
+
+    assert cursor.execute('SELECT id FROM map WHERE id = %s', (1,)) == 1
+    assert cursor.fetchall() == [{'id': 1}]
+    assert cursor.cursor.executed == [('SELECT id FROM map WHERE id = %s', (1,))]
+    assert timing_names(client) == ['api.sql.none.select.map']
+
+
+def test_timed(client):
+    @metrics.timed('double')
+    def double(value):
+        return value * 2
+
+    assert double(2) == 4
+    assert timing_names(client) == ['api.function.double']
+
+
+def test_request_metrics(client):
+    app = Flask('metrics_test')
+    app.config['STATSD_SERVER'] = 'localhost:8125'
+    metrics.init_metrics(app)
+    metrics.client = client
+
+    @app.route('/items')
+    def items():
+        with metrics.sql_timer('SELECT id FROM item'):
+            pass
+        return 'items'
+
+    app.test_client().get('/items')
+    app.test_client().get('/missing')
+
+    assert timing_names(client) == ['api.sql.items.select.item', 'api.request', 'api.endpoint.items.GET.200',
+                                    'api.request', 'api.endpoint.none.GET.404']
+    assert client.counters == ['api.endpoint.items.GET.200', 'api.endpoint.none.GET.404']
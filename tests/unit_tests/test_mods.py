@@ -5,7 +5,6 @@ import marshmallow
 import pytest
 import sys
 
-from api import app
 from faf import db
 from faf.api import ModSchema
 
@@ -219,17 +218,39 @@ def test_mods_inject_sql_order(test_client):
     assert json.loads(response.get_data(as_text=True))['message'] == 'Invalid sort field'
 
 
-def test_mods_upload(test_client, app, tmpdir):
+def test_mods_upload(test_client, app, tmpdir, make_zip):
     upload_dir = tmpdir.mkdir("map_upload")
     app.config['MOD_UPLOAD_PATH'] = upload_dir.strpath
-    response = test_client.post('/mods/upload',
-                                data={'file': (BytesIO('my file contents'.encode('utf-8')), 'mod_name.zip')})
+    contents = make_zip('my file contents')
+    response = test_client.post('/mods/upload', data={'file': (BytesIO(contents), 'mod_name.zip')})
 
     assert response.status_code == 200
     assert 'ok' == response.get_data(as_text=True)
 
-    with open(upload_dir.join('mod_name.zip').strpath, 'r') as file:
-        assert file.read() == 'my file contents'
+    with open(upload_dir.join('mod_name.zip').strpath, 'rb') as file:
+        assert file.read() == contents
+    assert upload_dir.listdir() == [upload_dir.join('mod_name.zip')]
+
+
+def test_mods_upload_too_large_results_413(test_client, app, tmpdir, make_zip):
+    upload_dir = tmpdir.mkdir("map_upload")
+    app.config['MOD_UPLOAD_PATH'] = upload_dir.strpath
+    app.config['MOD_UPLOAD_MAX_SIZE'] = 10
+    response = test_client.post('/mods/upload', data={'file': (BytesIO(make_zip('my file contents')), 'mod_name.zip')})
+
+    assert response.status_code == 413
+    assert upload_dir.listdir() == []
+
+
+def test_mods_upload_no_zip_results_400(test_client, app, tmpdir):
+    upload_dir = tmpdir.mkdir("map_upload")
+    app.config['MOD_UPLOAD_PATH'] = upload_dir.strpath
+    contents = 'my file contents'.encode('utf-8')
+    response = test_client.post('/mods/upload', data={'file': (BytesIO(contents), 'mod_name.zip')})
+
+    assert response.status_code == 400
+    assert json.loads(response.get_data(as_text=True))['message'] == 'File is not a valid zip archive'
+    assert upload_dir.listdir() == []
 
 
 def test_mods_upload_no_file_results_400(test_client, app, tmpdir):
@@ -0,0 +1,76 @@
+import datetime
+import importlib
+import unittest
+
+import faf.db as db
+import api
+from api.oauth_token import OAuthToken, token_cache
+
+
+class OAuthTokenTestCase(unittest.TestCase):
+    def setUp(self):
+        importlib.reload(api)
+
+        api.app.config.from_object('config')
+        api.api_init()
+
+        token_cache.clear()
+
+        with db.connection:
+            cursor = db.connection.cursor()
+            cursor.execute('TRUNCATE TABLE login')
+            cursor.execute('TRUNCATE TABLE oauth_tokens')
+            cursor.execute("""INSERT INTO login (id, login, password, email)
+                VALUES (1, 'a', 'password', 'example@example.com')""")
+
+    def tearDown(self):
+        db.connection.close()
+
+    def insert_token(self, access_token, refresh_token, expires):
+        with db.connection:
+            cursor = db.connection.cursor()
+            cursor.execute("""INSERT INTO oauth_tokens
+                (token_type, access_token, refresh_token, client_id, scope, expires, user_id)
+                VALUES ('Bearer', %s, %s, '123', 'read_events', %s, 1)""", (access_token, refresh_token, expires))
+
+    def delete_tokens(self):
+        with db.connection:
+            cursor = db.connection.cursor()
+            cursor.execute('DELETE FROM oauth_tokens')
+
+    def test_get_by_access_token_is_cached(self):
+        self.insert_token('access', 'refresh', datetime.datetime.utcnow() + datetime.timedelta(hours=1))
+
+        token = OAuthToken.get(access_token='access')
+        self.assertEqual('refresh', token.refresh_token)
+        self.assertEqual(1, token.user.id)
+        self.assertEqual('a', token.user.username)
+        self.assertEqual(['read_events'], token.scopes)
+
+        self.delete_tokens()
+        self.assertIs(token, OAuthToken.get(access_token='access'))
+
+    def test_get_by_refresh_token(self):
+        self.insert_token('access', 'refresh', datetime.datetime.utcnow() + datetime.timedelta(hours=1))
+
+        self.assertEqual('access', OAuthToken.get(refresh_token='refresh').access_token)
+        self.assertIsNone(OAuthToken.get(access_token='refresh'))
+        self.assertEqual(0, len(token_cache))
+
+    def test_expired_token_is_not_cached(self):
+        self.insert_token('access', 'refresh', datetime.datetime.utcnow() - datetime.timedelta(hours=1))
+
+        self.assertIsNotNone(OAuthToken.get(access_token='access'))
+        self.assertEqual(0, len(token_cache))
+
+    def test_delete_invalidates_cache(self):
+        self.insert_token('access', 'refresh', datetime.datetime.utcnow() + datetime.timedelta(hours=1))
+        OAuthToken.get(access_token='access')
+
+        OAuthToken.delete('123', 1)
+
+        self.assertIsNone(OAuthToken.get(access_token='access'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import signal
+import socket
+import time
+
+import pytest
+
+from api import prefork
+from api.prefork import Supervisor, create_socket
+
+
+def serve_pid(sock, ready):
+    """
+    Answers every connection with the pid of the worker until SIGTERM is received.
+    """
+    stopped = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.append(signum))
+    sock.settimeout(0.1)
+    ready()
+    while not stopped:
+        try:
+            connection, _ = sock.accept()
+        except socket.timeout:
+            continue
+        with connection:
+            connection.sendall(str(os.getpid()).encode('ascii'))
+
+
+def fail(sock, ready):
+    raise RuntimeError('failed to start')
+
+
+@pytest.fixture
+def sock():
+    sock = create_socket('127.0.0.1', 0)
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def supervisor(sock):
+    supervisor = Supervisor(serve_pid, sock, 2, graceful_timeout=5, ready_timeout=5)
+    yield supervisor
+    supervisor.stop()
+
+
+def request_pid(sock):
+    with socket.create_connection(sock.getsockname(), timeout=5) as connection:
+        return int(connection.recv(16))
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_workers_share_socket(supervisor, sock):
+    pids = [supervisor.spawn() for _ in range(2)]
+    for pid in pids:
+        assert supervisor.wait_ready(pid)
+
+    assert request_pid(sock) in pids
+
+
+def test_replace_crashed(supervisor, sock, monkeypatch):
+    monkeypatch.setattr(prefork, 'RESTART_INTERVAL', 0)
+    pids = [supervisor.spawn() for _ in range(2)]
+
+    os.kill(pids[0], signal.SIGKILL)
+    wait_for(lambda: supervisor.reap() or pids[0] not in supervisor.pids)
+    supervisor.replace_crashed()
+
+    assert len(supervisor.pids) == 2
+    assert pids[1] in supervisor.pids
+    new_pid = next(pid for pid in supervisor.pids if pid != pids[1])
+    assert supervisor.wait_ready(new_pid)
+
+
+def test_reload(supervisor, sock):
+    old_pids = [supervisor.spawn() for _ in range(2)]
+
+    supervisor.reload()
+
+    assert len(supervisor.pids) == 2
+    assert not set(old_pids) & set(supervisor.pids)
+    assert request_pid(sock) in supervisor.pids
+
+
+def test_reload_aborted_if_worker_fails(supervisor):
+    old_pids = [supervisor.spawn() for _ in range(2)]
+    supervisor.worker = fail
+
+    supervisor.reload()
+
+    assert sorted(supervisor.pids) == sorted(old_pids)
+
+
+def test_stop(supervisor):
+    pids = [supervisor.spawn() for _ in range(2)]
+    for pid in pids:
+        assert supervisor.wait_ready(pid)
+
+    supervisor.terminate(pids)
+
+    assert supervisor.pids == {}
+    assert not supervisor._retiring
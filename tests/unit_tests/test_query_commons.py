@@ -1,7 +1,10 @@
 import pytest
+from flask import Flask, request
 
-from api import InvalidUsage
-from api.query_commons import get_select_expressions, get_order_by, get_limit
+from api import InvalidUsage, metrics
+from api.query_commons import get_select_expressions, get_order_by, get_limit, get_sort_keys, encode_cursor, \
+    decode_cursor, get_keyset_condition, bind_args, sort_rows, get_query_plan, plan_cache, get_id_filter, \
+    get_id_condition, get_limit_args, prepare_fetch
 
 FIELD_EXPRESSION_DICT = {
     'id': 'map.uid',
@@ -90,3 +93,149 @@ def test_get_order_by_invalid_column():
 
 def test_get_limit():
     assert get_limit(3, 11) == 'LIMIT 22, 11'
+
+
+def test_get_limit_args():
+    assert get_limit_args('3', '11') == [22, 11]
+
+
+def test_get_sort_keys():
+    assert get_sort_keys('likes,-timestamp', FIELD_EXPRESSION_DICT) == [('likes', False), ('timestamp', True)]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([5, None, 'abc'])
+
+    assert decode_cursor(cursor, 3) == [5, None, 'abc']
+
+
+def test_decode_cursor_invalid():
+    with pytest.raises(InvalidUsage) as exception:
+        decode_cursor('not a cursor', 1)
+
+    assert exception.value.message == 'Invalid page cursor'
+
+
+def test_decode_cursor_wrong_length():
+    with pytest.raises(InvalidUsage):
+        decode_cursor(encode_cursor([1, 2]), 1)
+
+
+def test_get_keyset_condition_after():
+    condition, args = get_keyset_condition([('likes', True), ('id', False)], FIELD_EXPRESSION_DICT, [3, 'x'], False)
+
+    assert condition == '(((feature.likes < %s OR feature.likes IS NULL)) OR (feature.likes <=> %s AND map.uid > %s))'
+    assert args == [3, 3, 'x']
+
+
+def test_get_keyset_condition_before_null():
+    condition, args = get_keyset_condition([('likes', True), ('id', True)], FIELD_EXPRESSION_DICT, [None, 'x'], True)
+
+    assert condition == '((feature.likes IS NOT NULL) OR (feature.likes <=> %s AND map.uid > %s))'
+    assert args == [None, 'x']
+
+
+def test_bind_args_positional():
+    assert bind_args('a = %s', 1, [2]) == ('a = %s', [1, 2])
+    assert bind_args('a = %s', None, [2]) == ('a = %s', [2])
+    assert bind_args('a = %s', (1,), [2]) == ('a = %s', [1, 2])
+
+
+def test_bind_args_named():
+    sql, args = bind_args('a = %s AND b = %s', {'id': 1}, [2, 3])
+
+    assert sql == 'a = %(_bound_0)s AND b = %(_bound_1)s'
+    assert args == {'id': 1, '_bound_0': 2, '_bound_1': 3}
+
+
+def test_get_id_filter():
+    app = Flask('test')
+
+    with app.test_request_context('/?filter[id]=3,1,,3'):
+        assert get_id_filter(request, int) == [3, 1]
+
+    with app.test_request_context('/'):
+        assert get_id_filter(request) is None
+
+    with app.test_request_context('/?filter[id]=1,a'):
+        with pytest.raises(InvalidUsage):
+            get_id_filter(request, int)
+
+
+def test_get_id_filter_max_size():
+    app = Flask('test')
+    app.config['MAX_ID_FILTER_SIZE'] = 2
+
+    with app.test_request_context('/?filter[id]=1,2,3'):
+        with pytest.raises(InvalidUsage):
+            get_id_filter(request)
+
+
+def test_get_id_condition():
+    assert get_id_condition('map.uid', ['a', 'b']) == 'map.uid IN (%s,%s)'
+
+
+def test_sort_rows():
+    rows = [dict(id=1, name='b', likes=None), dict(id=2, name='A', likes=5), dict(id=3, name='c', likes=5)]
+
+    assert [row['id'] for row in sort_rows(rows, [('name', False)])] == [2, 1, 3]
+    assert [row['id'] for row in sort_rows(rows, [('likes', False), ('id', True)])] == [1, 3, 2]
+    assert [row['id'] for row in sort_rows(rows, [('likes', True)])] == [2, 3, 1]
+
+
+class MapSchema(object):
+    class Meta:
+        type_ = 'map'
+
+
+def test_get_query_plan():
+    with Flask('test').test_request_context('/?fields[map]=timestamp'):
+        plan = get_query_plan(MapSchema(), 'map', FIELD_EXPRESSION_DICT, request, where='map.uid = %s',
+                              sort='-timestamp', keyset=True)
+
+    assert plan.fields == ['timestamp', 'id']
+    assert not plan.id_selected
+    assert plan.select_expression == 'SELECT UNIX_TIMESTAMP(t.date) AS `timestamp`, map.uid AS `id` FROM map'
+    assert plan.where_expression == 'WHERE map.uid = %s'
+    assert plan.cursor_sort_keys == [('timestamp', True), ('id', True)]
+    assert plan.cursor_order_by_expressions[True] == 'ORDER BY `timestamp` ASC, `id` ASC'
+
+
+class CountingClient(object):
+    def __init__(self):
+        self.counters = []
+
+    def incr(self, name):
+        self.counters.append(name)
+
+
+def test_get_query_plan_is_cached():
+    plan_cache.clear()
+    client = metrics.client = CountingClient()
+
+    with Flask('test').test_request_context('/?fields[map]=timestamp,likes'):
+        plan = get_query_plan(MapSchema(), 'map', FIELD_EXPRESSION_DICT, request, sort='-likes')
+        assert get_query_plan(MapSchema(), 'map', FIELD_EXPRESSION_DICT, request, sort='-likes') is plan
+        assert get_query_plan(MapSchema(), 'map', FIELD_EXPRESSION_DICT, request, sort='likes') is not plan
+
+    metrics.client = None
+
+    assert plan.order_by_expression == 'ORDER BY `likes` DESC'
+    assert plan_cache.stats()['hits'] == 1
+    assert client.counters == ['api.plan_cache.none.miss', 'api.plan_cache.none.hit', 'api.plan_cache.none.miss']
+
+
+def test_prepare_fetch_id_filter():
+    with Flask('test').test_request_context('/?filter[id]=b,a'):
+        query = prepare_fetch(MapSchema(), 'map', FIELD_EXPRESSION_DICT, 100, request, keyset=True, id_filter=True)
+
+    assert 'WHERE map.uid IN (%s,%s)' in query.sql
+    assert 'LIMIT' not in query.sql
+    assert query.args == ['b', 'a']
+
+
+@pytest.mark.parametrize('cursor', ['page[after]=', 'page[before]=abc'])
+def test_prepare_fetch_id_filter_with_cursor(cursor):
+    with Flask('test').test_request_context('/?filter[id]=b,a&' + cursor):
+        with pytest.raises(InvalidUsage):
+            prepare_fetch(MapSchema(), 'map', FIELD_EXPRESSION_DICT, 100, request, keyset=True, id_filter=True)
@@ -103,6 +103,39 @@ def test_ranked1v1_page(test_client, ranked1v1_ratings):
     assert result['data'][0]['attributes']['ranking'] == 2
 
 
+def test_ranked1v1_page_cursor(test_client, ranked1v1_ratings):
+    response = test_client.get('/ranked1v1?page[size]=2&page[after]=')
+
+    assert response.status_code == 200
+    result = json.loads(response.data.decode('utf-8'))
+    assert [item['attributes']['login'] for item in result['data']] == ['c', 'b']
+
+    response = test_client.get(result['links']['next'])
+
+    assert response.status_code == 200
+    result = json.loads(response.data.decode('utf-8'))
+    assert [item['attributes']['login'] for item in result['data']] == ['d', 'a']
+    assert [item['attributes']['ranking'] for item in result['data']] == [3, 4]
+    assert 'next' not in result['links']
+
+
+def test_ranked1v1_around(test_client, ranked1v1_ratings):
+    response = test_client.get('/ranked1v1/2/around?count=1')
+
+    assert response.status_code == 200
+    assert response.content_type == 'application/vnd.api+json'
+
+    result = json.loads(response.data.decode('utf-8'))
+    assert [item['attributes']['login'] for item in result['data']] == ['c', 'b', 'd']
+    assert [item['attributes']['ranking'] for item in result['data']] == [1, 2, 3]
+
+
+def test_ranked1v1_around_inactive(test_client, ranked1v1_ratings):
+    response = test_client.get('/ranked1v1/1/around')
+
+    assert response.status_code == 404
+
+
 def test_ranked1v1_invalid_page(test_client):
     response = test_client.get('/ranked1v1?page[number]=-1')
 
@@ -141,6 +174,24 @@ def test_ranked1v1_filter_inactive(test_client, ranked1v1_ratings):
     assert len(result['data']) == 1
     assert result['data'][0]['attributes']['is_active'] == 0
 
+def test_ranked1v1_filter_id(test_client, ranked1v1_ratings):
+    response = test_client.get('/ranked1v1?filter[id]=4,2,5')
+
+    assert response.status_code == 200
+
+    result = json.loads(response.data.decode('utf-8'))
+    assert [item['id'] for item in result['data']] == ['2', '4']
+    assert [item['attributes']['ranking'] for item in result['data']] == [2, 3]
+
+
+@pytest.mark.parametrize('parameter', ['filter[player]=a', 'filter[is_active]=true', 'page[after]=',
+                                       'page[before]=WzEwMDAsMV0'])
+def test_ranked1v1_filter_id_combined(test_client, ranked1v1_ratings, parameter):
+    response = test_client.get('/ranked1v1?filter[id]=4,2,5&' + parameter)
+
+    assert response.status_code == 400
+
+
 def test_ranked1v1_filter_player(test_client, ranked1v1_ratings):
     with db.connection:
         cursor = db.connection.cursor()
@@ -170,3 +221,22 @@ def test_ranked1v1_stats(test_client, ranked1v1_ratings):
 
     result = json.loads(response.data.decode('utf-8'))
     assert result['data']['attributes']['rating_distribution'] == {'1200': 1, '1400': 2}
+
+
+def test_ranked1v1_stats_inactive(test_client, ranked1v1_ratings):
+    with db.connection:
+        cursor = db.connection.cursor()
+        cursor.execute("UPDATE ladder1v1_rating SET deviation = 200 WHERE id = 1")
+
+    response = test_client.get('/ranked1v1/stats?filter[is_active]=false')
+
+    assert response.status_code == 200
+
+    result = json.loads(response.data.decode('utf-8'))
+    assert result['data']['attributes']['rating_distribution'] == {'400': 1}
+
+
+def test_ranked1v1_stats_invalid_bucket_width(test_client, ranked1v1_ratings):
+    response = test_client.get('/ranked1v1/stats?bucket_width=7')
+
+    assert response.status_code == 400
@@ -0,0 +1,127 @@
+import pytest
+from flask import Flask, Response
+
+from api import response_cache
+from api.response_cache import cached, init_response_cache, invalidate, InMemoryClient, SharedStorage
+
+
+@pytest.fixture
+def cache_app():
+    app = Flask('response_cache_test')
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    app.config['RESPONSE_CACHE_TTLS'] = {'short': 5}
+    app.calls = 0
+
+    @app.route('/items')
+    @cached(ttl=30)
+    def items():
+        app.calls += 1
+        return Response('{"calls": %d}' % app.calls, content_type='application/vnd.api+json')
+
+    @app.route('/short')
+    @cached(ttl=30)
+    def short():
+        return 'short'
+
+    @app.route('/missing')
+    @cached()
+    def missing():
+        app.calls += 1
+        return Response('not found', status=404)
+
+    @app.route('/streamed')
+    @cached()
+    def streamed():
+        app.calls += 1
+        return Response(iter(['a', 'b']))
+
+    init_response_cache(app)
+    yield app
+
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+    init_response_cache(app)
+
+
+def test_cached_response(cache_app):
+    client = cache_app.test_client()
+
+    first = client.get('/items?sort=name&page[size]=10')
+    second = client.get('/items?page[size]=10&sort=name')
+
+    assert cache_app.calls == 1
+    assert first.data == second.data == b'{"calls": 1}'
+    assert second.content_type == 'application/vnd.api+json'
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert second.headers['ETag'].startswith('"')
+    assert second.headers['Cache-Control'] == 'public, max-age=30'
+
+
+def test_query_string_is_part_of_key(cache_app):
+    client = cache_app.test_client()
+
+    client.get('/items?page[number]=1')
+    response = client.get('/items?page[number]=2')
+
+    assert cache_app.calls == 2
+    assert response.data == b'{"calls": 2}'
+
+
+def test_if_none_match(cache_app):
+    client = cache_app.test_client()
+    etag = client.get('/items').headers['ETag']
+
+    response = client.get('/items', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    assert cache_app.calls == 1
+
+    assert client.get('/items', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_route_ttl_override(cache_app):
+    assert cache_app.test_client().get('/short').headers['Cache-Control'] == 'public, max-age=5'
+
+
+def test_errors_and_streamed_responses_are_not_cached(cache_app):
+    client = cache_app.test_client()
+
+    for _ in range(2):
+        assert client.get('/missing').status_code == 404
+        assert client.get('/streamed').data == b'ab'
+
+    assert cache_app.calls == 4
+
+
+def test_invalidate(cache_app):
+    client = cache_app.test_client()
+    client.get('/items')
+
+    invalidate('items')
+
+    assert client.get('/items').data == b'{"calls": 2}'
+
+
+def test_disabled(cache_app):
+    cache_app.config['RESPONSE_CACHE_ENABLED'] = False
+    init_response_cache(cache_app)
+    client = cache_app.test_client()
+
+    client.get('/items')
+    response = client.get('/items')
+
+    assert cache_app.calls == 2
+    assert 'ETag' not in response.headers
+
+
+def test_shared_storage(cache_app):
+    response_cache.storage = SharedStorage(InMemoryClient())
+    client = cache_app.test_client()
+
+    etag = client.get('/items').headers['ETag']
+    assert client.get('/items', headers={'If-None-Match': etag}).status_code == 304
+    assert cache_app.calls == 1
+
+    invalidate('items')
+    assert client.get('/items').data == b'{"calls": 2}'
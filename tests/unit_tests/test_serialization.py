@@ -0,0 +1,121 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+from marshmallow import post_dump
+from marshmallow_jsonapi import Schema, fields
+
+from api.serialization import fast_dump, is_supported
+
+
+class GameSchema(Schema):
+    id = fields.Str()
+    name = fields.Str()
+    max_players = fields.Integer()
+    rating = fields.Float()
+    ranked = fields.Boolean()
+    start_time = fields.DateTime()
+    map_file = fields.Str(dump_to='map_file_path')
+    victory_condition = fields.Str(attribute='victory')
+    title = fields.Method('get_title')
+    secret = fields.Str(load_only=True)
+    mode = fields.Str(default='ffa')
+
+    def get_title(self, obj):
+        return obj.get('name', '').upper()
+
+    class Meta:
+        type_ = 'game'
+
+
+class InflectedSchema(Schema):
+    id = fields.Str()
+    player_name = fields.Str()
+
+    class Meta:
+        type_ = 'player'
+        inflect = staticmethod(lambda text: text.replace('_', '-'))
+
+
+class HookSchema(Schema):
+    id = fields.Str()
+
+    @post_dump
+    def add_attribute(self, data):
+        data['extra'] = True
+        return data
+
+    class Meta:
+        type_ = 'hook'
+
+
+class LinkSchema(Schema):
+    id = fields.Str()
+
+    class Meta:
+        type_ = 'link'
+        self_url = '/links/{id}'
+        self_url_kwargs = {'id': '<id>'}
+
+
+def marshmallow_dump(schema, result, many, id_selected):
+    data = schema.dump(result, many=many).data
+
+    if id_selected:
+        if many:
+            for item in data['data']:
+                if 'attributes' not in item:
+                    break
+                item['attributes']['id'] = item['id']
+        elif 'id' in data['data'] and 'attributes' in data['data']:
+            data['data']['attributes']['id'] = data['data']['id']
+
+    return data
+
+
+ROWS = [
+    dict(id=1, name='game', max_players=8, rating=1500.5, ranked=1, start_time=datetime.datetime(2016, 1, 2, 3, 4, 5),
+         map_file='maps/scmp_001.zip', victory='DEMORALIZATION', secret='x', not_in_schema=1),
+    dict(id=2, name=None, max_players=Decimal(4), rating=Decimal('1.25'), ranked=0, start_time=None,
+         map_file=None, victory=None, secret=None, not_in_schema=None),
+]
+
+
+@pytest.mark.parametrize('id_selected', [True, False])
+@pytest.mark.parametrize('fields', [
+    None,
+    ['id'],
+    ['id', 'name', 'title'],
+    ['id', 'max_players', 'rating', 'ranked', 'start_time'],
+    ['id', 'map_file', 'victory'],
+    ['id', 'rating'],
+])
+def test_parity(fields, id_selected):
+    rows = [{key: value for key, value in row.items() if fields is None or key in fields} for row in ROWS]
+
+    assert fast_dump(GameSchema(), rows, True, id_selected) == marshmallow_dump(GameSchema(), rows, True, id_selected)
+    assert fast_dump(GameSchema(), rows[0], False, id_selected) == \
+        marshmallow_dump(GameSchema(), rows[0], False, id_selected)
+
+
+def test_parity_empty():
+    assert fast_dump(GameSchema(), [], True, True) == marshmallow_dump(GameSchema(), [], True, True)
+
+
+def test_parity_inflect():
+    rows = [dict(id=1, player_name='a')]
+
+    assert fast_dump(InflectedSchema(), rows, True, True) == marshmallow_dump(InflectedSchema(), rows, True, True)
+
+
+def test_unsupported_schemas():
+    assert is_supported(GameSchema())
+    assert not is_supported(GameSchema(only=('id', 'name')))
+    assert not is_supported(HookSchema())
+    assert not is_supported(LinkSchema())
+
+    assert fast_dump(HookSchema(), [dict(id=1)], True, True) is None
+
+
+def test_invalid_value_falls_back():
+    assert fast_dump(GameSchema(), [dict(id=1, max_players='many')], True, True) is None
@@ -0,0 +1,96 @@
+import threading
+
+from flask import Flask
+
+from api.slow_queries import RecordingCursor, SlowQueryRecorder
+
+
+class FakeCursor(object):
+    def execute(self, query, args=None):
+        return 1
+
+
+def test_threshold():
+    recorder = SlowQueryRecorder(100)
+
+    assert recorder.record('SELECT 1', None, 99) is None
+    sample = recorder.record('SELECT 2', (1,), 100)
+
+    assert recorder.samples() == [sample]
+    assert sample['sql'] == 'SELECT 2'
+    assert sample['args'] == ['int']
+    assert sample['duration'] == 100
+    assert sample['endpoint'] is None
+    assert sample['explain'] is None
+
+
+def test_args_redacted(caplog):
+    recorder = SlowQueryRecorder(0)
+
+    sample = recorder.record('SELECT id FROM oauth_tokens WHERE access_token = %s AND expires > %s',
+                             ('secret', None), 1)
+
+    assert sample['args'] == ['str', 'NoneType']
+    assert 'secret' not in caplog.text
+
+
+def test_log_args():
+    recorder = SlowQueryRecorder(0, log_args=True)
+
+    sample = recorder.record('SELECT id FROM login WHERE login = %(login)s', {'login': 'a'}, 1)
+
+    assert sample['args'] == {'login': 'a'}
+
+
+def test_bounded():
+    recorder = SlowQueryRecorder(0, size=2)
+
+    for i in range(3):
+        recorder.record('SELECT {}'.format(i), None, 1)
+
+    assert [sample['sql'] for sample in recorder.samples()] == ['SELECT 2', 'SELECT 1']
+
+
+def test_request_parameters():
+    recorder = SlowQueryRecorder(0)
+    app = Flask('slow_queries_test')
+
+    @app.route('/games')
+    def games():
+        recorder.record('SELECT id FROM game_stats', None, 1)
+        return 'games'
+
+    app.test_client().get('/games?filter[players]=a&filter[players]=b&page[size]=5')
+
+    [sample] = recorder.samples()
+    assert sample['endpoint'] == 'games'
+    assert sample['parameters'] == {'filter[players]': ['a', 'b'], 'page[size]': ['5']}
+
+
+def test_explain():
+    explained = threading.Event()
+
+    def explain(sql, args):
+        explained.set()
+        return [{'table': 'game_stats', 'sql': sql, 'args': args}]
+
+    recorder = SlowQueryRecorder(0, explain=explain)
+    try:
+        recorder.record('UPDATE game_stats SET id = 1', None, 1)
+        sample = recorder.record('SELECT id FROM game_stats WHERE id = %s', [1], 1)
+        recorder.record('EXPLAIN SELECT id FROM game_stats', None, 1)
+    finally:
+        recorder.stop()
+
+    assert explained.is_set()
+    assert sample['explain'] == [{'table': 'game_stats', 'sql': 'SELECT id FROM game_stats WHERE id = %s',
+                                  'args': [1]}]
+    assert [sample['sql'][:6] for sample in recorder.samples()] == ['SELECT', 'UPDATE']
+
+
+def test_recording_cursor():
+    recorder = SlowQueryRecorder(0)
+    cursor = RecordingCursor(FakeCursor(), recorder)
+
+    assert cursor.execute('SELECT id FROM map', None) == 1
+    assert [sample['sql'] for sample in recorder.samples()] == ['SELECT id FROM map']
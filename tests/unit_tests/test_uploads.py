@@ -0,0 +1,64 @@
+import hashlib
+import os
+import stat
+
+import pytest
+
+from api import InvalidUsage
+from api.uploads import UploadSink
+
+
+def test_sink_commit(tmpdir, make_zip):
+    contents = make_zip('my file contents')
+    sink = UploadSink(tmpdir.strpath, 1024, validate_zip=True)
+    for start in range(0, len(contents), 3):
+        sink.write(contents[start:start + 3])
+
+    upload = sink.commit(tmpdir.join('a.zip').strpath)
+
+    assert upload.size == len(contents)
+    assert upload.sha1 == hashlib.sha1(contents).hexdigest()
+    assert upload.md5 == hashlib.md5(contents).hexdigest()
+    assert tmpdir.listdir() == [tmpdir.join('a.zip')]
+    assert tmpdir.join('a.zip').read_binary() == contents
+
+
+def test_sink_commit_file_mode(tmpdir):
+    sink = UploadSink(tmpdir.strpath, 1024)
+    sink.write(b'contents')
+
+    upload = sink.commit(tmpdir.join('a.txt').strpath)
+    tmpdir.join('b.txt').write('other file')
+
+    # Same mode as files created the usual way, e.g. by FileStorage.save()
+    assert stat.S_IMODE(os.stat(upload.path).st_mode) == stat.S_IMODE(tmpdir.join('b.txt').stat().mode)
+
+
+def test_sink_max_size(tmpdir):
+    sink = UploadSink(tmpdir.strpath, 4)
+    sink.write(b'1234')
+
+    with pytest.raises(InvalidUsage) as error:
+        sink.write(b'5')
+    assert error.value.status_code == 413
+
+    sink.discard()
+    assert tmpdir.listdir() == []
+
+
+def test_sink_rejects_other_files_early(tmpdir):
+    sink = UploadSink(tmpdir.strpath, 1024, validate_zip=True)
+    sink.write(b'P')
+
+    with pytest.raises(InvalidUsage):
+        sink.write(b'NG')
+    sink.discard()
+
+
+def test_sink_validates_central_directory(tmpdir, make_zip):
+    sink = UploadSink(tmpdir.strpath, 1024, validate_zip=True)
+    sink.write(make_zip('my file contents')[:40])
+
+    with pytest.raises(InvalidUsage):
+        sink.commit(tmpdir.join('a.zip').strpath)
+    assert tmpdir.listdir() == []